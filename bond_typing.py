@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Bond typing (single/double/triple) from ReaxFF bond orders.
+
+Bond orders are one-dimensional, so the clusters of a k-means fit are
+intervals and can be described by the ``n_clusters-1`` thresholds
+between them. The fit is done once, on a histogram of the bond orders
+(bond files write three decimals, so there are a few thousand distinct
+values at most), with an exact 1-D k-means (Jenks natural breaks) by
+dynamic programming. Classifying bonds is then a ``np.searchsorted``
+over the thresholds, for a whole frame or trajectory at once.
+"""
+
+import numpy as np
+
+## List of classes/functions ##
+# 1. kmeans_1d
+# 2. BondThresholds
+
+MAX_BINS = 4096 # distinct values fitted exactly; more are histogrammed
+REFERENCE_BONDORDERS = (1.0, 1.5, 2.0)
+
+#%%
+def kmeans_1d(values, n_clusters, weights=None):
+    '''
+    Exact (globally optimal) k-means of 1-D data.
+
+    Parameters
+    ----------
+    values : array_like
+        Data points (any order, repeated values allowed).
+    n_clusters : int
+        Number of clusters. Reduced to the number of distinct values if
+        there are fewer.
+    weights : array_like, optional
+        Weight (count) of every value. Default is 1.
+
+    Returns
+    -------
+    centers : np.ndarray
+        Cluster means, ascending.
+    bounds : np.ndarray
+        Clusters as index ranges of the sorted distinct values:
+        cluster ``c`` is ``[bounds[c], bounds[c+1])``.
+    '''
+    values  = np.asarray(values, dtype=np.float64).ravel()
+    weights = np.ones(len(values)) if weights is None else \
+              np.asarray(weights, dtype=np.float64).ravel()
+    x, inverse = np.unique(values, return_inverse=True)
+    w = np.bincount(inverse.ravel(), weights=weights, minlength=len(x))
+    x, w = x[w > 0], w[w > 0]
+    m = len(x)
+    k = max(1, min(int(n_clusters), m))
+    if m == 0:
+        return np.empty(0), np.zeros(1, dtype=np.int64)
+
+    # prefix sums give the within-cluster sum of squares of any x[i:j]
+    W  = np.concatenate(([0.0], np.cumsum(w)))
+    S1 = np.concatenate(([0.0], np.cumsum(w*x)))
+    S2 = np.concatenate(([0.0], np.cumsum(w*x*x)))
+
+    def cost(i, j):
+        # i: array of starts, j: end (exclusive)
+        n = W[j] - W[i]
+        s = S1[j] - S1[i]
+        return S2[j] - S2[i] - s*s/n
+
+    # D[c, j]: best cost of x[:j] in c+1 clusters; B: start of the last one
+    D = np.full((k, m+1), np.inf)
+    B = np.zeros((k, m+1), dtype=np.int64)
+    D[0, 1:] = cost(np.zeros(m, dtype=np.int64), np.arange(1, m+1))
+    for c in range(1, k):
+        for j in range(c+1, m+1):
+            starts = np.arange(c, j)
+            total  = D[c-1, starts] + cost(starts, j)
+            best   = np.argmin(total)
+            D[c, j], B[c, j] = total[best], starts[best]
+
+    bounds = np.zeros(k+1, dtype=np.int64)
+    bounds[k] = m
+    for c in range(k-1, 0, -1):
+        bounds[c] = B[c, bounds[c+1]]
+    centers = np.array([np.sum(w[a:b]*x[a:b])/np.sum(w[a:b])
+                        for a, b in zip(bounds[:-1], bounds[1:])])
+    return centers, bounds
+
+#%%
+class BondThresholds:
+    '''
+    Interval bond types fitted once and applied to any number of bonds.
+
+    Attributes
+    ----------
+    centers : np.ndarray
+        Cluster centres, ascending.
+    thresholds : np.ndarray
+        Boundaries between neighbouring clusters (midpoints of centres);
+        a bond order ``bo`` is in cluster
+        ``searchsorted(thresholds, bo, 'right')``.
+    '''
+    def __init__(self, centers):
+        self.centers    = np.sort(np.asarray(centers, dtype=np.float64))
+        self.thresholds = (self.centers[1:] + self.centers[:-1])/2
+
+    @classmethod
+    def fit(cls, bondorders, n_clusters, weights=None, max_bins=MAX_BINS):
+        '''
+        Fit on bond orders (array, or a histogram given as values and
+        ``weights``). More than ``max_bins`` distinct values are reduced
+        to ``max_bins`` equal-width bins at their weighted mean.
+        '''
+        values  = np.asarray(bondorders, dtype=np.float64).ravel()
+        weights = np.ones(len(values)) if weights is None else \
+                  np.asarray(weights, dtype=np.float64).ravel()
+        if len(values) and len(np.unique(values)) > max_bins:
+            edges = np.linspace(values.min(), values.max(), max_bins+1)
+            which = np.clip(np.searchsorted(edges, values, 'right')-1,
+                            0, max_bins-1)
+            count = np.bincount(which, weights=weights, minlength=max_bins)
+            total = np.bincount(which, weights=weights*values, minlength=max_bins)
+            keep  = count > 0
+            values, weights = total[keep]/count[keep], count[keep]
+        centers, _ = kmeans_1d(values, n_clusters, weights)
+        return cls(centers)
+
+    @classmethod
+    def from_histogram(cls, counts, resolution, n_clusters):
+        '''
+        Fit on ``counts[i]`` bonds of order ``i*resolution`` (e.g. from
+        ``np.bincount`` of the bond orders in units of 0.001).
+        '''
+        counts = np.asarray(counts, dtype=np.float64)
+        values = np.flatnonzero(counts)
+        return cls.fit(values*resolution, n_clusters, weights=counts[values])
+
+    @property
+    def n_clusters(self):
+        return len(self.centers)
+
+    def classify(self, bondorders):
+        '''Cluster of every bond order, 1 (lowest centre) to n_clusters.'''
+        return np.searchsorted(self.thresholds, np.asarray(bondorders),
+                               side='right') + 1
+
+    def bond_types(self, bondorders, reference=REFERENCE_BONDORDERS):
+        '''
+        Bond type of every bond order: 1 + position of the reference bond
+        order closest to the centre of its cluster.
+        '''
+        reference = np.asarray(reference, dtype=np.float64)
+        to_type   = np.argmin(np.abs(self.centers[:, None] - reference), axis=1) + 1
+        return to_type[self.classify(bondorders) - 1]
+
+    def to_dict(self):
+        return {'centers': self.centers.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['centers'])
+
+    def __repr__(self):
+        return 'BondThresholds(centers={}, thresholds={})'.format(
+            np.round(self.centers, 3).tolist(),
+            np.round(self.thresholds, 3).tolist())
@@ -11,7 +11,6 @@ This is my own LAMMPS post-processing library
 
 import networkx as nx
 from networkx.algorithms import isomorphism
-from collections import Counter
 import re
 import sys
 import math
@@ -23,13 +22,24 @@ from matplotlib.colors import LogNorm
 import random
 import os
 import pickle
-import json
+import warnings
 from functools import wraps
 import numpy as np
 from scipy.optimize import curve_fit, newton
 from rdkit import Chem
-from sklearn.cluster import KMeans
 from collections.abc import Iterable
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from magnolia.bondframe import BondFrame, BondData, StepView, frame_header, parse_blocks, DECIMALS
+from magnolia.frame_reader import iter_blocks
+from magnolia.frame_index import get_frame_index
+from magnolia.frame_cache import load_bonddata, save_bonddata
+from magnolia.result_cache import ResultCache, cache_key, LOAD_ERRORS
+from magnolia.reaction_analysis import MoleculeLineage, ReactionExtractor
+from magnolia.bond_typing import BondThresholds
+from magnolia.smiles_cache import SMILES_CACHE, graph_key, smiles_species_counts
+from magnolia.species_analysis import molecule_labels, molecules_from_labels, formula_from_counts, count_species, SpeciesCounts, SpeciesEnsemble, SpeciesIndex
 
 # =============================================================================
 ## Dacorator functions:
@@ -71,6 +81,19 @@ from collections.abc import Iterable
  #   35. moleculeGraph2smiles
  #   36. get_bondtypes
  #   37. draw_molecule_asGraph
+ #   38. iter_bondfile_frames
+ #   39. get_frame_species_count
+ #   40. step2picosecond_stream
+ #   41. get_SpeciesCountAtEveryTimestep_stream
+ #   42. stepwise_species_count_stream
+ #   43. read_bondfile_frame
+ #   44. check_atom_counts
+ #   45. get_species_count_ensemble
+ #   46. track_molecule_lineage
+ #   47. extract_reactions
+ #   48. get_species_index
+ #   49. get_bondorder_timeseries
+ #   50. get_bond_thresholds
 # =============================================================================
 def function_runtime(f):
     @wraps(f)
@@ -90,12 +113,41 @@ def function_runtime(f):
     return wrapper
 
 def loadpickle_or_execute(pickle_path,function, *args, **kwargs):
-    if os.path.exists(pickle_path):
+    '''
+    Return function(*args, **kwargs), cached in ``pickle_path``.
+
+    The pickle is reused only if it was made by the same call: the key of
+    function, arguments and input-file fingerprints is kept in
+    ``<pickle_path>.key``. A pickle written by an older version has no key
+    file and is recomputed (and overwritten) once. A truncated or corrupt
+    pickle is recomputed as well.
+    '''
+    return _load_or_execute(pickle_path, 'pickle', function, args, kwargs)
+
+def loadjson_or_execute(pickle_path,function, *args, **kwargs):
+    '''As loadpickle_or_execute, with a JSON file.'''
+    return _load_or_execute(pickle_path, 'json', function, args, kwargs)
+
+def _load_or_execute(path, backend, function, args, kwargs):
+    store   = ResultCache(os.path.dirname(path), backend)
+    key     = cache_key(function, args, kwargs)
+    keypath = path+'.key'
+    saved   = None
+    if os.path.exists(path) and os.path.exists(keypath):
+        with open(keypath) as kf:
+            saved = kf.read().strip()
+    
+    if saved == key:
         # Load data from pickle
         start = time.time()
-        print('Loading data from pickle instead of {}...'.format(function.__name__))
-        with open(pickle_path, 'rb') as pf:
-            data = pickle.load(pf)
+        print('Loading data from {} instead of {}...'.format(
+            'JSON' if backend=='json' else 'pickle', function.__name__))
+        try:
+            data = store.load(path)
+        except LOAD_ERRORS:
+            print('{} is unreadable (truncated or corrupt), recomputing...'.format(path))
+            saved = None
+        else:
             stop = time.time()
             _min = int((stop-start)/60)
             _sec = (stop-start)%60
@@ -104,34 +156,20 @@ def loadpickle_or_execute(pickle_path,function, *args, **kwargs):
             else:
                 print('Loaded Succesfully!! Loading time: {} min {:0.1f} sec'.format(_min,_sec))
             print('-'*60)
-    else:
-        # Execute the provided function to get the data
-        print('Loading data from {}...'.format(function.__name__))
-        data = function(*args,**kwargs)
-        print('Loaded Succesfully!!!')
-        print('-'*60)
-        # Save data to pickle for future use
-        with open(pickle_path, 'wb') as pf:
-            pickle.dump(data, pf)
-    return data
-
-def loadjson_or_execute(pickle_path,function, *args, **kwargs):
-    if os.path.exists(pickle_path):
-        # Load data from pickle
-        print('Loading data from JSON instead of {}...'.format(function.__name__))
-        print('Loaded Succesfully!!!')
-        print('-'*60)
-        with open(pickle_path, 'r') as pf:
-            data = json.load(pf)
-    else:
+    if saved != key:
+        if os.path.exists(path) and not os.path.exists(keypath):
+            print('{} has no key file (older version), recomputing once...'.format(path))
+        elif saved is not None:
+            print('{} is outdated (inputs changed), recomputing...'.format(path))
         # Execute the provided function to get the data
         print('Loading data from {}...'.format(function.__name__))
         data = function(*args,**kwargs)
         print('Loaded Succesfully!!!')
         print('-'*60)
-        # Save data to pickle for future use
-        with open(pickle_path, 'w') as pf:
-            json.dump(data, pf)
+        # Save data for future use
+        store.dump(data, path)
+        with open(keypath, 'w') as kf:
+            kf.write(key)
     return data
 
 # ---------------------List of Neighbours-----------------------------------
@@ -142,81 +180,150 @@ def get_neighbours(bondfile, **kwargs):
     #-------keyward arguments-------------
     bo     = kwargs.get('bo',False) # to get bondorders
     mtypes = kwargs.get('mtypes',False) # to get molecule ids
-    charge = kwargs.get('charge',False) # get charge of atoms
-    nlp    = kwargs.get('nlp',False) # get the number of lone pair
     #-------------------------------------
     
+    # no bond order cutoff here: every bond written in the file is kept
     neighbours = {}
     atomtypes  = {}
     if bo: bondorders    = {}
     if mtypes: molecule_types    = {}
-    if charge: charge = {}
-    if nlp: nlp = {}
     
-    with open(bondfile) as bf:
-        prev_natoms = 0
-        natoms_flag = False
-        warning_flag = False
-        first_warning_ignore = True
-        atom_counter = 0
-        
-        for line in bf:
-            splitted = line.split()
-            if line.find('Timestep')!=-1:
-                step = int(splitted[-1])
-                neighbours[step]={}
-                atomtypes = {}
-                if bo: bondorders[step]  = {}
-                if charge : charge[step] = {}
-                if nlp: nlp[step] = {}
-                
-            if line.find('Number of particles')!=-1:
-                current_natoms = int(splitted[-1])
-                
-                if atom_counter!=current_natoms:
-                    if first_warning_ignore:
-                        first_warning_ignore=False
-                    else:
-                        warning_flag=True
-                    
-                if natoms_flag and current_natoms!=prev_natoms:
-                    print('User warning from get_neighbours function: Lost atom warning!!')
-                atom_counter = 0   
-                prev_natoms  = current_natoms #new change
-            if splitted != [] and splitted[0].isnumeric():
-                atom_counter            +=1
-                parent                   = int(splitted[0])
-                parent_type              = int(splitted[1])
-                number_of_children       = int(splitted[2])
-                children                 = list(map(int,splitted[3:3+number_of_children]))
-                neighbours[step][parent] = children
-                atomtypes[parent]        = parent_type
-                
-                if mtypes:
-                    molecule_types[parent] = int(splitted[3+number_of_children])
-                if bo:
-                    bo_id = 4+number_of_children
-                    bo_values = list(map(float,splitted[bo_id:bo_id+number_of_children]))
-                    bondorders[step][parent]={}
-                    for i,child in enumerate(children):
-                        bondorders[step][parent][child] = bo_values[i]
-                if charge:
-                    charge[step][parent] = float(splitted[-1])
-                if nlp:
-                    nlp[step][parent] = float(splitted[-2])
-        
-        if warning_flag:
-            print('User warning from get_neighbours function: Repeated atom information detected in some timesteps!')
-            
-        result = (neighbours,atomtypes,)
-        if bo: result+=(bondorders,)
-        if mtypes: result+=(molecule_types,)
-        
-        return result
+    fields = ['molid'] if mtypes else []
+    for frame in iter_bondfile_frames(bondfile, cutoff=0.0, fields=fields):
+        neighbours[frame.step] = frame.neighbours_dict()
+        atomtypes = frame.column_dict('types')
+        if bo:
+            bondorders[frame.step] = frame.bondorders_dict()
+        if mtypes:
+            molecule_types.update(frame.column_dict('molid'))
+    
+    result = (neighbours,atomtypes,)
+    if bo: result+=(bondorders,)
+    if mtypes: result+=(molecule_types,)
+    
+    return result
+
+# ---------------------Frame by frame reader---------------------------------
+def iter_bondfile_frames(bondfilepath, cutoff=0.3, fields=None, steps=None, Nevery=1, workers=1):
+    '''
+    Read a bond file one timestep at a time.
+
+    Only the frame being yielded is held in memory, so arbitrarily large
+    bond files can be processed in constant memory. If ``steps`` or
+    ``Nevery`` is given, the frame index (frame_index.get_frame_index) is
+    used to seek straight to the selected frames; the others are not read.
+    Atom-count warnings are printed once the last frame has been read.
+
+    Parameters
+    ----------
+    bondfilepath : str
+        Path to the bonds.reaxc / bonds.out file from LAMMPS.
+    cutoff : float, optional
+        Bond order cutoff stored in every frame. Default is 0.3.
+    fields : iterable of str, optional
+        Extra atom columns to keep: any of 'molid', 'abo', 'nlp' and
+        'charge'. Default is None (atom ids, types and bonds only).
+    steps : iterable of int, optional
+        Only these timesteps, in the given order. Default is None (all).
+    Nevery : int, optional
+        Only every Nevery-th frame (of ``steps`` if given). Default is 1.
+    workers : int, optional
+        Number of processes. With workers>1 the file is split at
+        '# Timestep' boundaries and the chunks are parsed in a process
+        pool; frames are still yielded in file order. Default is 1.
+
+    Yields
+    ------
+    frame : BondFrame
+        Parsed timestep, atoms sorted by id.
+    '''
+    fields = set() if fields is None else set(fields)
+    
+    # declared ('Number of particles') and parsed number of atoms per frame
+    declared, counted = [], []
+    
+    if workers>1 or steps is not None or Nevery!=1:
+        index  = get_frame_index(bondfilepath)
+        frames = index.select(steps, Nevery)
+        if workers>1:
+            parsed = _iter_chunks_parallel(index, frames, cutoff, fields, workers)
+        else:
+            parsed = _iter_chunks(index, frames, cutoff, fields)
+        for frame, natoms in parsed:
+            declared.append(natoms)
+            counted.append(frame.natoms)
+            yield frame
+        check_atom_counts(declared, counted)
+        return
+    
+    for block in iter_blocks(bondfilepath):
+        frame = BondFrame.from_block(block, cutoff, fields)
+        declared.append(frame_header(block)[1])
+        counted.append(frame.natoms)
+        yield frame
+    
+    check_atom_counts(declared, counted)
+
+def _iter_chunks(index, frames, cutoff, fields):
+    # (frame, declared natoms) of the selected frames, read through the index
+    for i in frames:
+        yield from parse_blocks(index.path, index.offsets[i:i+1],
+                                index.lengths[i:i+1], cutoff, fields)
+
+def _iter_chunks_parallel(index, frames, cutoff, fields, workers):
+    # The selected frames are cut into contiguous chunks that are parsed in
+    # a process pool. Workers get byte ranges, not data, and results are
+    # yielded in file order with at most 2*workers chunks in flight.
+    nchunks = min(len(frames), 4*workers)
+    chunks  = np.array_split(frames, nchunks) if nchunks else []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_blocks, index.path,
+                                       index.offsets[chunk], index.lengths[chunk],
+                                       cutoff, fields))
+            if len(pending)>=2*workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def check_atom_counts(declared, counted):
+    '''
+    Print the parser warnings for the per-frame atom counts.
+
+    declared : 'Number of particles' of every frame (None if missing)
+    counted  : number of atom lines parsed for every frame
+    '''
+    known = [n for n in declared if n is not None]
+    if any(a!=b for a, b in zip(known[:-1], known[1:])):
+        print('User warning from get_neighbours function: Lost atom warning!!')
+    if any(n is not None and n!=c for n, c in zip(declared, counted)):
+        print('User warning from get_neighbours function: Repeated atom information detected in some timesteps!')
+
+def read_bondfile_frame(bondfilepath, step, cutoff=0.3, fields=None):
+    '''
+    Parse a single timestep of a bond file (one seek through the frame
+    index). Same arguments as iter_bondfile_frames. Returns a BondFrame.
+    '''
+    fields = set() if fields is None else set(fields)
+    block  = get_frame_index(bondfilepath).read(step)
+    return BondFrame.from_block(block, cutoff, fields)
 
 # ---------------------List of Neighbours-----------------------------------
 @function_runtime
 def parsebondfile(bondfilepath, cutoff=0.3,**kwargs):
+    '''
+    Parse a bond file into the nested-dict layout (BondData views).
+
+    The ``pkl`` keyword caches the parsed data. It used to be a pickle
+    file (``<bondfile>.pickle`` for pkl='yes'); it is now a directory of
+    binary arrays (``<bondfile>.bondcache`` for pkl='yes'), checked
+    against the size and modification time of the bond file, the cutoff
+    and the parsed columns. A ``pkl`` path that is an existing pickle
+    file is still loaded if it is newer than the bond file; a stale one
+    is kept, renamed to ``<pkl>.stale``, and a binary cache is built in
+    its place.
+    '''
     print(f"bond order cutoff {cutoff} is used")
     #10 times faster than version 1
     
@@ -228,8 +335,9 @@ def parsebondfile(bondfilepath, cutoff=0.3,**kwargs):
     nlp             = kwargs.get('nlp',False) # get the number of lone pair
     mols            = kwargs.get('mols',False) # get mtypes wise molecues
     ALL             = kwargs.get('ALL',False) # get everything
-    pkl             = kwargs.get('pkl',None) # Fatser the process (directory)
+    pkl             = kwargs.get('pkl',None) # binary cache directory ('yes': next to the bond file)
     firststep       = kwargs.get('firststep',False) # first step only
+    workers         = kwargs.get('workers',1) # number of processes
     #-------------------------------------
     if firststep:
         pkl = None
@@ -241,139 +349,61 @@ def parsebondfile(bondfilepath, cutoff=0.3,**kwargs):
     #-------------------------------------
     
     
+    # bonddata['bondorders'][step][atom_id1][atom_id2]=bo between atom1 and atom2
+    keys = ['neighbours', 'atypes']
+    if bo or ALL: keys.append('bondorders')
+    if mtypes or ALL: keys.append('mtypes')
+    if charge or ALL: keys.append('charge')
+    if nlp or ALL: keys.append('nlp')
+    if abo or ALL: keys.append('abo')
+    if mols or ALL: keys.append('molecules')
+    if firststep: keys.append('fstep')
+    
+    fields = set()
+    if mtypes or mols or ALL: fields.add('molid')
+    if charge or ALL: fields.add('charge')
+    if nlp or ALL: fields.add('nlp')
+    if abo or ALL: fields.add('abo')
+    
     def parse():
-        bonddata = {}
-        neighbours = {}
-        atomtypes  = {}
-        # bondorders[step][atom_id1][atom_id2]=bo between atom1 and atom2
-        if bo or ALL: bondorders    = {}
-        if mtypes or ALL: molecule_types    = {}
-        if charge or ALL: charges = {}
-        if nlp or ALL: NLP = {}
-        if abo or ALL: ABO = {}
-        if mols or ALL: molecules = {}
         if firststep:
-            fs_flag = False
-        
-        with open(bondfilepath) as bf:
-            prev_natoms = 0
-            natoms_flag = False
-            warning_flag = False
-            first_warning_ignore = True
-            atom_counter = 0
-            
-            for line in bf:
-                splitted = line.split()
-                if line.find('Timestep')!=-1:
-                    step = int(splitted[-1])
-                    
-                    if firststep:
-                        if fs_flag:
-                            break
-                        fs_flag = True
-                        
-                    if bo or ALL: bondorders[step]  = {}
-                    if charge or ALL: charges[step] = {}
-                    if nlp or ALL: NLP[step] = {}
-                    if abo or ALL: ABO[step] = {}
-                    
-                    neighbours[step]={}
-                    atomtypes = {}
-                    
-                if line.find('Number of particles')!=-1:
-                    current_natoms = int(splitted[-1])
-                    
-                    if atom_counter!=current_natoms:
-                        if first_warning_ignore:
-                            first_warning_ignore=False
-                        else:
-                            warning_flag=True
-                        
-                    if natoms_flag and current_natoms!=prev_natoms:
-                        print('User warning from get_neighbours function: Lost atom warning!!')
-                    atom_counter = 0   
-                    prev_natoms  = current_natoms #new change
-                    
-                if splitted != [] and splitted[0].isnumeric():
-                    atom_counter       +=1
-                    parent             = int(splitted[0])
-                    parent_type        = int(splitted[1])
-                    number_of_children = int(splitted[2])
-                    children           = list(map(int,splitted[3:3+number_of_children]))
-                    
-                    # bond orders
-                    bo_id1 = 4+number_of_children
-                    bo_idn = bo_id1+number_of_children
-                    bo_values = list(map(float,splitted[bo_id1:bo_idn]))
-                    
-                    ## cutoffs
-                    updated_children = []
-                    for child,bond_order in zip(children,bo_values):
-                        if bond_order>=cutoff:
-                            updated_children.append(child)
-                    
-                    ## assigning values
-                    neighbours[step][parent] = updated_children
-                    atomtypes[parent]        = parent_type
-                    
-                    if mtypes or ALL:
-                        molecule_types[parent] = int(splitted[3+number_of_children])
-                    if bo or ALL:
-                        bondorders[step][parent]={}
-                        for i,child in enumerate(children):
-                            bondorders[step][parent][child] = bo_values[i]
-                        
-                    if charge or ALL:
-                        charges[step][parent] = float(splitted[-1])
-                    if nlp or ALL:
-                        NLP[step][parent] = float(splitted[-2])
-                    if abo or ALL:
-                        ABO[step][parent] = float(splitted[-3])
-                    if mols or ALL:
-                        mol_type = int(splitted[3+number_of_children])
-                        if mol_type in molecules.keys():
-                            molecules[mol_type].add(parent)
-                        else:
-                            molecules[mol_type] = set()
-            
-            if warning_flag:
-                print('User warning from get_neighbours function: Repeated atom information detected in some timesteps!')
-                
-            bonddata['neighbours'] = neighbours
-            bonddata['atypes'] = atomtypes
-            if bo or ALL: bonddata['bondorders']  = bondorders
-            if mtypes or ALL: bonddata['mtypes']  = molecule_types
-            if charge or ALL: bonddata['charge']  = charges
-            if nlp or ALL: bonddata['nlp'] = NLP
-            if abo or ALL: bonddata['abo'] = ABO
-            if mols or ALL: bonddata['molecules'] = molecules
-            
-            if firststep:
-                for key, data in bonddata.items():
-                    if key in ['neighbours','bondorders']:
-                        for step, info in data.items():
-                            bonddata[key]=info
-                bonddata['fstep'] = step
-            
-            return bonddata
+            frames = islice(iter_bondfile_frames(bondfilepath, cutoff, fields=fields), 1)
+        else:
+            frames = iter_bondfile_frames(bondfilepath, cutoff, fields=fields, workers=workers)
+        return BondData(frames, keys=keys, firststep=firststep)
     
     if pkl is not None:
         if pkl == 'yes':
-            path   = path = bondfilepath[:bondfilepath.rfind('.')]+'.pickle'
+            path = bondfilepath[:bondfilepath.rfind('.')]+'.bondcache'
         else:
             path = pkl
             
-        if os.path.exists(path):
-            # Load data from pickle
-            print('Loading data from pickle...')
-            with open(path, 'rb') as pf:
-                result = pickle.load(pf)
-        else:
-            # Execute the provided function to get the data
-            print('No pickle file exist. Data is dumping for further use.')
-            result = parse()
-            with open(path, 'wb') as pf:
-                pickle.dump(result, pf)
+        result = None
+        if os.path.isfile(path):
+            # cache written by an older version (pickle): it records nothing
+            # about its input, so it is trusted only if newer than the file
+            if os.path.getmtime(path) >= os.path.getmtime(bondfilepath):
+                print('Loading data from pickle...')
+                with open(path, 'rb') as pf:
+                    result = pickle.load(pf)
+            else:
+                stale = path + '.stale'
+                n = 1
+                while os.path.exists(stale):
+                    stale = '{}.stale{}'.format(path, n)
+                    n += 1
+                os.rename(path, stale)
+                warnings.warn('Pickle {} is older than the bond file; moved to {} '
+                              'and replaced by a binary cache.'.format(path, stale))
+        if result is None:
+            result = load_bonddata(path, source=bondfilepath, cutoff=cutoff,
+                                   fields=fields, keys=keys)
+            if result is not None:
+                print('Loading data from cache...')
+            else:
+                print('No valid cache exist. Data is dumping for further use.')
+                result = parse()
+                save_bonddata(result, path, bondfilepath, cutoff, fields)
     
     else:
         result = parse()
@@ -448,22 +478,32 @@ def parsebondfile_asGraph(bondfilepath):
     return atomConnectivity    
     
 #%%---------get molecule from list neighbour-----------------------
-def get_molecules(neigh):
+def get_molecules(neigh, method='csgraph'):
     '''
     Parameters
     ----------
-    neigh : Dictionary
+    neigh : Dictionary or BondFrame
         DESCRIPTION.
-        neighbours of a single timestep or neighbours[step]
+        neighbours of a single timestep or neighbours[step], or a frame
+        from iter_bondfile_frames
+    method : str, optional
+        'csgraph' (array-based, default) or 'networkx' (builds an nx.Graph).
 
     Returns
     -------
-    molecules : Set
+    molecules : list of Set
         DESCRIPTION.
+        atom ids of every molecule
     '''
-    graph = nx.Graph(neigh)
-    molecules = nx.connected_components(graph)    
-    return molecules
+    if method == 'networkx':
+        if isinstance(neigh, BondFrame):
+            neigh = neigh.neighbours_dict()
+        graph = nx.Graph(neigh)
+        molecules = nx.connected_components(graph)    
+        return molecules
+    
+    ids, labels = molecule_labels(neigh)
+    return molecules_from_labels(ids, labels)
 
 #%%-----------get chemical formula-----------------------
 def get_molecular_formula(molecule, atomtypes, atomsymbols, merge: bool = False):
@@ -491,29 +531,8 @@ def get_molecular_formula(molecule, atomtypes, atomsymbols, merge: bool = False)
     for s in species:
         counter[s - 1] += 1
 
-    if merge:
-        # Collapse by element
-        merged_counts = {}
-        for i, sym in enumerate(atomsymbols):
-            if counter[i] != 0:
-                merged_counts[sym] = merged_counts.get(sym, 0) + counter[i]
-
-        # Hill system order: C first, H second, rest alphabetical
-        order = ["C", "H"]
-        formula = ""
-        for elem in order + sorted(set(merged_counts) - set(order)):
-            if elem in merged_counts:
-                n = merged_counts[elem]
-                formula += elem if n == 1 else f"{elem}{n}"
-    else:
-        # Keep original atomtypes separate
-        formula = ""
-        for i in range(len(atomsymbols)):
-            if counter[i] != 0:
-                n = counter[i]
-                formula += atomsymbols[i] if n == 1 else f"{atomsymbols[i]}{n}"
-
-    return formula
+    # string built once per composition (species_analysis)
+    return formula_from_counts(counter, atomsymbols, merge)
 
 #%%---Get All Speceis Count At every Timestep--------
 @function_runtime
@@ -545,13 +564,9 @@ def get_SpeciesCountAtEveryTimestep(neighbours,atomtypes,atomsymbols,exception=[
 
     '''
     #local function
-    def get_species(molecules,atomtypes,atomsymbols): #take the molecule file from get_molecute()
+    def get_species(neigh,atomtypes,atomsymbols): #take the neighbours of a single step
         #atomlist=['H','C','O'], same order as TYPE
-        allspecies = []
-        for molecule in molecules:
-            species = get_molecular_formula(molecule, atomtypes,atomsymbols)
-            allspecies.append(species)
-        allspecies_count = Counter(allspecies)
+        allspecies_count = count_species(neigh, atomsymbols, atomtypes)
         
         return allspecies_count
 
@@ -571,8 +586,7 @@ def get_SpeciesCountAtEveryTimestep(neighbours,atomtypes,atomsymbols,exception=[
     
     stepwise_species_count = {}
     for step,neigh in neighbours.items():
-        molecules = get_molecules(neigh)
-        species_count = get_species(molecules, atomtypes,atomsymbols)
+        species_count = get_species(neigh, atomtypes,atomsymbols)
         
         ## Delete species from the Exception list ##
         for ex in exception: del species_count[ex]
@@ -591,20 +605,108 @@ def stepwise_species_count(neighbours,atomtypes,atomsymbols,step2ps=None):
         ps    = step2picosecond(steps, step2ps)
     for i,items in enumerate(neighbours.items()):
         step,neigh = items
-        molecules = get_molecules(neigh)
-        _sc = {} # species count
-        for molecule in molecules:
-            species = get_molecular_formula(molecule, atomtypes,atomsymbols)
-            if species in _sc.keys():
-                _sc[species]+=1
-            else:
-                _sc[species] = 1
+        _sc = dict(count_species(neigh, atomsymbols, atomtypes)) # species count
                 
         if step2ps:
             _swsc[ps[i]]=_sc
         else:
             _swsc[step]=_sc
     return _swsc    
+#%%---Streaming species count (one frame in memory)--------
+def get_frame_species_count(frame, atomsymbols):
+    '''
+    Species count of a single BondFrame.
+
+    Parameters
+    ----------
+    frame : BondFrame
+        A frame from iter_bondfile_frames (or BondData.frames).
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+
+    Returns
+    -------
+    Counter
+        {molecular formula: number of molecules}.
+    '''
+    return count_species(frame, atomsymbols)
+
+def step2picosecond_stream(*args):
+    '''
+    Incremental version of step2picosecond for steps that arrive one at a
+    time. Takes the same *args and returns a function step -> time (ps).
+    '''
+    if len(args) not in (1, 3):
+        sys.exit('Error: The length of the argument in the step2picosecond() function is not specified correctly.\n')
+    state = {} # previous step and time
+    
+    def convert(current_step):
+        if not state:
+            state['step'] = current_step
+            state['time'] = current_step*args[0]/1000
+        tstep = args[0]
+        if len(args)==3 and current_step>args[2]:
+            tstep = args[1]
+        state['time'] += (current_step-state['step'])*tstep/1000
+        state['step']  = current_step
+        return state['time']
+    return convert
+
+@function_runtime
+def get_SpeciesCountAtEveryTimestep_stream(bondfilepath,atomsymbols,cutoff=0.3,exception=[],step2ps=False,step2psargs=[],minps=-math.inf,maxps=math.inf):
+    '''
+    Same output as get_SpeciesCountAtEveryTimestep, but reads the bond file
+    frame by frame instead of taking the parsed neighbours.
+
+    Parameters
+    ----------
+    bondfilepath : str
+        Path to the bond file.
+    atomsymbols : any iterable
+        Atom symbols in the order of the atom types.
+    cutoff : float, optional
+        Bond order cutoff. The default is 0.3.
+    exception, step2ps, step2psargs, minps, maxps :
+        See get_SpeciesCountAtEveryTimestep.
+
+    Returns
+    -------
+    stepwise_species_count : Dictionary
+        {step (or ps): Counter of species}.
+    '''
+    if step2ps:
+        if not step2psargs:
+            sys.exit('Value error: \'step2psargs\' is empty')
+        convert = step2picosecond_stream(*step2psargs)
+    
+    stepwise_species_count = {}
+    for frame in iter_bondfile_frames(bondfilepath, cutoff):
+        species_count = get_frame_species_count(frame, atomsymbols)
+        
+        ## Delete species from the Exception list ##
+        for ex in exception: del species_count[ex]
+        ##------------------------------------------##
+        key = convert(frame.step) if step2ps else frame.step
+        if minps<=key<maxps:
+            stepwise_species_count[key]=species_count
+    
+    return stepwise_species_count
+
+@function_runtime
+def stepwise_species_count_stream(bondfilepath,atomsymbols,cutoff=0.3,step2ps=None):
+    # same as stepwise_species_count but reads the bond file frame by frame
+    # if requires ps instead of steps set step2ps = timestep
+    _swsc = {} # stepwise specis count _swsc[step][species]=count
+    if step2ps:
+        convert = step2picosecond_stream(step2ps)
+    for frame in iter_bondfile_frames(bondfilepath, cutoff):
+        _sc = dict(get_frame_species_count(frame, atomsymbols))
+        if step2ps:
+            _swsc[convert(frame.step)]=_sc
+        else:
+            _swsc[frame.step]=_sc
+    return _swsc
+
 #%%
 @function_runtime
 def stepwise_species_count_v2(atomtypes,atomsymbols,*args,**kwargs):
@@ -620,14 +722,7 @@ def stepwise_species_count_v2(atomtypes,atomsymbols,*args,**kwargs):
             ps    = step2picosecond(steps, step2ps)
         for i,items in enumerate(neighbours.items()):
             step,neigh = items
-            molecules = get_molecules(neigh)
-            _sc = {} # species count
-            for molecule in molecules:
-                species = get_molecular_formula(molecule, atomtypes,atomsymbols)
-                if species in _sc.keys():
-                    _sc[species]+=1
-                else:
-                    _sc[species] = 1
+            _sc = dict(count_species(neigh, atomsymbols, atomtypes)) # species count
                     
             if step2ps:
                 _swsc[ps[i]]=_sc
@@ -683,7 +778,7 @@ def expression_selector(neighbours,atomtypes,file='expression_selector.txt',atom
                 
 #%%----------Pathway Tracker Of a singler molecule----------------------
 def pathway_tracker(seek_molecule,neighbours,atomtypes,file='pathway_tracker.txt',atomsybols='HCO'):
-    seek_molecule_formula = get_molecular_formula(seek_molecule, atomtypes)
+    seek_molecule_formula = get_molecular_formula(seek_molecule, atomtypes, atomsybols)
     steps = neighbours.keys()
     file = '{}'.format(seek_molecule)+seek_molecule_formula+'_'+file
     
@@ -692,12 +787,16 @@ def pathway_tracker(seek_molecule,neighbours,atomtypes,file='pathway_tracker.txt
         f.write('{}'.format(seek_molecule))
         f.write('-----------------------------------------------------------------\n\n')
         pathway = []
+        seen    = set() # formulas already in pathway
+        seek    = set(seek_molecule)
         for step in steps:
             molecules = get_molecules(neighbours[step])
             for molecule in molecules:
-                formula = get_molecular_formula(molecule,atomtypes,'HCO')
-                intersection = set(seek_molecule) & set(molecule)
-                if intersection and formula not in pathway:
+                if seek.isdisjoint(molecule):
+                    continue
+                formula = get_molecular_formula(molecule,atomtypes,atomsybols)
+                if formula not in seen:
+                    seen.add(formula)
                     pathway.append(formula)
                     f.write('Timestep='+str(step)+'\t')
                     f.write('Molecule: '+formula+'\n')
@@ -1275,26 +1374,18 @@ def bondorder_evolution(bondorders,bondlist,**kwargs):
                         # it   = initial temp
                         # ramp = ramping rate
     
-    steps = list(bondorders.keys())
-    bo_evolution = {}
-    ps = np.array(step2picosecond(steps, ts))
+    # bondorders: nested dict, BondData['bondorders'] or bond file path
+    steps, bo_matrix = _bondorder_matrix(bondorders, bondlist)
+    ps = np.array(step2picosecond(steps.tolist(), ts))
     xlabel = ''#'Time (ps)'
     
     if ps2temp:
         xlabel = 'Temrature (K)'
         it,ramp = ps2temp
         ps = it + ps*ramp
-
-    for index, atompair in enumerate(bondlist):
-        atom1,atom2 = atompair
-        bo_evolution[index+1]={}
-        for step,p in zip(steps,ps):
-            bo = bondorders[step][atom1].get(atom2,0)
-            bo_evolution[index+1][p]=bo
             
     #############-sort-##################       
-    df = pd.DataFrame(bo_evolution)
-    df = df.transpose()    
+    df = pd.DataFrame(bo_matrix, index=range(1,len(bondlist)+1), columns=ps)
     if sort is not None:
         if sort == 'ascending':
             df.loc[:,'sum'] = df.sum(axis=1)
@@ -1366,28 +1457,13 @@ def get_nbondsVStime(bondorders, atomtypes, bondlist,**kwargs):
     
     ## Getting args
     
-    nbonds = []
-    cumu_nbonds = []
-    cumu_count = 0
-    steps  = []
-    for step,bo in bondorders.items():
-        steps.append(step)
-        bondcount = 0
-        for bond in bondlist:
-            atom1, atom2 = bond
-            try:
-                bovalue = bo[atom1][atom2]
-            except:
-                bovalue = 0
-                
-            # if bovalue!=0: print(step,bovalue,end=' | ')
-            if abs(bovalue-cutoff)<=tol:
-                bondcount+=1
-                cumu_count+=1
-        nbonds.append(bondcount)
-        cumu_nbonds.append(cumu_count)
+    # bondorders: nested dict, BondData['bondorders'] or bond file path
+    steps, bo_matrix = _bondorder_matrix(bondorders, bondlist)
+    inrange     = np.abs(bo_matrix-cutoff)<=tol
+    nbonds      = inrange.sum(axis=0).tolist()
+    cumu_nbonds = np.cumsum(nbonds).tolist()
         
-    ps = step2picosecond(steps, ts)
+    ps = step2picosecond(steps.tolist(), ts)
     
     if skipts is not None:
         startid = ps.index(skipts)
@@ -1441,17 +1517,18 @@ def species_to_molecule(bonddata,atomsymbols, species,**kwargs): # species-->mol
     
     seeklist    = []
     seekstep    = []
+    seekset     = set() # frozensets of seeklist, for the membership test
     if dump is not None:
         f = open(dump,'w')
     if shortinfo:
         sf = open(dump[:dump.rfind('.')]+'_shortinfo.txt','w')
     for step,neigh in neighbours.items():
         PRINT = []
-        graph = nx.Graph(neigh)
-        connected = nx.connected_components(graph)
+        connected = get_molecules(neigh)
         for component in connected:
             componentformula = get_molecular_formula(component, atypes, atomsymbols)
-            if componentformula == species and component not in seeklist:                
+            if componentformula == species and frozenset(component) not in seekset:                
+                seekset.add(frozenset(component))
                 seeklist.append(component)
                 seekstep.append(step)
                 # print(step)
@@ -1529,33 +1606,21 @@ def onset_plot(path,whole,atomsymbols,timestep,temp_ramp,initial_temp,**kwargs):
     ax       = kwargs.get('ax',None)
     
     
+    ## Counting the whole molecule in all simulations at once (one process each)
+    bondfilepaths = [path+'\\'+sim+'\\bonds.reaxc' for sim in sim_path]
+    ensemble      = get_species_count_ensemble(bondfilepaths, atomsymbols,
+                                               species=[whole])
+    
+    ## Getting temperatures using steps, timesteps, temp_ramp, initial_temp
     df = pd.DataFrame()
-    ## Iterate over number of simulations
-    for sim in sim_path:
-        bondfilepath = path+'\\'+sim+'\\bonds.reaxc'
-    
-        ## Geting neighbours for each simulations
-        bonddata   = parsebondfile(bondfilepath)
-        neighbours = bonddata['neighbours']
-        atypes     = bonddata['atypes']
-        
-        ## Getting temperatures using steps, timesteps, temp_ramp, initial_temp
-        steps      = np.array(list(neighbours.keys()))
-        time       = steps*timestep/1000  # in piccosecond
-        temp       = initial_temp + time*temp_ramp
-        df['temp'] = temp
-        
-        ##  Getting number of whole
-        nwhole     = []
-        for step, neigh in neighbours.items():
-            count = 0
-            molecules = get_molecules(neigh)
-            for molecule in molecules:
-                species = get_molecular_formula(molecule, atypes, atomsymbols)
-                if species == whole:
-                    count+=1
-            nwhole.append(count)
-        df[sim]=nwhole
+    steps      = ensemble.steps
+    time       = steps*timestep/1000  # in piccosecond
+    temp       = initial_temp + time*temp_ramp
+    df['temp'] = temp
+    
+    ##  Getting number of whole
+    for i, sim in enumerate(sim_path):
+        df[sim] = ensemble.counts[i][:, 0].astype(int)
     
     ## Getting the Upper and Lower bound
     nsim = len(sim_path)
@@ -1596,7 +1661,10 @@ def onset_plot(path,whole,atomsymbols,timestep,temp_ramp,initial_temp,**kwargs):
 @function_runtime
 def get_species_count(bondfilepath: str, atomsymbols: list, cutoff: float = 0.3,
                       timestep: float = None, restart_time: bool = False,
-                      frame_as_index: bool = False, time_as_index: bool = False):
+                      frame_as_index: bool = False, time_as_index: bool = False,
+                      incremental: bool = False, sparse: bool = False,
+                      identify: str = 'formula', workers: int = None,
+                      thresholds=None):
     '''
     Input:
         bondfilepath (str): Path to bond.out file from LAMMPS.
@@ -1606,6 +1674,17 @@ def get_species_count(bondfilepath: str, atomsymbols: list, cutoff: float = 0.3,
         restart_time (bool, optional): If True, resets time from zero. Default is False.
         frame_as_index (bool, optional): Sets index to frame numbers (1-based). Default is False.
         time_as_index (bool, optional): Sets index to simulation time (ps) and drops 'Time' column. Default is False.
+        incremental (bool, optional): Update the count from the bonds changed since the previous frame
+            instead of recounting every frame (IncrementalSpeciesTracker). Same counts; the species
+            columns can come in a different order. Default is False.
+        sparse (bool, optional): Species columns as pandas sparse columns (most species exist in a few
+            frames only). Default is False. SpeciesCounts.from_frames gives the scipy.sparse matrix itself.
+        identify (str, optional): 'formula' (default) or 'smiles'. With 'smiles' the species are
+            isomer-resolved canonical SMILES (e.g. CCO and COC instead of C2H6O); the distinct
+            molecule graphs are converted with RDKit in a process pool and cached (smiles_cache).
+        workers (int, optional): Processes for identify='smiles'. Default is os.cpu_count().
+        thresholds (BondThresholds, optional): Bond typing for identify='smiles' (get_bond_thresholds),
+            to write double/triple bonds. Default is single bonds only.
 
     Output:
         pd.DataFrame: Species time series DataFrame with optional time, frame, and temperature columns.
@@ -1614,25 +1693,20 @@ def get_species_count(bondfilepath: str, atomsymbols: list, cutoff: float = 0.3,
     # Errors    
     if timestep is None and (time_as_index or restart_time):
         raise ValueError("timestep is not given!")
+    if identify not in ('formula', 'smiles'):
+        raise ValueError("identify must be 'formula' or 'smiles'")
+    if identify == 'smiles' and incremental:
+        raise ValueError("incremental counting is available for identify='formula' only")
     ##
 
-    bonddata   = parsebondfile(bondfilepath, cutoff=cutoff)
-    neighbours = bonddata['neighbours']
-    atypes     = bonddata['atypes']
-    
-    count = {}
-    for step, neigh in neighbours.items():
-        molecules = get_molecules(neigh)
-        count[step] = {}
-        for molecule in molecules:
-            species = get_molecular_formula(molecule, atypes, atomsymbols)
-            if species in count[step]:
-                count[step][species]+=1
-            else:
-                count[step][species]=1
-        
-    df = pd.DataFrame(count).fillna(0).T
-    df.index.name = 'Timestep'
+    # frames are read one at a time, only the counts are kept
+    frames = iter_bondfile_frames(bondfilepath, cutoff)
+    if identify == 'smiles':
+        counts = smiles_species_counts(frames, atomsymbols, thresholds=thresholds,
+                                       workers=workers)
+    else:
+        counts = SpeciesCounts.from_frames(frames, atomsymbols, incremental=incremental)
+    df = counts.to_dataframe(sparse=sparse)
     
     if timestep is not None:
         df['Time'] = df.index*timestep/1000
@@ -1652,6 +1726,246 @@ def get_species_count(bondfilepath: str, atomsymbols: list, cutoff: float = 0.3,
     
     return df
 
+def _replica_species_counts(bondfilepath, atomsymbols, cutoff):
+    # worker of get_species_count_ensemble (module level, so it pickles)
+    return SpeciesCounts.from_frames(iter_bondfile_frames(bondfilepath, cutoff),
+                                     atomsymbols)
+
+@function_runtime
+def get_species_count_ensemble(bondfilepaths, atomsymbols, cutoff=0.3,
+                               workers=None, species=None):
+    '''
+    Species counts of replica simulations (e.g. Sim-1/2/3), one process
+    per replica, aligned by step.
+
+    Parameters
+    ----------
+    bondfilepaths : list of str
+        Bond file of every replica.
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    cutoff : float, optional
+        Bond order cutoff. Default is 0.3.
+    workers : int, optional
+        Number of processes. Default is one per replica.
+    species : list of str, optional
+        Species to keep. Default is every species of every replica.
+
+    Returns
+    -------
+    SpeciesEnsemble
+        ``.steps``, ``.species``, per-replica ``.counts`` and the
+        ``.sum``, ``.mean``, ``.std``, ``.min``, ``.max`` arrays
+        (steps x species) over the replicas.
+    '''
+    bondfilepaths = list(bondfilepaths)
+    if workers is None:
+        workers = len(bondfilepaths)
+    if workers > 1 and len(bondfilepaths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(bondfilepaths))) as pool:
+            replicas = list(pool.map(_replica_species_counts, bondfilepaths,
+                                     [atomsymbols]*len(bondfilepaths),
+                                     [cutoff]*len(bondfilepaths)))
+    else:
+        replicas = [_replica_species_counts(path, atomsymbols, cutoff)
+                    for path in bondfilepaths]
+    return SpeciesEnsemble(replicas, species)
+
+@function_runtime
+def track_molecule_lineage(bondfilepath, atomsymbols=None, cutoff=0.3):
+    '''
+    Stable molecule IDs, lifetimes and formation/fragmentation/merge
+    events over a bond file, read frame by frame.
+
+    Parameters
+    ----------
+    bondfilepath : str
+        Path to the bond file.
+    atomsymbols : list of str, optional
+        Atom symbols in the order of the atom types (to record formulas).
+    cutoff : float, optional
+        Bond order cutoff. The default is 0.3.
+
+    Returns
+    -------
+    MoleculeLineage
+        ``.lifetimes()`` and ``.events()`` give the tables.
+    '''
+    lineage = MoleculeLineage(atomsymbols)
+    for frame in iter_bondfile_frames(bondfilepath, cutoff):
+        lineage.update(frame)
+    return lineage
+
+@function_runtime
+def extract_reactions(bondfilepath, atomsymbols, cutoff=0.3, persistence=1,
+                      keep_atoms=True):
+    '''
+    Reactions between consecutive frames of a bond file, read frame by
+    frame, with bond flickers (reactions undone within ``persistence``
+    frames) removed.
+
+    Parameters
+    ----------
+    bondfilepath : str
+        Path to the bond file.
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    cutoff : float, optional
+        Bond order cutoff. The default is 0.3.
+    persistence : int, optional
+        Frames a reaction must survive. The default is 1.
+    keep_atoms : bool, optional
+        Keep the atom ids of every reaction. The default is True.
+
+    Returns
+    -------
+    ReactionExtractor
+        ``.reactions``, ``.table()`` and ``.network(timestep)``.
+    '''
+    extractor = ReactionExtractor(atomsymbols, persistence=persistence,
+                                  keep_atoms=keep_atoms)
+    for frame in iter_bondfile_frames(bondfilepath, cutoff):
+        extractor.update(frame)
+    return extractor.close()
+
+@function_runtime
+def get_species_index(bondfilepath, atomsymbols, cutoff=0.3, rebuild=False,
+                      save=True):
+    '''
+    Inverted index formula -> molecules (atom ids, frames) of a bond file.
+    Built in one pass and saved as <bondfile>.speciesidx.npz; reused while
+    the bond file, cutoff and atomsymbols are unchanged.
+
+    Parameters
+    ----------
+    bondfilepath : str
+        Path to the bond file.
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    cutoff : float, optional
+        Bond order cutoff. The default is 0.3.
+    rebuild : bool, optional
+        Ignore a saved index. The default is False.
+    save : bool, optional
+        Save the index after building it. The default is True.
+
+    Returns
+    -------
+    SpeciesIndex
+        e.g. ``.first_appearance('C2H4O')``, ``.atoms_ever('H2O')``,
+        ``.molecules(formula)``, ``.occurrences(formula)``.
+    '''
+    st   = os.stat(bondfilepath)
+    path = bondfilepath+'.speciesidx.npz'
+    meta = (1, st.st_size, st.st_mtime_ns, float(cutoff), ' '.join(atomsymbols))
+    index = None if rebuild else SpeciesIndex.load(path, meta)
+    if index is None:
+        index = SpeciesIndex.from_frames(iter_bondfile_frames(bondfilepath, cutoff),
+                                         atomsymbols)
+        if save:
+            try:
+                index.save(path, meta)
+            except OSError:
+                pass # read-only location: keep the in-memory index
+    return index
+
+@function_runtime
+def get_bondorder_timeseries(bondfilepath, bondlist, steps=None, Nevery=1,
+                             workers=1):
+    '''
+    Bond order of selected atom pairs over time, read in one pass over the
+    bond file. Only the (npairs x nframes) result is kept in memory; with
+    ``steps`` or ``Nevery`` the frame index skips the other frames.
+
+    Parameters
+    ----------
+    bondfilepath : str
+        Path to the bond file.
+    bondlist : list of (int, int)
+        Atom id pairs.
+    steps, Nevery, workers :
+        Frame selection and processes, see iter_bondfile_frames.
+
+    Returns
+    -------
+    steps : np.ndarray
+        Timestep of every column.
+    bondorders : np.ndarray
+        float32 array (npairs x nframes); 0.0 where the bond is absent.
+    '''
+    pairs = np.asarray(bondlist, dtype=np.int64).reshape(-1, 2)
+    first, second = pairs[:, 0], pairs[:, 1]
+    
+    timesteps, columns = [], []
+    for frame in iter_bondfile_frames(bondfilepath, cutoff=0.0, steps=steps,
+                                      Nevery=Nevery, workers=workers):
+        timesteps.append(frame.step)
+        columns.append(frame.pair_bondorders(first, second))
+    
+    bondorders = np.zeros((len(pairs), len(columns)), dtype=np.float32)
+    for i, column in enumerate(columns):
+        bondorders[:, i] = column
+    return np.array(timesteps, dtype=np.int64), bondorders
+
+def _bondorder_matrix(bondorders, bondlist):
+    # (steps, npairs x nframes matrix) from a bond file path, a BondData
+    # 'bondorders' view or the nested {step: {a: {b: bo}}} dict. Stored
+    # float32 bond orders come back as the float64 values written in the
+    # file (3 decimals), so that comparisons such as |bo-cutoff|<=tol give
+    # the same result as on the parsed text.
+    if isinstance(bondorders, str):
+        steps, matrix = get_bondorder_timeseries(bondorders, bondlist)
+        return steps, np.round(matrix.astype(np.float64), DECIMALS)
+    pairs = np.asarray(bondlist, dtype=np.int64).reshape(-1, 2)
+    if isinstance(bondorders, StepView):
+        frames = bondorders._bonddata.frames
+        steps  = np.array([frame.step for frame in frames], dtype=np.int64)
+        matrix = np.zeros((len(pairs), len(frames)), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            matrix[:, i] = frame.pair_bondorders(pairs[:, 0], pairs[:, 1])
+        return steps, np.round(matrix.astype(np.float64), DECIMALS)
+    steps  = np.array(list(bondorders.keys()), dtype=np.int64)
+    matrix = np.zeros((len(pairs), len(steps)))
+    for i, bo in enumerate(bondorders.values()):
+        for k, (atom1, atom2) in enumerate(pairs.tolist()):
+            matrix[k, i] = bo.get(atom1, {}).get(atom2, 0)
+    return steps, matrix
+
+# (cache key of the call) -> BondThresholds
+_bond_thresholds = {}
+
+def get_bond_thresholds(bondfilepath, n_clusters, steps=None, Nevery=1,
+                        resolution=0.001):
+    '''
+    Bond-type thresholds of a whole trajectory, fitted once.
+
+    The bond orders of the selected frames are streamed into a histogram
+    (bins of ``resolution``, the precision of the bond file) that is
+    clustered with an exact 1-D k-means. The result is cached for the
+    session and is recomputed only if the bond file or the arguments
+    change. Pass it to moleculeGraph2smiles(thresholds=...) so that every
+    molecule is typed with the same thresholds.
+
+    Returns
+    -------
+    BondThresholds
+        ``.classify(bo)`` gives the cluster (1..n_clusters) of bond orders,
+        ``.bond_types(bo)`` the single/double/triple type.
+    '''
+    key = cache_key(get_bond_thresholds, (bondfilepath, n_clusters),
+                    dict(steps=steps, Nevery=Nevery, resolution=resolution))
+    if key not in _bond_thresholds:
+        counts = np.zeros(0, dtype=np.int64)
+        for frame in iter_bondfile_frames(bondfilepath, cutoff=0.0,
+                                          steps=steps, Nevery=Nevery):
+            binned = np.rint(frame.bondorders/resolution).astype(np.int64)
+            frame_counts = np.bincount(binned, minlength=len(counts))
+            frame_counts[:len(counts)] += counts
+            counts = frame_counts
+        _bond_thresholds[key] = BondThresholds.from_histogram(counts, resolution,
+                                                              n_clusters)
+    return _bond_thresholds[key]
+
 #%%
 ## doubt
 @function_runtime
@@ -1736,7 +2050,8 @@ def atomConnectivity2smiles_OLD(atomConnectivity,atypes,atomic_num):
 #%%
 def moleculeGraph2smiles(moleculeGraph, atomic_num,
                          n_clusters, plot_cluster=False,
-                         bo_analysis=True, atom_types=None):
+                         bo_analysis=True, atom_types=None, thresholds=None,
+                         cache=True):
     # moleculeGraph is a networkx Graph (to be speciec subgraph, same
     # shit though) of a single molecule having node attr as atom_type and
     # edge attr as bond_order. This converts molecule graphs to SMILES.
@@ -1744,6 +2059,10 @@ def moleculeGraph2smiles(moleculeGraph, atomic_num,
     warnings.filterwarnings("ignore")
     
     mol = Chem.RWMol()
+    # SMILES of molecules already converted are looked up by graph hash
+    # (smiles_cache); cache: True (shared cache), a SmilesCache or False
+    store = SMILES_CACHE if cache is True else (cache or None)
+    key   = None
     
     # Tips:
     # If the atom IDs in your moleculeGraph graph are not sequential
@@ -1757,37 +2076,20 @@ def moleculeGraph2smiles(moleculeGraph, atomic_num,
     # auto-defining the bond type using unsupervised clustering algorithm
     #######################################################################
     if bo_analysis:
-        bo_list = []
-        for u,v,bond_order in moleculeGraph.edges(data='bond_order'):
-            bo_list.append(bond_order)
-        bo_array = np.array(bo_list).reshape(-1, 1)
-        # Apply KMeans clustering
-    
-        kmeans = KMeans(n_clusters=n_clusters,n_init=10,random_state=0)
-        kmeans.fit(bo_array)
-        labels = kmeans.labels_
-        centroids = kmeans.cluster_centers_
-        
-        ref_bond_orders = [1.0,1.5,2.0]
-        
-        
-        # Assign labels to clusters
-        cluster_labels = {}
-        for i, center in enumerate(centroids):
-            # Find which reference bond order is closest to this cluster center
-            closest_ref_label = np.argmin(np.abs(ref_bond_orders - center)) + 1
-            cluster_labels[i] = closest_ref_label
-        
-        
-        # Labeling each bond order
-        new_labels = [cluster_labels[label] for label in kmeans.labels_]
-        bond_order2type = dict(zip(bo_list,new_labels))
+        bo_list = [bond_order for u,v,bond_order in moleculeGraph.edges(data='bond_order')]
+        bo_array = np.array(bo_list, dtype=float)
+        # thresholds fitted once per trajectory/frame (get_bond_thresholds)
+        # are reused; otherwise the bonds of this molecule are clustered
+        if thresholds is None:
+            thresholds = BondThresholds.fit(bo_array, n_clusters)
+        labels = thresholds.classify(bo_array)-1
+        bond_order2type = dict(zip(bo_list, thresholds.bond_types(bo_array).tolist()))
         
         # Visualize the clusters
         # Create scatter plots for each type
         colors = ['r','b','g','grey','orange','k','cyan']
         if plot_cluster:
-            for i in range(n_clusters):
+            for i in range(thresholds.n_clusters):
                 plt.scatter(np.arange(bo_array.size)[labels == i],
                             bo_array[labels==i],s=60,edgecolor='k',
                             color=colors[i])
@@ -1795,6 +2097,15 @@ def moleculeGraph2smiles(moleculeGraph, atomic_num,
         ######################################################################
         ######################################################################
         
+        if store is not None:
+            bond_classes = {(u, v): bond_order2type[bond_order] for u, v, bond_order
+                            in moleculeGraph.edges(data='bond_order')}
+            key = graph_key(moleculeGraph, 'atom_type', bond_classes,
+                            '|mg2s|{}|bo'.format(list(atomic_num)))
+            smiles = store.get(key)
+            if smiles is not None:
+                return smiles
+        
         ## adding atoms
         atomid2index = {}
         for node, atom_type in moleculeGraph.nodes(data='atom_type'):
@@ -1828,6 +2139,12 @@ def moleculeGraph2smiles(moleculeGraph, atomic_num,
             mol.AddBond(atomid2index[u], atomid2index[v], rdkitBondType)
     
     else: # if bo_analysis == False
+        if store is not None:
+            key = graph_key(moleculeGraph, atom_types,
+                            context='|mg2s|{}'.format(list(atomic_num)))
+            smiles = store.get(key)
+            if smiles is not None:
+                return smiles
         atomid2index = {}
         for node in moleculeGraph.nodes:
             atomicNumber = atomic_num[atom_types[node]-1]
@@ -1848,6 +2165,8 @@ def moleculeGraph2smiles(moleculeGraph, atomic_num,
     
     mol = mol.GetMol()
     smiles = Chem.MolToSmiles(mol)
+    if key is not None:
+        store.put(key, smiles)
     return smiles
 
 #%%
@@ -1855,33 +2174,23 @@ def get_bondtypes(bo,n_clusters,plot=False):
     ## getting all bond orders in a np array
     ## bo is the bond order of of atomconnectivity of each frame
     
-    bo_list = []
-    for atom1, inner_dict in bo.items():
-        for atom2, bond_order in inner_dict.items():
-            if bond_order not in bo_list:
-                bo_list.append(bond_order)
-    
-    bo_array = np.array(bo_list).reshape(-1, 1)
-    # Apply KMeans clustering
-
-    kmeans = KMeans(n_clusters=n_clusters,n_init=10)
-    kmeans.fit(bo_array)
-    
-    # Re-labeling the cluster. min_bo=Label-1, mid_bo=Label-2, max_bo=Label-3
-    # One problem. Only work if single-double-triple, this order maintained
-    # For example: single-triple = won't work; double-triple = won't work
-    # Only single = will work, single-double = will work
-    labels = kmeans.labels_
-    centroids = kmeans.cluster_centers_
-    
-    # Pair up cluster labels with their centroids and sort
-    sorted_clusters = sorted(enumerate(centroids), key=lambda x: x[1])
-    
-    # Create a mapping from old to new labels
-    label_mapping = {old_label: new_label+1 for new_label, (old_label, _) in enumerate(sorted_clusters)}
+    # bo: {atom1: {atom2: bond order}}, a BondFrame or an array
+    if isinstance(bo, BondFrame):
+        values = bo.bondorders
+    elif isinstance(bo, dict):
+        values = np.fromiter((bond_order for inner_dict in bo.values()
+                              for bond_order in inner_dict.values()), dtype=float)
+    else:
+        values = np.asarray(bo, dtype=float).ravel()
+    # unique bond orders in order of appearance
+    _, first = np.unique(values, return_index=True)
+    bo_array = values[np.sort(first)].reshape(-1, 1)
     
-    # Apply the new labels to your data
-    new_labels = [label_mapping[label] for label in labels]
+    # 1-D k-means on the unique values; labels ascend with the centres:
+    # min_bo=Label-1, mid_bo=Label-2, max_bo=Label-3
+    thresholds = BondThresholds.fit(bo_array, n_clusters)
+    new_labels = thresholds.classify(bo_array.ravel())
+    labels     = new_labels-1
     
     # Visualize the clusters
     # Create scatter plots for each type
@@ -1909,7 +2218,7 @@ def assign_speciesID(neighbors,life=False):
             if frozen_molecule not in speciesID:
                 speciesID[frozen_molecule] = uniqueID
                 uniqueID+=1
-                life_frame[frozen_molecule] = (frame,0)
+                life_frame[frozen_molecule] = [frame,frame] # first, last frame
             else:
                 life_frame[frozen_molecule][1] = frame
     
@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Columnar storage for parsed ReaxFF bond-file frames.
+
+A frame keeps its connection table as CSR arrays (offsets, neighbour ids,
+bond orders) plus one array per requested atom column, instead of the
+nested ``neighbours[step][atom]`` / ``bondorders[step][a][b]`` dicts.
+``BondData`` holds the frames and exposes the old ``bonddata[key]`` layout
+through read-only views that build the dicts of one frame at a time.
+"""
+
+import numpy as np
+from functools import partial
+from collections.abc import Mapping
+from magnolia.frame_reader import MappedFile, parse_numbers
+
+## List of classes/functions ##
+# 1. BondFrame
+# 2. BondData
+# 3. StepView
+# 4. frame_header
+# 5. parse_blocks
+
+ID_DTYPE     = np.int32
+TYPE_DTYPE   = np.int16
+OFFSET_DTYPE = np.int32
+BO_DTYPE     = np.float32
+FLOAT_DTYPE  = np.float32
+
+# optional per-atom columns (besides id and type) of a bond-file row
+COLUMNS = ('molid', 'abo', 'nlp', 'charge')
+
+# decimals of the bond orders, abo, nlp and q written by fix reaxff/bonds;
+# the float32 values are rounded back to them for the nested dicts
+DECIMALS = 3
+
+#%%
+def _csr_take(offsets, rows):
+    '''
+    Gather the CSR segments of ``rows`` (in that order).
+
+    Returns the new offsets array and the index array that picks the
+    matching entries out of the old neighbour/bond-order arrays.
+    '''
+    counts      = (offsets[1:] - offsets[:-1])[rows]
+    new_offsets = np.zeros(len(rows)+1, dtype=OFFSET_DTYPE)
+    np.cumsum(counts, out=new_offsets[1:])
+    take = np.repeat(offsets[:-1][rows] - new_offsets[:-1], counts)
+    take += np.arange(new_offsets[-1], dtype=take.dtype)
+    return new_offsets, take
+
+#%%
+class BondFrame:
+    '''
+    One timestep of a bond file stored as CSR arrays.
+
+    Atoms are sorted by id. The bonds of the atom in row ``i`` are
+    ``neighbours[offsets[i]:offsets[i+1]]`` with the bond orders at the
+    same positions of ``bondorders``. If the file did not list the atoms
+    by id (multi-process runs), ``order`` keeps its order: the k-th atom
+    line is row ``order[k]``; it is ``None`` for a sorted file. Every bond written in the file is
+    kept; the bond-order ``cutoff`` is applied when the connectivity is
+    asked for, so the same frame can be re-cut without reparsing.
+
+    Optional atom columns (``molid``, ``abo``, ``nlp``, ``charge``) are
+    ``None`` unless they were requested while parsing.
+    '''
+    __slots__ = ('step', 'ids', 'types', 'offsets', 'neighbours',
+                 'bondorders', 'cutoff', 'molid', 'abo', 'nlp', 'charge',
+                 'order')
+
+    def __init__(self, step, ids, types, offsets, neighbours, bondorders,
+                 cutoff=0.0, order=None, **columns):
+        self.step       = int(step)
+        self.ids        = ids
+        self.types      = types
+        self.offsets    = offsets
+        self.neighbours = neighbours
+        self.bondorders = bondorders
+        self.cutoff     = cutoff
+        self.order      = order
+        for name in COLUMNS:
+            setattr(self, name, columns.get(name))
+
+    @classmethod
+    def from_rows(cls, step, rows, cutoff=0.0, columns=()):
+        '''
+        Build a frame from the split atom lines of one timestep.
+
+        Parameters
+        ----------
+        step : int
+            Timestep of the frame.
+        rows : list of list of str
+            ``line.split()`` of every atom line
+            (``id type nb id_1...id_nb mol bo_1...bo_nb abo nlp q``).
+        cutoff : float, optional
+            Bond order cutoff used by ``bonded``. Default is 0.0.
+        columns : iterable of str, optional
+            Atom columns to keep, any of ``COLUMNS``.
+
+        Returns
+        -------
+        BondFrame
+        '''
+        natoms = len(rows)
+        ids    = np.empty(natoms, dtype=ID_DTYPE)
+        types  = np.empty(natoms, dtype=TYPE_DTYPE)
+        counts = np.empty(natoms, dtype=OFFSET_DTYPE)
+        children, bo_values, molid = [], [], []
+        for i, splitted in enumerate(rows):
+            nb        = int(splitted[2])
+            ids[i]    = int(splitted[0])
+            types[i]  = int(splitted[1])
+            counts[i] = nb
+            children.extend(splitted[3:3+nb])
+            molid.append(splitted[3+nb])
+            bo_values.extend(splitted[4+nb:4+2*nb])
+
+        offsets = np.zeros(natoms+1, dtype=OFFSET_DTYPE)
+        np.cumsum(counts, out=offsets[1:])
+        neighbours = np.array(children, dtype=np.int64).astype(ID_DTYPE)
+        bondorders = np.array(bo_values, dtype=np.float64).astype(BO_DTYPE)
+
+        data = {}
+        if 'molid' in columns:
+            data['molid'] = np.array(molid, dtype=np.int64).astype(ID_DTYPE)
+        # abo, nlp and q are the last three tokens of every row
+        for name, pos in (('abo', -3), ('nlp', -2), ('charge', -1)):
+            if name in columns:
+                data[name] = np.array([s[pos] for s in rows],
+                                      dtype=np.float64).astype(FLOAT_DTYPE)
+
+        frame = cls(step, ids, types, offsets, neighbours, bondorders,
+                    cutoff=cutoff, **data)
+        frame.sort()
+        return frame
+
+    @classmethod
+    def from_bytes(cls, step, data, cutoff=0.0, columns=()):
+        '''
+        Build a frame from the atom lines of one timestep in one shot.
+
+        The whole block is converted to numbers by a single C-level call;
+        the rows are then located from the token count of every line and
+        every field is gathered with fancy indexing. A row has
+        ``2*nb + 7`` tokens, so ``nb`` fixes the position of every field.
+
+        Parameters
+        ----------
+        step : int
+            Timestep of the frame.
+        data : bytes
+            Atom lines only (no '#' lines).
+        cutoff, columns :
+            See ``from_rows``.
+
+        Returns
+        -------
+        BondFrame, or None if the block is not a regular bond-file table
+        (the caller then falls back to ``from_rows``).
+        '''
+        chars = np.frombuffer(data, dtype=np.uint8)
+        space = chars <= 32 # blank, tab, CR, LF
+        start = ~space
+        start[1:] &= space[:-1]
+        token_pos = np.flatnonzero(start)
+        # number of tokens on every non-empty line
+        line_ends = np.searchsorted(token_pos, np.flatnonzero(chars == 10))
+        per_line  = np.diff(line_ends, prepend=0, append=len(token_pos))
+        per_line  = per_line[per_line > 0]
+
+        values = parse_numbers(data)
+        if values is None or len(values) != len(token_pos) or len(per_line) == 0:
+            return None
+
+        first = np.zeros(len(per_line), dtype=np.int64) # first token of a row
+        np.cumsum(per_line[:-1], out=first[1:])
+        nb = values[first+2].astype(np.int64)
+        if np.any(per_line != 2*nb+7):
+            return None
+
+        offsets = np.zeros(len(first)+1, dtype=OFFSET_DTYPE)
+        np.cumsum(nb, out=offsets[1:])
+        take = np.repeat(first + 3 - offsets[:-1], nb)
+        take += np.arange(offsets[-1], dtype=np.int64)
+
+        ids        = values[first].astype(ID_DTYPE)
+        types      = values[first+1].astype(TYPE_DTYPE)
+        neighbours = values[take].astype(ID_DTYPE)
+        bondorders = values[take + np.repeat(nb+1, nb)].astype(BO_DTYPE)
+
+        data = {}
+        if 'molid' in columns:
+            data['molid'] = values[first+3+nb].astype(ID_DTYPE)
+        # abo, nlp and q are the last three tokens of every row
+        for name, shift in (('abo', 4), ('nlp', 5), ('charge', 6)):
+            if name in columns:
+                data[name] = values[first+shift+2*nb].astype(FLOAT_DTYPE)
+
+        frame = cls(step, ids, types, offsets, neighbours, bondorders,
+                    cutoff=cutoff, **data)
+        frame.sort()
+        return frame
+
+    @classmethod
+    def from_block(cls, block, cutoff=0.0, columns=()):
+        '''
+        Build a frame from the raw text of one timestep, starting at its
+        '# Timestep' line: bytes, str, or a memoryview slice of a mapped
+        file (frame_reader), which is read without copying the file.
+        '''
+        if isinstance(block, str):
+            block = block.encode()
+        step  = frame_header(block)[0]
+        chars = np.frombuffer(block, dtype=np.uint8)
+
+        # atom lines are the non-comment text between the '#' lines of the
+        # header and the closing '#' line of the frame
+        hashes   = np.flatnonzero(chars == 35)
+        newlines = np.flatnonzero(chars == 10)
+        after    = np.searchsorted(newlines, hashes)
+        ends     = np.append(newlines, len(chars)-1)[after] + 1
+        gaps     = [(a, b) for a, b in zip(ends, np.append(hashes[1:], len(chars)))
+                    if np.any(chars[a:b] > 32)]
+
+        frame = None
+        if len(gaps) == 1:
+            begin, end = gaps[0]
+            frame = cls.from_bytes(step, bytes(block[begin:end]), cutoff, columns)
+        if frame is None:
+            rows = []
+            for line in bytes(block).decode().splitlines():
+                splitted = line.split()
+                if splitted and splitted[0].isnumeric():
+                    rows.append(splitted)
+            frame = cls.from_rows(step, rows, cutoff, columns)
+        return frame
+
+    #---------------------------------------------------------------------
+    @property
+    def natoms(self):
+        return len(self.ids)
+
+    @property
+    def nbonds(self):
+        return len(self.neighbours)
+
+    @property
+    def nbytes(self):
+        arrays = [self.ids, self.types, self.offsets, self.neighbours,
+                  self.bondorders, self.order] + [getattr(self, c) for c in COLUMNS]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def sort(self):
+        '''
+        Reorder the rows by atom id (no-op if already sorted) and keep
+        the previous order in ``order``.
+        '''
+        if self.natoms < 2 or np.all(self.ids[1:] > self.ids[:-1]):
+            return
+        order = np.argsort(self.ids, kind='stable')
+        # new row of every atom line
+        lines = np.empty(self.natoms, dtype=ID_DTYPE)
+        lines[order] = np.arange(self.natoms, dtype=ID_DTYPE)
+        self.order = lines if self.order is None else lines[self.order]
+        self.offsets, take = _csr_take(self.offsets, order)
+        self.neighbours    = self.neighbours[take]
+        self.bondorders    = self.bondorders[take]
+        self.ids           = self.ids[order]
+        self.types         = self.types[order]
+        for name in COLUMNS:
+            column = getattr(self, name)
+            if column is not None:
+                setattr(self, name, column[order])
+
+    def rows(self, atoms):
+        '''Row positions of the given atom ids (-1 if missing).'''
+        atoms = np.asarray(atoms)
+        pos   = np.searchsorted(self.ids, atoms)
+        pos   = np.minimum(pos, max(self.natoms-1, 0))
+        found = self.ids[pos] == atoms if self.natoms else np.zeros(atoms.shape, bool)
+        return np.where(found, pos, -1)
+
+    def pair_bondorders(self, first, second):
+        '''
+        Written bond order of every (first[k], second[k]) pair, 0.0 if the
+        bond (or the atom) is not in the frame. Only the rows of ``first``
+        are searched.
+        '''
+        first  = np.asarray(first)
+        second = np.asarray(second, dtype=self.neighbours.dtype)
+        values = np.zeros(len(first), dtype=BO_DTYPE)
+        rows   = self.rows(first)
+        known  = np.flatnonzero(rows >= 0)
+        offsets, take = _csr_take(self.offsets, rows[known])
+        counts = np.diff(offsets)
+        hit    = self.neighbours[take] == np.repeat(second[known], counts)
+        pair   = np.repeat(known, counts)[hit]
+        # last written value wins, as in the dict layout
+        values[pair] = self.bondorders[take[hit]]
+        return values
+
+    def bond_mask(self, cutoff=None):
+        '''Boolean mask of the bonds with bond order >= cutoff.'''
+        if cutoff is None:
+            cutoff = self.cutoff
+        # compare in float32 so that e.g. a written "0.350" passes 0.35
+        return self.bondorders >= BO_DTYPE(cutoff)
+
+    def bonded(self, cutoff=None):
+        '''
+        Connection table after applying the bond order cutoff.
+
+        Returns
+        -------
+        offsets, neighbours : np.ndarray
+            CSR arrays aligned with ``ids``.
+        '''
+        mask = self.bond_mask(cutoff)
+        if mask.all():
+            return self.offsets, self.neighbours
+        kept = np.zeros(len(mask)+1, dtype=OFFSET_DTYPE)
+        np.cumsum(mask, out=kept[1:])
+        return kept[self.offsets], self.neighbours[mask]
+
+    def edges(self, cutoff=None):
+        '''Bonded (parent, child) atom id pairs as two arrays.'''
+        offsets, neighbours = self.bonded(cutoff)
+        parents = np.repeat(self.ids, np.diff(offsets))
+        return parents, neighbours
+
+    #-------compatibility with the nested-dict layout---------------------
+    # the dicts list the atoms in the order of the file, as the old parser
+
+    def _file_rows(self):
+        return range(self.natoms) if self.order is None else self.order.tolist()
+
+    def neighbours_dict(self, cutoff=None):
+        '''{atom: [bonded atoms]} as returned by the old parser.'''
+        offsets, neighbours = self.bonded(cutoff)
+        off, nbrs = offsets.tolist(), neighbours.tolist()
+        ids = self.ids.tolist()
+        return {ids[i]: nbrs[off[i]:off[i+1]] for i in self._file_rows()}
+
+    def bondorders_dict(self):
+        '''{atom: {child: bond order}} for every written bond.'''
+        off  = self.offsets.tolist()
+        nbrs = self.neighbours.tolist()
+        bos  = np.round(self.bondorders.astype(np.float64), DECIMALS).tolist()
+        ids  = self.ids.tolist()
+        return {ids[i]: dict(zip(nbrs[off[i]:off[i+1]], bos[off[i]:off[i+1]]))
+                for i in self._file_rows()}
+
+    def column_dict(self, name):
+        '''{atom: value} of the atom column ``name``.'''
+        if name == 'types':
+            column = self.types
+        else:
+            column = getattr(self, name)
+        if column is None:
+            raise KeyError("column '{}' was not parsed".format(name))
+        if column.dtype.kind == 'f':
+            column = np.round(column.astype(np.float64), DECIMALS)
+        if self.order is not None:
+            return dict(zip(self.ids[self.order].tolist(),
+                            column[self.order].tolist()))
+        return dict(zip(self.ids.tolist(), column.tolist()))
+
+    def __repr__(self):
+        return 'BondFrame(step={}, natoms={}, nbonds={})'.format(
+            self.step, self.natoms, self.nbonds)
+
+#%%
+class StepView(Mapping):
+    '''
+    Read-only ``{step: per-frame dict}`` view over a BondData.
+
+    The per-frame dict is built on access and only the last one is kept,
+    so iterating over all steps needs the memory of a single frame, and
+    repeated lookups in one frame (``view[step][atom]`` in a loop over
+    atoms) build its dict once.
+    '''
+    def __init__(self, bonddata, getter):
+        self._bonddata = bonddata
+        self._getter   = getter
+        self._frame    = None # frame of the memoized dict
+        self._value    = None
+
+    def __getitem__(self, step):
+        frame = self._bonddata.frame(step)
+        if frame is not self._frame:
+            self._value = self._getter(frame)
+            self._frame = frame
+        return self._value
+
+    def __iter__(self):
+        return iter(self._bonddata.steps)
+
+    def __len__(self):
+        return len(self._bonddata.frames)
+
+#%%
+class BondData(Mapping):
+    '''
+    Parsed bond file: a list of BondFrame objects in step order.
+
+    Indexing with the keys of the old ``parsebondfile`` dictionary
+    ('neighbours', 'atypes', 'bondorders', 'mtypes', 'charge', 'nlp',
+    'abo', 'molecules', 'fstep') returns the data in the old layout, so
+    existing code keeps working. Step-keyed entries are ``StepView``
+    objects that build one frame's dict at a time. As in the old parser,
+    'atypes' is the {atom: type} of the last frame, while 'mtypes' and
+    'molecules' cover the atoms of all frames.
+    '''
+    def __init__(self, frames=(), keys=('neighbours', 'atypes'),
+                 firststep=False):
+        self.frames    = []
+        self.firststep = firststep
+        self._keys     = list(keys)
+        self._index    = {} # step -> position in frames
+        self._views    = {} # key -> StepView, reused so its memo is shared
+        for frame in frames:
+            self.append(frame)
+
+    @classmethod
+    def from_frames(cls, frames, keys=('neighbours', 'atypes'),
+                    firststep=False):
+        '''
+        Wrap frames that already have unique steps and shared columns
+        (e.g. read from a cache) without comparing their arrays.
+        '''
+        bonddata = cls(keys=keys, firststep=firststep)
+        bonddata.frames = list(frames)
+        bonddata._index = {frame.step: i for i, frame in enumerate(bonddata.frames)}
+        return bonddata
+
+    def append(self, frame):
+        '''
+        Add a frame. A repeated step replaces the earlier frame in place.
+        Atom columns equal to the previous frame's are shared, not copied.
+        '''
+        if self.frames:
+            prev = self.frames[-1]
+            for name in ('ids', 'types', 'order') + COLUMNS:
+                a, b = getattr(prev, name), getattr(frame, name)
+                if a is not None and b is not None and a is not b \
+                        and a.shape == b.shape and np.array_equal(a, b):
+                    setattr(frame, name, a)
+
+        if frame.step in self._index:
+            self.frames[self._index[frame.step]] = frame
+        else:
+            self._index[frame.step] = len(self.frames)
+            self.frames.append(frame)
+
+    @property
+    def steps(self):
+        return [frame.step for frame in self.frames]
+
+    @property
+    def nbytes(self):
+        seen, total = set(), 0
+        for frame in self.frames:
+            for name in BondFrame.__slots__[1:]:
+                array = getattr(frame, name)
+                if isinstance(array, np.ndarray) and id(array) not in seen:
+                    seen.add(id(array))
+                    total += array.nbytes
+        return total
+
+    def frame(self, step):
+        return self.frames[self._index[step]]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+
+        if key == 'neighbours':
+            if self.firststep:
+                return self.frames[0].neighbours_dict()
+            return self._view(key, BondFrame.neighbours_dict)
+        if key == 'bondorders':
+            if self.firststep:
+                return self.frames[0].bondorders_dict()
+            return self._view(key, BondFrame.bondorders_dict)
+        if key == 'atypes':
+            return self.frames[-1].column_dict('types') if self.frames else {}
+        if key == 'mtypes':
+            return self._merged_column('molid')
+        if key in ('charge', 'nlp', 'abo'):
+            return self._view(key, partial(BondFrame.column_dict, name=key))
+        if key == 'molecules':
+            molecules = {}
+            for atom, molid in self._merged_column('molid').items():
+                molecules.setdefault(molid, set()).add(atom)
+            return molecules
+        if key == 'fstep':
+            return self.frames[0].step
+
+    def __getstate__(self):
+        # the views hold the dict of a frame: rebuilt on access instead
+        state = self.__dict__.copy()
+        state['_views'] = {}
+        return state
+
+    def _view(self, key, getter):
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = StepView(self, getter)
+        return view
+
+    def _merged_column(self, name):
+        # {atom: value} over all frames, later frames win. Shared arrays
+        # (the usual case for molecule ids) are read once.
+        merged = {}
+        seen   = set()
+        for frame in self.frames:
+            ids    = frame.ids
+            column = getattr(frame, name)
+            if (id(ids), id(column)) in seen:
+                continue
+            seen.add((id(ids), id(column)))
+            merged.update(zip(ids.tolist(), column.tolist()))
+        return merged
+
+    def __repr__(self):
+        return 'BondData(nframes={}, keys={})'.format(len(self.frames),
+                                                     self._keys)
+
+#%%
+def frame_header(block):
+    '''
+    Timestep and declared number of particles of one frame block.
+
+    Parameters
+    ----------
+    block : bytes
+        Raw text of a frame, starting at its '# Timestep' line.
+
+    Returns
+    -------
+    step, natoms : int
+        natoms is None if the header has no 'Number of particles' line.
+    '''
+    step, natoms = None, None
+    for line in bytes(block[:1024]).splitlines():
+        if not line.startswith(b'#'):
+            break
+        if b'Timestep' in line:
+            step = int(line.split()[-1])
+        elif b'Number of particles' in line:
+            natoms = int(line.split()[-1])
+    return step, natoms
+
+def parse_blocks(path, offsets, lengths, cutoff=0.0, columns=()):
+    '''
+    Parse the frames stored at the given byte ranges of a bond file.
+
+    Used as the worker of the parallel reader, so it only needs the file
+    path and the ranges, not the data.
+
+    Returns
+    -------
+    list of (BondFrame, int)
+        Every frame with the number of particles declared in its header.
+    '''
+    parsed = []
+    with MappedFile(path) as mf:
+        for offset, length in zip(offsets, lengths):
+            block = mf.block(offset, length)
+            parsed.append((BondFrame.from_block(block, cutoff, columns),
+                           frame_header(block)[1]))
+            block.release()
+    return parsed
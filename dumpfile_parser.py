@@ -12,8 +12,10 @@ import sys
 import numpy as np
 import pandas as pd
 import networkx as nx
-from scipy.spatial import cKDTree
 from sklearn.cluster import DBSCAN
+from magnolia.trajectory import Trajectory, msd_fft
+from magnolia.dumpframe import DumpFrame, iter_dump_frames, imap_dump_frames
+from magnolia.geometric_bonds import find_bonds, covalent_radii
 
 
 def function_runtime(f):
@@ -80,132 +82,152 @@ def parsedumpfile_OLD(dumpfile,**kwargs):
     return dumpdata
 
 @function_runtime
-def parsedumpfile(dumpfile, Nfreq=1, **kwargs):
+def parsedumpfile(dumpfile, Nfreq=1, structured=False, **kwargs):
     """
     Parses a LAMMPS dump file and extracts atomic data for selected timesteps.
 
-    This function reads the file line by line and constructs a dictionary of
-    DataFrames, each representing atomic data for a specific timestep. Only
-    every `Nfreq`-th timestep is stored, based on the given sampling frequency.
+    The file is memory-mapped and the frames are located by their
+    'ITEM: TIMESTEP' lines; only every `Nfreq`-th frame is decoded. The
+    ATOMS block of a frame ('ITEM: NUMBER OF ATOMS' lines) is converted
+    to numbers in one call (dumpframe.DumpFrame).
 
     Parameters
     ----------
     dumpfile : str
         Path to the LAMMPS dump file to parse.
     Nfreq : int, optional
-        Sampling frequency. Only every Nfreq-th timestep is parsed. Default is 1.
+        Sampling frequency. Only every Nfreq-th timestep is parsed, starting
+        with the first one (frames 0, Nfreq, 2*Nfreq, ...). Default is 1.
+        Changed: the line-by-line parser of earlier versions picked the
+        frames shifted by one (e.g. Nfreq=2 on steps 0, 100, 200, 300 gave
+        only 100), so Nfreq>1 now selects different frames.
+    structured : bool, optional
+        If True, return DumpFrame objects (NumPy structured arrays, plus
+        box and boundary) instead of DataFrames. Default is False.
     **kwargs : dict
         Placeholder for future keyword arguments (currently unused).
 
     Returns
     -------
-    dumpdata : dict of pandas.DataFrame
+    dumpdata : dict of pandas.DataFrame (or DumpFrame)
         Dictionary where keys are timestep integers and values are DataFrames
         containing atom-level data for that timestep.
 
     Notes
     -----
-    - Columns like 'id', 'mol', and 'type' are cast to `int`.
-    - Positions (`x`, `y`, `z`) and other numerical values are cast to `float`.
-    - If a value cannot be cast to `int` or `float`, it remains as a string.
-    - Column headers are taken from the `ITEM: ATOMS` section of the dump file.
+    - Columns 'id', 'mol', 'type', 'proc', 'ix', 'iy', 'iz' are `int`,
+      'element' is a string, every other column is `float`.
+    - Column headers are taken from the `ITEM: ATOMS` section of the dump file;
+      in the DataFrames 'xu', 'yu', 'zu' are renamed to 'x', 'y', 'z'.
+    - The box bounds and boundary flags of every frame are kept in
+      `DataFrame.attrs['box']` and `DataFrame.attrs['boundary']`
+      (used by creat_graph_network for bonds across periodic boundaries).
     """
-
-    with open(dumpfile) as df:
-        state    = None # timestep, atoms, skip
-        step     = None
-        step_count = 0 # for Nfreq
-        
-        dumpdata   = {}
-        ATOM = []
-        for line in df:
-            splitted = line.split()  
-            
-            # flagging
-            if splitted[-1]=='TIMESTEP':
-                step_count+=1
-                state = 'timestep'
-                continue
-            
-            if line.startswith('ITEM: ATOMS'):
-                column_heads = splitted[2:]
-                for i in range(len(column_heads)):
-                    if column_heads[i]=='xu': column_heads[i]='x'
-                    if column_heads[i]=='yu': column_heads[i]='y'
-                    if column_heads[i]=='zu': column_heads[i]='z'
-                state = 'atoms'
-                continue
-                
-            # get values
-            if state=='timestep':
-                if step is not None and (step_count-1)%Nfreq==0:
-                    dumpdata[step] = pd.DataFrame(ATOM, columns=column_heads)
-                ATOM = []
-                step = int(splitted[0])
-                state = None
-                
-            if state=='atoms':
-                for i in range(len(splitted)):
-                    try:
-                        if i < 3:
-                            try:
-                                splitted[i] = int(splitted[i])
-                            except ValueError:
-                                splitted[i] = float(splitted[i])
-                        else:
-                            splitted[i] = float(splitted[i])
-                    except ValueError:
-                        print('--')
-                        pass  # leave as original string
-
-
-                ATOM.append(splitted.copy())
-    if (step_count-1)%Nfreq==0:
-        dumpdata[step] = pd.DataFrame(ATOM, columns=column_heads)
+    dumpdata = {}
+    for frame in iter_dump_frames(dumpfile, Nfreq):
+        if structured:
+            dumpdata[frame.step] = frame
+        else:
+            snapshot = frame.to_dataframe().rename(
+                columns={'xu': 'x', 'yu': 'y', 'zu': 'z'})
+            snapshot.attrs['box']      = frame.box
+            snapshot.attrs['boundary'] = frame.boundary
+            dumpdata[frame.step] = snapshot
     return dumpdata
 
 def add_element_symbols(dumpdata, datafile):
     import magnolia.lammps_datafile_parser as ldfp
     masses, atoms, bonds = ldfp.parse_lammps_data(datafile)
     
+    # one type -> symbol table for all frames (no merge per frame)
+    type2symbol = pd.Series(masses['symbol'].values, index=masses['type'].values)
     for step, snapshot in dumpdata.items():
-        snapshot = snapshot.merge(masses[['type', 'symbol']], on='type', how='left')
-        dumpdata[step] = snapshot
+        dumpdata[step] = snapshot.assign(symbol=snapshot['type'].map(type2symbol).values)
     
     return dumpdata
 
 @function_runtime
-def creat_graph_network(dumpdata_with_symbols, bond_tolerance=0.1):
+def creat_graph_network(dumpdata_with_symbols, bond_tolerance=0.1, box=None,
+                        boundary=None, as_graph=True, radii=None, atomsymbols=None,
+                        Nfreq=1, workers=1):
+    """
+    Distance-based bonds of every frame (geometric_bonds.find_bonds): two
+    atoms are bonded if they are closer than the sum of their covalent
+    radii plus bond_tolerance, across periodic boundaries too.
+
+    Parameters
+    ----------
+    dumpdata_with_symbols : dict
+        {step: DataFrame} with 'id', 'x', 'y', 'z' and 'symbol' (see
+        add_element_symbols) or 'element' columns, or {step: DumpFrame}
+        (parsedumpfile(structured=True)), or the path to a dump file: its
+        frames are then read and bonded in parallel (map_dumpfile).
+    bond_tolerance : float, optional
+        Added to the sum of the covalent radii. Default is 0.1.
+    box : np.ndarray, optional
+        Box bounds (3 x 2, or 3 x 3 triclinic) of all frames. Default is
+        None: the frame's own box (DumpFrame.box, or the DataFrame.attrs
+        'box' set by parsedumpfile); no periodicity for DataFrames without
+        one.
+    boundary : sequence of str, optional
+        Boundary flags, e.g. ('pp', 'pp', 'ff'). Default is the frame's
+        own flags with its own box, else periodic.
+    as_graph : bool, optional
+        If True (default) every frame is an nx.Graph; if False it is a
+        pair of arrays (atom ids of the bonded atoms, each bond once).
+    radii : dict, optional
+        Covalent radii overriding geometric_bonds.COVALENT_RADII.
+    atomsymbols : list of str, optional
+        Element of every atom type, for DumpFrames without 'element'.
+    Nfreq : int, optional
+        Every Nfreq-th frame, when a dump file path is given. Default is 1.
+    workers : int, optional
+        Number of processes, when a dump file path is given; None uses
+        all CPUs. Default is 1.
+
+    Returns
+    -------
+    network : dict
+        {step: nx.Graph} or {step: (ids1, ids2)}.
+    """
     network = {}
-    covalent_radii = {'H': 0.31, 'C': 0.76, 'O': 0.66}
+
+    if isinstance(dumpdata_with_symbols, str):
+        frames = imap_dump_frames(dumpdata_with_symbols, frame_bonds, Nfreq=Nfreq,
+                                  workers=workers, atomsymbols=atomsymbols,
+                                  bond_tolerance=bond_tolerance, box=box,
+                                  boundary=boundary, radii=radii, with_ids=True)
+        for step, (ids, bonded1, bonded2) in frames:
+            network[step] = _bond_network(ids, bonded1, bonded2, as_graph)
+        return network
 
     for step, snapshot in dumpdata_with_symbols.items():
-        coords = snapshot[['x', 'y', 'z']].values
-        symbols = snapshot['symbol'].values
-        ids = snapshot['id'].values
-
-        radii = np.array([covalent_radii[s] for s in symbols])
-        tree = cKDTree(coords)
-
-        # Step 1: broad query
-        candidate_pairs = tree.query_pairs(r=(radii.max() * 2 + bond_tolerance))
-
-        # Step 2: precise filtering by actual distance and pairwise cutoff
-        bonds = []
-        for i, j in candidate_pairs:
-            dist = np.linalg.norm(coords[i] - coords[j])
-            cutoff = radii[i] + radii[j] + bond_tolerance
-            if dist <= cutoff:
-                # Use atom IDs, not just indices
-                bonds.append((ids[i], ids[j]))
-
-        G = nx.Graph()
-        G.add_nodes_from(ids)     # Make sure all atoms are in the graph
-        G.add_edges_from(bonds)   # Add valid bonds
-        network[step] = G
+        if isinstance(snapshot, DumpFrame):
+            ids, bonded1, bonded2 = frame_bonds(snapshot, atomsymbols, bond_tolerance,
+                                                box, boundary, radii, with_ids=True)
+        else:
+            coords  = snapshot[['x', 'y', 'z']].values
+            ids     = snapshot['id'].values
+            symbols = snapshot['symbol' if 'symbol' in snapshot else 'element'].values
+            frame_box, frame_boundary = box, boundary
+            if frame_box is None:
+                frame_box = snapshot.attrs.get('box')
+                frame_boundary = boundary or snapshot.attrs.get('boundary')
+            i, j, _ = find_bonds(coords, covalent_radii(symbols, radii), frame_box,
+                                 frame_boundary, bond_tolerance)
+            bonded1, bonded2 = ids[i], ids[j]
+        network[step] = _bond_network(ids, bonded1, bonded2, as_graph)
 
     return network
 
+def _bond_network(ids, bonded1, bonded2, as_graph):
+    if not as_graph:
+        return bonded1, bonded2
+    G = nx.Graph()
+    G.add_nodes_from(ids.tolist())     # Make sure all atoms are in the graph
+    G.add_edges_from(zip(bonded1.tolist(), bonded2.tolist()))   # Add valid bonds
+    return G
+
 def cluster_molecules(coords, eps=2.0, min_samples=1):
     """
     Cluster atoms into molecules based on spatial proximity using DBSCAN.
@@ -235,33 +257,116 @@ def cluster_molecules(coords, eps=2.0, min_samples=1):
     n_clusters = len(set(labels)) - (1 if -1 in labels else 0)
     return labels, n_clusters
 
+# ---------------------Per-frame analyses (map_dumpfile)--------------------
+# Module-level so that worker processes can unpickle them. Every one takes
+# a DumpFrame first and returns a small result per frame.
+def frame_symbols(frame, atomsymbols=None):
+    '''Element symbol of every atom: 'element' column, or atomsymbols[type-1].'''
+    if 'element' in frame.columns:
+        return frame['element']
+    if atomsymbols is None:
+        raise ValueError('atomsymbols is required for dumps without an element column')
+    return np.asarray(atomsymbols)[frame['type']-1]
+
+def frame_bonds(frame, atomsymbols=None, bond_tolerance=0.1, box=None,
+                boundary=None, radii=None, with_ids=False):
+    '''
+    Distance-based bonds of a frame (see creat_graph_network), as the atom
+    ids of the bonded atoms, each bond once. The frame's own box is used
+    unless ``box`` is given. With ``with_ids`` the atom ids are returned
+    first.
+    '''
+    ids = frame['id']
+    if box is None:
+        box, boundary = frame.box, boundary or frame.boundary
+    i, j, _ = find_bonds(frame.positions(),
+                         covalent_radii(frame_symbols(frame, atomsymbols), radii),
+                         box, boundary, bond_tolerance)
+    if with_ids:
+        return ids, ids[i], ids[j]
+    return ids[i], ids[j]
 
+def frame_clusters(frame, eps=2.0, min_samples=1):
+    '''cluster_molecules of a frame: (labels in atom-id order, n_clusters).'''
+    order = np.argsort(frame['id'], kind='stable')
+    return cluster_molecules(frame.positions()[order], eps, min_samples)
 
-def compute_msd(positions):
+FRAME_ANALYSES = {
+    'symbols' : frame_symbols,
+    'bonds'   : frame_bonds,
+    'clusters': frame_clusters,
+}
+
+@function_runtime
+def map_dumpfile(dumpfile, analysis, Nfreq=1, steps=None, workers=None,
+                 chunksize=None, **kwargs):
     """
-    positions: numpy array of shape (N, 3) where N is the number of time steps
-    returns: 1D array of MSD values for each time lag τ
+    Run an analysis on every frame of a dump file, frames in parallel.
+
+    Workers get frame numbers (byte ranges from the frame index of the
+    file), not frame data, and read the frames from their own memory map;
+    at most 2*workers chunks of frames are in flight (see
+    dumpframe.imap_dump_frames). Use imap_dump_frames directly to reduce
+    the results on the fly instead of keeping all of them.
+
+    Parameters
+    ----------
+    dumpfile : str
+        Path to the LAMMPS dump file.
+    analysis : str or callable
+        One of FRAME_ANALYSES ('symbols', 'bonds', 'clusters'), or a
+        module-level function ``f(frame, **kwargs)`` of a DumpFrame.
+    Nfreq : int, optional
+        Every Nfreq-th frame (of ``steps`` if given). Default is 1.
+    steps : iterable of int, optional
+        Only these timesteps. Default is None (all).
+    workers : int, optional
+        Number of processes. Default is None (all CPUs).
+    chunksize : int, optional
+        Frames per task. Default is chosen from the number of frames.
+    **kwargs :
+        Passed to the analysis, e.g. atomsymbols and bond_tolerance for
+        'bonds', eps and min_samples for 'clusters'.
+
+    Returns
+    -------
+    results : dict
+        {step: result}, in file order.
     """
-    N = len(positions)
-    msd = np.zeros(N)
+    if isinstance(analysis, str):
+        try:
+            analysis = FRAME_ANALYSES[analysis]
+        except KeyError:
+            raise ValueError('Unknown analysis {!r}; expected one of {} or a function'
+                             .format(analysis, list(FRAME_ANALYSES)))
+    return dict(imap_dump_frames(dumpfile, analysis, Nfreq=Nfreq, steps=steps,
+                                 workers=workers, chunksize=chunksize, **kwargs))
+
 
-    for tau in range(1, N):
-        diffs = positions[tau:] - positions[:-tau]
-        squared_displacements = np.sum(diffs**2, axis=1)
-        msd[tau] = np.mean(squared_displacements)
 
-    return msd
+def compute_msd(positions, box=None):
+    """
+    positions: numpy array of shape (N, 3) where N is the number of time steps,
+               or (N, natoms, 3) / a Trajectory to average over atoms too
+    box: box bounds of every frame (N, 3, 2) to unwrap wrapped positions;
+         a wrapped Trajectory is unwrapped with its own box
+    returns: 1D array of MSD values for each time lag τ, every frame
+             being a time origin (FFT algorithm, trajectory.msd_fft)
+    """
+    if isinstance(positions, Trajectory):
+        return positions.msd()[1]
+    return msd_fft(positions, box=box)
 
 def distance_tracker(dumpdata,atom1,atom2):  
     # Calculate distance between two given atoms atom1 and atom2 in each step
-    # 
+    # dumpdata: a Trajectory, or the {step: DataFrame} of parsedumpfile
+    if isinstance(dumpdata, Trajectory):
+        return dict(zip(dumpdata.steps.tolist(),
+                        dumpdata.distance(atom1, atom2).tolist()))
+    
     distances = {}     
-    for step in dumpdata.keys():
-        coord_atom1 = dumpdata[step][atom1][1] # index 1 contain position
-        coord_atom2 = dumpdata[step][atom2][1] # index 1 contain position
-         
-        # Calculate distance between two points using math module
-        # New in version 3.8
-        distances[step]=math.dist(coord_atom1, coord_atom2)
+    for step, snapshot in dumpdata.items():
+        xyz = snapshot.set_index('id').loc[[atom1, atom2], ['x', 'y', 'z']].values
+        distances[step] = math.dist(xyz[0], xyz[1])
         
     return distances
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Vectorized reading of LAMMPS dump-file frames into NumPy structured arrays.
+
+A dump frame states its number of atoms ('ITEM: NUMBER OF ATOMS') and
+its columns ('ITEM: ATOMS id type x y z ...') before the atom lines, so
+the whole ATOMS block is converted to numbers by one C-level call and
+reshaped to (natoms x ncolumns); the dtype of every column is derived
+once from the column names. Frames come from the memory map of the file
+(frame_reader), and frames that are skipped are never decoded.
+
+imap_dump_frames applies a function to the frames in a process pool:
+workers get the byte ranges of their frames (from the frame index of the
+file) and read them from their own memory map, so no frame data is sent
+between processes, only the results.
+"""
+
+import io
+import os
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from magnolia.frame_reader import MappedFile, DUMP_MARKER, read_step, parse_numbers
+from magnolia.frame_index import get_frame_index
+
+## List of classes/functions ##
+# 1. dump_dtype
+# 2. box_lattice
+# 3. DumpFrame
+# 4. iter_dump_frames
+# 5. apply_blocks
+# 6. imap_dump_frames
+
+# integer per-atom quantities of the dump command; 'element' is a string,
+# everything else (positions, velocities, computes, ...) is a float
+INT_COLUMNS = ('id', 'mol', 'proc', 'procp1', 'type', 'ix', 'iy', 'iz')
+STR_COLUMNS = ('element',)
+
+# column names -> dtype, shared by all frames with the same columns
+_dtypes = {}
+
+MAX_CHUNK_FRAMES = 32 # frames per task of imap_dump_frames (default)
+
+#%%
+def dump_dtype(columns):
+    '''Structured dtype of the atom lines of a dump with ``columns``.'''
+    columns = tuple(columns)
+    dtype = _dtypes.get(columns)
+    if dtype is None:
+        fields = []
+        for name in columns:
+            if name in INT_COLUMNS:
+                fields.append((name, np.int64))
+            elif name in STR_COLUMNS:
+                fields.append((name, 'U8'))
+            else:
+                fields.append((name, np.float64))
+        dtype = _dtypes[columns] = np.dtype(fields)
+    return dtype
+
+def box_lattice(box):
+    '''
+    Origin and lattice vectors (rows of a 3x3 matrix) of LAMMPS box
+    bounds: 3x2 rows (lo hi), or 3x3 rows (lo_bound hi_bound tilt) of a
+    triclinic box. A position is ``origin + scaled @ H``.
+    '''
+    box = np.asarray(box, dtype=np.float64)
+    if box.shape[1] == 2:
+        lo, hi = box[:, 0], box[:, 1]
+        return lo, np.diag(hi-lo)
+    xy, xz, yz = box[:, 2]
+    xlo = box[0, 0] - min(0.0, xy, xz, xy+xz)
+    xhi = box[0, 1] - max(0.0, xy, xz, xy+xz)
+    ylo = box[1, 0] - min(0.0, yz)
+    yhi = box[1, 1] - max(0.0, yz)
+    zlo, zhi = box[2, 0], box[2, 1]
+    return np.array([xlo, ylo, zlo]), np.array([[xhi-xlo, 0.0, 0.0],
+                                                [xy, yhi-ylo, 0.0],
+                                                [xz, yz, zhi-zlo]])
+
+#%%
+class DumpFrame:
+    '''
+    One timestep of a dump file.
+
+    Attributes
+    ----------
+    step : int
+        Timestep.
+    box : np.ndarray
+        Rows of 'ITEM: BOX BOUNDS' (3 x 2, or 3 x 3 for a triclinic box:
+        bounding box and tilt factors xy xz yz).
+    boundary : tuple of str
+        Boundary flags of 'BOX BOUNDS' (e.g. ('pp', 'pp', 'pp')); the
+        'xy xz yz' words of a triclinic box are not included.
+    atoms : np.ndarray
+        Structured array, one record per atom line, in file order.
+    '''
+    __slots__ = ('step', 'box', 'boundary', 'atoms')
+
+    def __init__(self, step, box, boundary, atoms):
+        self.step     = int(step)
+        self.box      = box
+        self.boundary = boundary
+        self.atoms    = atoms
+
+    @classmethod
+    def from_block(cls, block, dtype=None):
+        '''
+        Parse the raw text of one frame, starting at its 'ITEM: TIMESTEP'
+        line: bytes, str, or a memoryview slice of a mapped file.
+
+        ``dtype`` (from dump_dtype) skips the dtype lookup when the
+        caller already knows the columns.
+        '''
+        if isinstance(block, str):
+            block = block.encode()
+        data  = bytes(block)
+        start = data.find(b'ITEM: ATOMS')
+        if start < 0:
+            raise ValueError('dump frame without an ITEM: ATOMS section')
+        end   = data.find(b'\n', start)
+        end   = len(data) if end < 0 else end+1
+        columns = data[start+len(b'ITEM: ATOMS'):end].decode().split()
+        if dtype is None or dtype.names != tuple(columns):
+            dtype = dump_dtype(columns)
+
+        natoms, box, boundary = None, [], ()
+        lines = data[:start].decode().splitlines()
+        for i, line in enumerate(lines):
+            if line.startswith('ITEM: NUMBER OF ATOMS'):
+                natoms = int(lines[i+1])
+            elif line.startswith('ITEM: BOX BOUNDS'):
+                # 'ITEM: BOX BOUNDS [xy xz yz] pp pp pp'
+                boundary = tuple(line.split()[3:][-3:])
+                box = [[float(v) for v in row.split()] for row in lines[i+1:i+4]]
+        box = np.array(box, dtype=np.float64)
+
+        atoms = _parse_atoms(data[end:], dtype, natoms)
+        return cls(read_step(data, DUMP_MARKER), box, boundary, atoms)
+
+    @property
+    def natoms(self):
+        return len(self.atoms)
+
+    @property
+    def columns(self):
+        return self.atoms.dtype.names
+
+    @property
+    def triclinic(self):
+        return self.box.shape[1] == 3
+
+    def __getitem__(self, name):
+        return self.atoms[name]
+
+    @property
+    def unwrapped(self):
+        '''True if positions() are unwrapped (xu yu zu or image flags).'''
+        columns = self.columns
+        return all(name in columns for name in ('xu', 'yu', 'zu')) or \
+               all(name in columns for name in ('ix', 'iy', 'iz'))
+
+    def positions(self, dtype=np.float64):
+        '''
+        (natoms x 3) coordinates: unwrapped (xu yu zu) if dumped, else
+        wrapped (x y z), else scaled (xs ys zs) converted with the box
+        (lattice vectors of a triclinic box, see box_lattice). Wrapped
+        coordinates are unwrapped with the image flags (ix iy iz) if they
+        were dumped.
+        '''
+        columns = self.columns
+        if all(name in columns for name in ('xu', 'yu', 'zu')):
+            return np.stack([self.atoms[name] for name in ('xu', 'yu', 'zu')],
+                            axis=1).astype(dtype)
+        origin, H = box_lattice(self.box)
+        if all(name in columns for name in ('x', 'y', 'z')):
+            xyz = np.stack([self.atoms[name] for name in ('x', 'y', 'z')], axis=1)
+        elif all(name in columns for name in ('xs', 'ys', 'zs')):
+            scaled = np.stack([self.atoms[name] for name in ('xs', 'ys', 'zs')], axis=1)
+            xyz = origin + scaled @ H
+        else:
+            raise KeyError('no x y z columns in the dump')
+        if all(name in columns for name in ('ix', 'iy', 'iz')):
+            images = np.stack([self.atoms[name] for name in ('ix', 'iy', 'iz')], axis=1)
+            xyz = xyz + images @ H
+        return xyz.astype(dtype)
+
+    def to_dataframe(self):
+        '''The atoms as a pd.DataFrame (one column per dump column).'''
+        return pd.DataFrame(self.atoms)
+
+    def __repr__(self):
+        return 'DumpFrame(step={}, natoms={}, columns={})'.format(
+            self.step, self.natoms, list(self.columns))
+
+def _parse_atoms(body, dtype, natoms):
+    # atom lines -> structured array, in one conversion when all numeric
+    ncols   = len(dtype.names)
+    numeric = not any(dtype[name].kind == 'U' for name in dtype.names)
+    if numeric:
+        values = parse_numbers(body)
+        if values is not None and len(values) % ncols == 0 and \
+                (natoms is None or len(values) == natoms*ncols):
+            values = values.reshape(-1, ncols)
+            atoms  = np.empty(len(values), dtype=dtype)
+            for j, name in enumerate(dtype.names):
+                atoms[name] = values[:, j]
+            return atoms
+    # string columns or a malformed block: row-wise conversion
+    return np.atleast_1d(np.loadtxt(io.BytesIO(body), dtype=dtype, ndmin=1,
+                                    max_rows=natoms))
+
+#%%
+def iter_dump_frames(path, Nfreq=1):
+    '''
+    Yield every Nfreq-th frame of a dump file (starting with the first)
+    as a DumpFrame. Frames in between are located but never decoded.
+    '''
+    dtype = None
+    with MappedFile(path) as mf:
+        offsets, lengths = mf.frame_ranges(DUMP_MARKER)
+        for offset, length in zip(offsets[::Nfreq].tolist(), lengths[::Nfreq].tolist()):
+            block = mf.block(offset, length)
+            frame = DumpFrame.from_block(block, dtype)
+            block.release()
+            dtype = frame.atoms.dtype
+            yield frame
+
+#%%
+def _iter_apply(path, offsets, lengths, function, kwargs):
+    # (step, function(frame)) of the given byte ranges of a dump file
+    dtype = None
+    with MappedFile(path) as mf:
+        for offset, length in zip(np.asarray(offsets).tolist(),
+                                  np.asarray(lengths).tolist()):
+            block = mf.block(offset, length)
+            frame = DumpFrame.from_block(block, dtype)
+            block.release()
+            dtype = frame.atoms.dtype
+            yield frame.step, function(frame, **kwargs)
+
+def apply_blocks(path, offsets, lengths, function, kwargs=None):
+    '''
+    Parse the frames at the given byte ranges of a dump file and apply
+    ``function(frame, **kwargs)`` to each. Returns a list of
+    (step, result). This is the task of the imap_dump_frames workers.
+    '''
+    return list(_iter_apply(path, offsets, lengths, function, kwargs or {}))
+
+def imap_dump_frames(path, function, Nfreq=1, steps=None, workers=1,
+                     chunksize=None, **kwargs):
+    '''
+    Apply a function to every selected frame of a dump file, in parallel.
+
+    Frames are located with the frame index of the file (frame_index,
+    saved next to it). With workers>1 the selected frames are cut into
+    chunks of consecutive frames; a worker gets the byte ranges of a chunk,
+    parses its frames from its own memory map and returns the results
+    only. At most 2*workers chunks are submitted ahead of the one being
+    yielded, so memory stays bounded however long the trajectory is and
+    however slowly the results are consumed.
+
+    Parameters
+    ----------
+    path : str
+        Path to the LAMMPS dump file.
+    function : callable
+        ``function(frame, **kwargs)`` with frame a DumpFrame. With
+        workers>1 it must be picklable (a module-level function, not a
+        lambda), and so must its result.
+    Nfreq : int, optional
+        Only every Nfreq-th frame (of ``steps`` if given). Default is 1.
+    steps : iterable of int, optional
+        Only these timesteps, in the given order. Default is None (all).
+    workers : int, optional
+        Number of processes; None uses all CPUs. Default is 1 (no pool).
+    chunksize : int, optional
+        Frames per task. Default is an even split in 4*workers tasks of
+        at most MAX_CHUNK_FRAMES frames.
+    **kwargs :
+        Passed to ``function``.
+
+    Yields
+    ------
+    step : int
+    result :
+        ``function(frame, **kwargs)``, in the order of the frames.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    index  = get_frame_index(path, marker=DUMP_MARKER)
+    frames = index.select(steps, Nfreq)
+
+    if workers<=1 or len(frames)<=1:
+        yield from _iter_apply(index.path, index.offsets[frames],
+                               index.lengths[frames], function, kwargs)
+        return
+
+    if chunksize is None:
+        chunksize = min(math.ceil(len(frames)/(4*workers)), MAX_CHUNK_FRAMES)
+    chunks = [frames[i:i+chunksize] for i in range(0, len(frames), chunksize)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(apply_blocks, index.path,
+                                       index.offsets[chunk], index.lengths[chunk],
+                                       function, kwargs))
+            if len(pending)>=2*workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Binary on-disk cache of parsed bond data (BondData).
+
+A cache is a directory holding one ``.npy`` file per kind of frame array
+and a ``header.json``::
+
+    <cache>/header.json      version, source fingerprint, cutoff, fields
+    <cache>/steps.npy        timestep of every frame
+    <cache>/<name>.npy       arrays of all frames, concatenated
+    <cache>/<name>_ptr.npy   start of every stored array in <name>.npy
+    <cache>/<name>_seg.npy   stored array used by every frame (-1: none)
+
+Arrays shared between frames (atom ids and types, usually) are stored
+once. The ``.npy`` files are opened memory-mapped, so opening a cache
+costs the header and the pointer arrays only; the frame data is read
+from disk when a frame is used.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from magnolia.bondframe import BondFrame, BondData, COLUMNS
+
+## List of classes/functions ##
+# 1. file_fingerprint
+# 2. save_bonddata
+# 3. load_bonddata
+
+CACHE_VERSION = 2
+PARTIAL_BYTES = 1 << 20 # bytes hashed at each end of a file
+ARRAYS = ('ids', 'types', 'offsets', 'neighbours', 'bondorders', 'order') + COLUMNS
+
+#%%
+def file_fingerprint(path, partial_hash=False):
+    '''
+    {'path', 'size', 'mtime'} of a file, used to detect a changed source;
+    with ``partial_hash`` also 'hash', a hash of its first and last MiB.
+    '''
+    st = os.stat(path)
+    fingerprint = {'path': os.path.abspath(path), 'size': st.st_size,
+                   'mtime': st.st_mtime_ns}
+    if partial_hash:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            h.update(f.read(PARTIAL_BYTES))
+            if st.st_size > 2*PARTIAL_BYTES:
+                f.seek(-PARTIAL_BYTES, os.SEEK_END)
+            h.update(f.read(PARTIAL_BYTES))
+        fingerprint['hash'] = h.hexdigest()
+    return fingerprint
+
+def save_bonddata(bonddata, cachedir, source, cutoff, fields=()):
+    '''
+    Write a BondData to a cache directory.
+
+    The directory is written under a temporary name and renamed into
+    place, so a reader never sees a half-written cache.
+
+    Parameters
+    ----------
+    bonddata : BondData
+        Parsed bond data.
+    cachedir : str
+        Cache directory (created or replaced).
+    source : str
+        Bond file the data was parsed from.
+    cutoff : float
+        Bond order cutoff used while parsing.
+    fields : iterable of str, optional
+        Atom columns that were parsed, any of ``bondframe.COLUMNS``.
+
+    Returns
+    -------
+    str
+        The cache directory.
+    '''
+    tmpdir = cachedir.rstrip(os.sep) + '.tmp'
+    if os.path.exists(tmpdir):
+        shutil.rmtree(tmpdir)
+    os.makedirs(tmpdir)
+
+    frames = bonddata.frames
+    np.save(os.path.join(tmpdir, 'steps.npy'),
+            np.array([frame.step for frame in frames], dtype=np.int64))
+    for name in ARRAYS:
+        stored, ptr = {}, [0] # id(array) -> segment number
+        seg = np.full(len(frames), -1, dtype=np.int64)
+        for i, frame in enumerate(frames):
+            array = getattr(frame, name)
+            if array is None:
+                continue
+            if id(array) not in stored:
+                stored[id(array)] = (len(stored), array)
+                ptr.append(ptr[-1] + len(array))
+            seg[i] = stored[id(array)][0]
+        if not stored:
+            continue
+        arrays = [array for _, array in sorted(stored.values(),
+                                               key=lambda s: s[0])]
+        np.save(os.path.join(tmpdir, name+'.npy'), np.concatenate(arrays))
+        np.save(os.path.join(tmpdir, name+'_ptr.npy'), np.array(ptr, dtype=np.int64))
+        np.save(os.path.join(tmpdir, name+'_seg.npy'), seg)
+
+    header = {'version'  : CACHE_VERSION,
+              'source'   : file_fingerprint(source),
+              'cutoff'   : float(cutoff),
+              'fields'   : sorted(fields),
+              'keys'     : list(bonddata),
+              'firststep': bonddata.firststep,
+              'nframes'  : len(frames)}
+    with open(os.path.join(tmpdir, 'header.json'), 'w') as f:
+        json.dump(header, f, indent=1)
+
+    if os.path.exists(cachedir):
+        shutil.rmtree(cachedir)
+    os.replace(tmpdir, cachedir)
+    return cachedir
+
+def load_bonddata(cachedir, source=None, cutoff=None, fields=(), keys=None):
+    '''
+    Open a cache directory written by ``save_bonddata``.
+
+    Parameters
+    ----------
+    cachedir : str
+        Cache directory.
+    source : str, optional
+        Bond file the cache must have been made from. The cache is stale
+        if its size or modification time changed.
+    cutoff : float, optional
+        Bond order cutoff to use. Every written bond is stored, so any
+        cutoff can be served; default is the one the cache was saved with.
+    fields : iterable of str, optional
+        Atom columns that must be present in the cache.
+    keys : list of str, optional
+        Keys of the returned BondData. Default is the saved keys.
+
+    Returns
+    -------
+    BondData, or None if the cache is missing, stale, or lacks ``fields``.
+    '''
+    try:
+        with open(os.path.join(cachedir, 'header.json')) as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if header.get('version') != CACHE_VERSION:
+        return None
+    if source is not None:
+        try:
+            fingerprint = file_fingerprint(source)
+        except OSError:
+            return None
+        saved = header['source']
+        if (saved['size'], saved['mtime']) != (fingerprint['size'],
+                                               fingerprint['mtime']):
+            return None
+    if not set(fields) <= set(header['fields']):
+        return None
+    if cutoff is None:
+        cutoff = header['cutoff']
+
+    def load(name):
+        return np.load(os.path.join(cachedir, name+'.npy'), mmap_mode='r')
+
+    steps  = load('steps').tolist()
+    arrays = {}
+    for name in ARRAYS:
+        if not os.path.exists(os.path.join(cachedir, name+'.npy')):
+            continue
+        data, ptr = load(name), load(name+'_ptr').tolist()
+        # one view per stored array, so shared arrays stay shared
+        views = [data[ptr[s]:ptr[s+1]] for s in range(len(ptr)-1)]
+        arrays[name] = [views[s] if s >= 0 else None
+                        for s in load(name+'_seg').tolist()]
+
+    frames = []
+    for i, step in enumerate(steps):
+        columns = {name: arrays[name][i] for name in COLUMNS if name in arrays}
+        order   = arrays['order'][i] if 'order' in arrays else None
+        frames.append(BondFrame(step, arrays['ids'][i], arrays['types'][i],
+                                arrays['offsets'][i], arrays['neighbours'][i],
+                                arrays['bondorders'][i], cutoff=cutoff,
+                                order=order, **columns))
+    if keys is None:
+        keys = header['keys']
+    return BondData.from_frames(frames, keys=keys, firststep=header['firststep'])
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Byte-offset index of the frames of a bond file (or a dump file).
+
+The index maps every timestep to the byte offset and length of its block
+in the file. It is built in one pass and saved next to the file
+(``<file>.frameidx.npz``) together with the file size and modification
+time; a changed file invalidates it and it is rebuilt on the next call.
+With the index any frame, or any stride of frames, is one seek plus the
+parse of that frame only.
+"""
+
+import os
+import numpy as np
+from magnolia.frame_reader import MappedFile, read_step, BOND_MARKER
+
+## List of classes/functions ##
+# 1. FrameIndex
+# 2. build_frame_index
+# 3. get_frame_index
+
+INDEX_SUFFIX  = '.frameidx.npz'
+INDEX_VERSION = 2
+
+# in-process cache: (path, marker) -> FrameIndex (checked against size/mtime on use)
+_loaded = {}
+
+#%%
+class FrameIndex:
+    '''
+    Timestep -> (offset, length) table of one file.
+
+    Attributes
+    ----------
+    path : str
+        Indexed file.
+    steps, offsets, lengths : np.ndarray of int64
+        One entry per frame, in file order.
+    size, mtime : int
+        File size (bytes) and modification time (ns) at indexing time.
+    marker : bytes
+        Line that starts a frame (b'# Timestep' for bond files).
+    '''
+    def __init__(self, path, steps, offsets, lengths, size, mtime,
+                 marker=BOND_MARKER):
+        self.path    = path
+        self.marker  = marker
+        self.steps   = np.asarray(steps, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.size    = int(size)
+        self.mtime   = int(mtime)
+        self._pos    = None
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return 'FrameIndex({!r}, nframes={})'.format(self.path, len(self))
+
+    def is_valid(self):
+        '''True if the file still has the indexed size and mtime.'''
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime
+
+    def position(self, step):
+        '''Frame number of ``step`` (the last one if it is repeated).'''
+        if self._pos is None:
+            self._pos = {s: i for i, s in enumerate(self.steps.tolist())}
+        try:
+            return self._pos[int(step)]
+        except KeyError:
+            raise KeyError('Timestep {} not found in {}'.format(step, self.path))
+
+    def select(self, steps=None, Nevery=1):
+        '''Frame numbers of the given steps (default all), every Nevery-th.'''
+        if steps is None:
+            frames = np.arange(len(self))
+        else:
+            frames = np.array([self.position(s) for s in steps], dtype=np.int64)
+        return frames[::Nevery]
+
+    def read(self, step):
+        '''Raw bytes of the frame of ``step``.'''
+        i = self.position(step)
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[i])
+            return f.read(self.lengths[i])
+
+    def read_frames(self, frames):
+        '''Yield (step, bytes) for the given frame numbers, one open file.'''
+        with open(self.path, 'rb') as f:
+            for i in frames:
+                f.seek(self.offsets[i])
+                yield int(self.steps[i]), f.read(self.lengths[i])
+
+    def save(self, indexpath=None):
+        '''Write the index next to the file. Returns the path, or None.'''
+        if indexpath is None:
+            indexpath = self.path + INDEX_SUFFIX
+        meta = np.array([INDEX_VERSION, self.size, self.mtime], dtype=np.int64)
+        tmp  = indexpath + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez(f, steps=self.steps, offsets=self.offsets,
+                         lengths=self.lengths, meta=meta,
+                         marker=np.frombuffer(self.marker, dtype=np.uint8))
+            os.replace(tmp, indexpath)
+        except OSError:
+            # read-only location: keep working with the in-memory index
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        return indexpath
+
+    @classmethod
+    def load(cls, path, indexpath=None, marker=BOND_MARKER):
+        '''Read a saved index. Returns None if it is missing or stale.'''
+        if indexpath is None:
+            indexpath = path + INDEX_SUFFIX
+        if not os.path.exists(indexpath):
+            return None
+        try:
+            with np.load(indexpath) as data:
+                version, size, mtime = data['meta'].tolist()
+                index = cls(path, data['steps'], data['offsets'],
+                            data['lengths'], size, mtime,
+                            data['marker'].tobytes())
+        except (OSError, ValueError, KeyError):
+            return None
+        if version != INDEX_VERSION or index.marker != marker \
+                or not index.is_valid():
+            return None
+        return index
+
+#%%
+def build_frame_index(path, marker=BOND_MARKER):
+    '''
+    Locate every frame of a file with byte searches on its memory map.
+
+    Parameters
+    ----------
+    path : str
+        Path to the bond file (or dump file).
+    marker : bytes, optional
+        Line that starts a frame. Default is b'# Timestep' (bond files);
+        use frame_reader.DUMP_MARKER for dump files.
+
+    Returns
+    -------
+    FrameIndex
+    '''
+    st = os.stat(path)
+    with MappedFile(path) as mf:
+        offsets, lengths = mf.frame_ranges(marker)
+        steps = [read_step(mf.block(offset, len(marker)+64), marker)
+                 for offset in offsets.tolist()]
+    return FrameIndex(path, steps, offsets, lengths, st.st_size, st.st_mtime_ns,
+                      marker)
+
+def get_frame_index(path, rebuild=False, save=True, marker=BOND_MARKER):
+    '''
+    Frame index of ``path``: reused from memory or from the sidecar file
+    when the file is unchanged, otherwise built and saved.
+
+    Parameters
+    ----------
+    path : str
+        Path to the bond file (or dump file).
+    rebuild : bool, optional
+        Ignore any existing index. Default is False.
+    save : bool, optional
+        Write the sidecar file after (re)building. Default is True.
+    marker : bytes, optional
+        Line that starts a frame. Default is b'# Timestep' (bond files).
+
+    Returns
+    -------
+    FrameIndex
+    '''
+    path  = os.path.abspath(path)
+    index = None
+    if not rebuild:
+        index = _loaded.get((path, marker))
+        if index is None or not index.is_valid():
+            index = FrameIndex.load(path, marker=marker)
+    if index is None:
+        index = build_frame_index(path, marker)
+        if save:
+            index.save()
+    _loaded[(path, marker)] = index
+    return index
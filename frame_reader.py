@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Memory-mapped reading of LAMMPS trajectory-like files (bond files, dump
+files).
+
+The file is mapped read-only and frames are located with byte searches
+for their marker line ('# Timestep' in bond files, 'ITEM: TIMESTEP' in
+dump files). Frames are handed out as memoryview slices of the map, so
+nothing is decoded to str unless a parser asks for it, and several
+analysis processes reading the same file share its pages in the OS page
+cache.
+"""
+
+import os
+import mmap
+import warnings
+import numpy as np
+
+## List of classes/functions ##
+# 1. MappedFile
+# 2. iter_blocks
+# 3. read_step
+# 4. parse_numbers
+
+BOND_MARKER = b'# Timestep'
+DUMP_MARKER = b'ITEM: TIMESTEP'
+
+# text-mode np.fromstring is the fastest whitespace-separated parser; it is
+# deprecated upstream, so parse_numbers falls back to split() without it
+_fromstring = getattr(np, 'fromstring', None)
+
+#%%
+class MappedFile:
+    '''
+    Read-only memory map of a file, usable as a context manager.
+
+    Attributes
+    ----------
+    path : str
+        Mapped file.
+    view : memoryview
+        Zero-copy view of the whole file (empty for an empty file).
+    '''
+    def __init__(self, path, sequential=True):
+        self.path  = path
+        self._file = open(path, 'rb')
+        self.mmap  = None
+        if os.fstat(self._file.fileno()).st_size:
+            self.mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if sequential and hasattr(self.mmap, 'madvise') \
+                    and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                self.mmap.madvise(mmap.MADV_SEQUENTIAL)
+            self.view = memoryview(self.mmap)
+        else:
+            self.view = memoryview(b'')
+
+    def __len__(self):
+        return len(self.view)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        try:
+            self.view.release()
+            if self.mmap is not None:
+                self.mmap.close()
+        except BufferError:
+            # a caller still holds a slice; the map is freed with it
+            pass
+        self._file.close()
+
+    def find(self, sub, start=0, end=None):
+        if self.mmap is None:
+            return -1
+        if end is None:
+            end = len(self.mmap)
+        return self.mmap.find(sub, start, end)
+
+    def frame_offsets(self, marker):
+        '''Offsets of every line that starts with ``marker``.'''
+        offsets = []
+        pos = self.find(marker)
+        while pos != -1:
+            if pos == 0 or self.mmap[pos-1] == 10: # at a line start
+                offsets.append(pos)
+            pos = self.find(marker, pos+len(marker))
+        return np.array(offsets, dtype=np.int64)
+
+    def frame_ranges(self, marker):
+        '''Offsets and lengths of the frames, from marker to marker.'''
+        offsets = self.frame_offsets(marker)
+        lengths = np.diff(np.append(offsets, len(self)))
+        return offsets, lengths
+
+    def block(self, offset, length):
+        '''Zero-copy memoryview of ``length`` bytes at ``offset``.'''
+        return self.view[offset:offset+length]
+
+#%%
+def iter_blocks(path, marker=BOND_MARKER):
+    '''
+    Yield every frame of a file as a memoryview slice of its memory map.
+
+    The slices are only valid while the generator is alive; copy them
+    (``bytes(block)``) if they have to be kept.
+    '''
+    with MappedFile(path) as mf:
+        offsets, lengths = mf.frame_ranges(marker)
+        for offset, length in zip(offsets.tolist(), lengths.tolist()):
+            yield mf.block(offset, length)
+
+def read_step(block, marker=BOND_MARKER):
+    '''
+    Timestep of a frame block: the first integer after its marker, on the
+    marker line ('# Timestep N') or on the next one ('ITEM: TIMESTEP\\nN').
+    '''
+    head = bytes(block[len(marker):len(marker)+64])
+    return int(head.split()[0])
+
+def parse_numbers(data):
+    '''
+    All whitespace-separated numbers of ``data`` (bytes) as one float64
+    array, or None if a token is not a number. A malformed block may also
+    come back short; callers compare the count with what they expect.
+    '''
+    if _fromstring is not None:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            try:
+                return _fromstring(data, dtype=np.float64, sep=' ')
+            except ValueError:
+                return None
+            except TypeError:
+                pass # signature changed: use the fallback
+    try:
+        return np.array(bytes(data).split(), dtype=np.float64)
+    except ValueError:
+        return None
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Distance-based bond detection for trajectories without a bond file
+(non-ReaxFF runs).
+
+Two atoms are bonded if their distance is at most the sum of their
+covalent radii plus a tolerance. Candidate pairs come from a KD-tree
+(scipy.spatial.cKDTree) that is periodic in the periodic directions of
+the box, so bonds across the boundaries are found; a triclinic box is
+handled in fractional coordinates with the 26 neighbouring images. The
+pair cutoffs and minimum-image distances are then applied to all
+candidate pairs at once. Bonds are returned as index arrays, or as the
+CSR arrays of a BondFrame so that the molecule and species analyses of
+species_analysis run on them unchanged.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+from magnolia.bondframe import (BondFrame, ID_DTYPE, TYPE_DTYPE, OFFSET_DTYPE,
+                                BO_DTYPE)
+from magnolia.dumpframe import box_lattice
+
+## List of classes/functions ##
+# 1. covalent_radii
+# 2. find_bonds
+# 3. bonds_to_csr
+# 4. bondframe_from_positions
+
+# single-bond covalent radii in Angstrom, Cordero et al., Dalton Trans.
+# 2008, 2832 (C sp3; Mn, Fe, Co low spin)
+COVALENT_RADII = {
+    'H' : 0.31, 'He': 0.28, 'Li': 1.28, 'Be': 0.96, 'B' : 0.84, 'C' : 0.76,
+    'N' : 0.71, 'O' : 0.66, 'F' : 0.57, 'Ne': 0.58, 'Na': 1.66, 'Mg': 1.41,
+    'Al': 1.21, 'Si': 1.11, 'P' : 1.07, 'S' : 1.05, 'Cl': 1.02, 'Ar': 1.06,
+    'K' : 2.03, 'Ca': 1.76, 'Sc': 1.70, 'Ti': 1.60, 'V' : 1.53, 'Cr': 1.39,
+    'Mn': 1.39, 'Fe': 1.32, 'Co': 1.26, 'Ni': 1.24, 'Cu': 1.32, 'Zn': 1.22,
+    'Ga': 1.22, 'Ge': 1.20, 'As': 1.19, 'Se': 1.20, 'Br': 1.20, 'Kr': 1.16,
+    'Rb': 2.20, 'Sr': 1.95, 'Y' : 1.90, 'Zr': 1.75, 'Nb': 1.64, 'Mo': 1.54,
+    'Tc': 1.47, 'Ru': 1.46, 'Rh': 1.42, 'Pd': 1.39, 'Ag': 1.45, 'Cd': 1.44,
+    'In': 1.42, 'Sn': 1.39, 'Sb': 1.39, 'Te': 1.38, 'I' : 1.39, 'Xe': 1.40,
+    'Cs': 2.44, 'Ba': 2.15, 'La': 2.07, 'Ce': 2.04, 'Pr': 2.03, 'Nd': 2.01,
+    'Pm': 1.99, 'Sm': 1.98, 'Eu': 1.98, 'Gd': 1.96, 'Tb': 1.94, 'Dy': 1.92,
+    'Ho': 1.92, 'Er': 1.89, 'Tm': 1.90, 'Yb': 1.87, 'Lu': 1.87, 'Hf': 1.75,
+    'Ta': 1.70, 'W' : 1.62, 'Re': 1.51, 'Os': 1.44, 'Ir': 1.41, 'Pt': 1.36,
+    'Au': 1.36, 'Hg': 1.32, 'Tl': 1.45, 'Pb': 1.46, 'Bi': 1.48, 'Po': 1.40,
+    'At': 1.50, 'Rn': 1.50, 'Fr': 2.60, 'Ra': 2.21, 'Ac': 2.15, 'Th': 2.06,
+    'Pa': 2.00, 'U' : 1.96, 'Np': 1.90, 'Pu': 1.87, 'Am': 1.80, 'Cm': 1.69,
+}
+
+#%%
+def covalent_radii(symbols, radii=None):
+    '''
+    Covalent radius of every atom.
+
+    Parameters
+    ----------
+    symbols : array_like of str
+        Element symbol of every atom.
+    radii : dict, optional
+        Radii overriding or extending COVALENT_RADII.
+
+    Returns
+    -------
+    np.ndarray
+    '''
+    table = dict(COVALENT_RADII, **(radii or {}))
+    symbols = np.asarray(symbols)
+    unique, inverse = np.unique(symbols, return_inverse=True)
+    missing = [s for s in unique.tolist() if s not in table]
+    if missing:
+        raise KeyError('no covalent radius for {}; pass radii={{...}}'.format(missing))
+    return np.array([table[s] for s in unique.tolist()])[inverse.ravel()]
+
+def find_bonds(coords, radii, box=None, boundary=None, tolerance=0.1):
+    '''
+    Bonded atom pairs from positions.
+
+    Parameters
+    ----------
+    coords : np.ndarray
+        (natoms x 3) positions.
+    radii : np.ndarray
+        Covalent radius of every atom (covalent_radii).
+    box : np.ndarray, optional
+        Box bounds (DumpFrame.box). Default is None (no periodicity).
+    boundary : sequence of str, optional
+        LAMMPS boundary flags ('pp', 'ff', ...), one per direction (the
+        last three words are used, so the 'xy xz yz' words of a triclinic
+        'BOX BOUNDS' line may be included). Default is periodic in every
+        direction when a box is given.
+    tolerance : float, optional
+        Added to the sum of the radii. Default is 0.1.
+
+    Returns
+    -------
+    i, j : np.ndarray
+        Indices of the bonded atoms, ``i < j``, every bond once.
+    distance : np.ndarray
+        Bond lengths (minimum image).
+    '''
+    coords = np.asarray(coords, dtype=np.float64)
+    radii  = np.asarray(radii, dtype=np.float64)
+    n = len(coords)
+    if n < 2:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    rmax = 2*radii.max() + tolerance
+
+    if box is None:
+        pairs = cKDTree(coords).query_pairs(rmax, output_type='ndarray')
+        i, j  = pairs[:, 0], pairs[:, 1]
+        delta = coords[i] - coords[j]
+    else:
+        if boundary is None:
+            boundary = ('pp',)*3
+        periodic = np.array([flag.startswith('p') for flag in tuple(boundary)[-3:]])
+        origin, H = box_lattice(box)
+        frac = np.linalg.solve(H.T, (coords - origin).T).T
+        frac[:, periodic] -= np.floor(frac[:, periodic])
+        if np.count_nonzero(H - np.diag(np.diag(H))) == 0:
+            # orthogonal: periodic KD-tree; open directions get a box
+            # large enough that nothing wraps
+            lengths = np.diag(H).copy()
+            points  = frac*lengths
+            open_   = ~periodic
+            if np.any(open_):
+                low = points[:, open_].min(axis=0)
+                points[:, open_] -= low
+                lengths[open_] = points[:, open_].max(axis=0) + 2*rmax + 1.0
+            points = np.where(points >= lengths, 0.0, points)
+            tree  = cKDTree(points, boxsize=lengths)
+            pairs = tree.query_pairs(rmax, output_type='ndarray')
+            i, j  = pairs[:, 0], pairs[:, 1]
+            delta = points[i] - points[j]
+            wrap  = lengths[periodic]
+            delta[:, periodic] -= wrap*np.round(delta[:, periodic]/wrap)
+        else:
+            # triclinic: neighbours among the 27 periodic images
+            points = frac @ H
+            shifts = np.array([(a, b, c) for a in (-1, 0, 1) for b in (-1, 0, 1)
+                               for c in (-1, 0, 1)], dtype=np.float64)
+            shifts = shifts[np.all(periodic | (shifts == 0), axis=1)]
+            images = (points[None, :, :] + (shifts @ H)[:, None, :]).reshape(-1, 3)
+            found  = cKDTree(points).sparse_distance_matrix(
+                cKDTree(images), rmax, output_type='ndarray')
+            i, j   = found['i'].astype(np.int64), found['j'].astype(np.int64)
+            image  = j // n
+            j      = j % n
+            keep   = i < j
+            i, j, image = i[keep], j[keep], image[keep]
+            delta  = points[i] - (points[j] + (shifts @ H)[image])
+            # a pair may be close through several images: keep the nearest
+            dist2  = np.einsum('ij,ij->i', delta, delta)
+            order  = np.lexsort((dist2, j, i))
+            i, j, delta = i[order], j[order], delta[order]
+            first  = np.ones(len(i), dtype=bool)
+            first[1:] = (i[1:] != i[:-1]) | (j[1:] != j[:-1])
+            i, j, delta = i[first], j[first], delta[first]
+
+    distance = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+    bonded   = distance <= radii[i] + radii[j] + tolerance
+    i, j, distance = i[bonded], j[bonded], distance[bonded]
+    order = np.lexsort((j, i))
+    return i[order].astype(np.int64), j[order].astype(np.int64), distance[order]
+
+def bonds_to_csr(i, j, n):
+    '''
+    Symmetric CSR connection table of n atoms from bond index pairs.
+
+    Returns
+    -------
+    offsets, neighbours : np.ndarray
+        Bonded atoms of atom ``k`` are ``neighbours[offsets[k]:offsets[k+1]]``.
+    order : np.ndarray
+        Position in ``i``/``j`` of the bond behind every entry.
+    '''
+    parents  = np.concatenate([i, j])
+    children = np.concatenate([j, i])
+    order    = np.argsort(parents, kind='stable')
+    offsets  = np.zeros(n+1, dtype=np.int64)
+    np.cumsum(np.bincount(parents, minlength=n), out=offsets[1:])
+    return offsets, children[order], np.concatenate([np.arange(len(i))]*2)[order]
+
+def bondframe_from_positions(step, ids, types, coords, atomsymbols, box=None,
+                             boundary=None, tolerance=0.1, radii=None):
+    '''
+    BondFrame of distance-based bonds, for molecule_labels, count_species
+    and the other BondFrame analyses. Every bond gets bond order 1.0.
+
+    Parameters
+    ----------
+    step : int
+        Timestep.
+    ids, types : np.ndarray
+        Atom ids and types.
+    coords : np.ndarray
+        (natoms x 3) positions.
+    atomsymbols : list of str
+        Element symbol of every atom type (type 1 first).
+    box, boundary, tolerance :
+        See find_bonds.
+    radii : dict, optional
+        Radii overriding COVALENT_RADII.
+
+    Returns
+    -------
+    BondFrame
+    '''
+    ids   = np.asarray(ids)
+    order = np.argsort(ids, kind='stable')
+    ids, types, coords = ids[order], np.asarray(types)[order], np.asarray(coords)[order]
+    symbols = np.asarray(atomsymbols)[np.asarray(types, dtype=np.int64)-1]
+    i, j, _ = find_bonds(coords, covalent_radii(symbols, radii), box, boundary,
+                         tolerance)
+    offsets, neighbours, _ = bonds_to_csr(i, j, len(ids))
+    return BondFrame(step, ids.astype(ID_DTYPE), types.astype(TYPE_DTYPE),
+                     offsets.astype(OFFSET_DTYPE), ids[neighbours].astype(ID_DTYPE),
+                     np.ones(len(neighbours), dtype=BO_DTYPE))
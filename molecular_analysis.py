@@ -9,6 +9,7 @@ Created on Fri Nov 17 19:29:26 2023
 # 1. longest_chain
 # 2. find_corresponding_node
 # 3. draw_rdkit2D
+# 4. graph_to_smiles
 
 import networkx as nx
 from rdkit import Chem
@@ -16,8 +17,8 @@ import matplotlib.pyplot as plt
 from rdkit.Chem.Draw import rdMolDraw2D
 from PIL import Image
 import io
-import warnings
 from collections import deque
+from magnolia.smiles_cache import SMILES_CACHE, graph_key
 
 def longest_chain(molecule_adjList):
     """
@@ -227,6 +228,33 @@ def create_mol_from_graph(graph, atypes, atomsymbols):
     Chem.SanitizeMol(mol)
     return mol, atom_index_map
 
+def graph_to_smiles(graph, atypes, atomsymbols, cache=True):
+    """
+    Canonical SMILES of a molecule graph (as built by create_mol_from_graph),
+    memoized by the graph's Weisfeiler-Lehman hash.
+
+    Parameters:
+        graph: networkx.Graph
+            A molecular graph where nodes represent atoms.
+        atypes: dict
+            A dictionary mapping node IDs to atom types (integers).
+        atomsymbols: list
+            A list of atomic symbols corresponding to atom types.
+        cache: bool or SmilesCache
+            True uses the shared cache (smiles_cache.SMILES_CACHE),
+            False converts every call.
+
+    Returns:
+        smiles: str
+    """
+    store = SMILES_CACHE if cache is True else (cache or None)
+    if store is None:
+        return Chem.MolToSmiles(create_mol_from_graph(graph, atypes, atomsymbols)[0])
+    
+    types = {node: atypes.get(node, 1) for node in graph.nodes()}
+    key   = graph_key(graph, types, context='|graph|{}'.format(list(atomsymbols)))
+    return store.lookup(key, lambda: Chem.MolToSmiles(
+        create_mol_from_graph(graph, atypes, atomsymbols)[0]))
 
 def draw_rdkit2D_from_graph(graph, atypes, atomsymbols,
                             highlight_atoms=None, ax=None,
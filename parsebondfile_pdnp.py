@@ -9,6 +9,7 @@ import pandas as pd
 import networkx as nx
 from functools import wraps
 import time
+from magnolia.frame_index import get_frame_index
 
 #%% runtime wrapper
 def function_runtime(f):
@@ -30,83 +31,53 @@ def function_runtime(f):
 #%% get_steps
 @function_runtime
 def get_steps(bondfilepath):
-    steps = []
-    with open(bondfilepath) as bf:
-        for line in bf:
-            if 'Timestep' in line:
-                step = int(line.strip().split()[-1]) 
-                steps.append(step)
-    return np.array(steps)
+    # the frame index is built once and reused (bondfilepath.frameidx.npz)
+    return get_frame_index(bondfilepath).steps.copy()
+#%% get_frame_rows
+def get_frame_rows(bondfilepath,timestep):
+    # splitted atom lines of a single timestep: one seek, no rescan
+    block = get_frame_index(bondfilepath).read(timestep).decode()
+    rows  = []
+    for line in block.splitlines():
+        splitted = line.strip().split()
+        if splitted and splitted[0].isnumeric():
+            rows.append(splitted)
+    return rows
 #%% get_atomConnectivity
 @function_runtime
 def get_atomConnectivity(bondfilepath,timestep,**kwargs):
     connectivity = {}
-    
-    with open(bondfilepath) as bf:
-        breakFlag = False
-        
-        for line in bf:
-            if 'Timestep' in line:
-                step = int(line.strip().split()[-1])
-                # break if required data collected for the given timestep
-                if step!=timestep and breakFlag:
-                    break
-            
-            if step==timestep:
-                breakFlag=True
-                splitted = line.strip().split()
-                if splitted[0].isnumeric():
-                    parent  = int(splitted[0])
-                    nb      = int(splitted[2]) #number of bond
-                    # all connected atom
-                    children= np.array((splitted[3:3+nb])).astype(int)
-                    connectivity[parent]=children  
+    for splitted in get_frame_rows(bondfilepath, timestep):
+        parent  = int(splitted[0])
+        nb      = int(splitted[2]) #number of bond
+        # all connected atom
+        children= np.array((splitted[3:3+nb])).astype(int)
+        connectivity[parent]=children  
     return connectivity
 #%% get_atomtypes
 def get_atomtypes(bondfilepath,timestep,**kwargs):
     atypes = {}
-    with open(bondfilepath) as bf:
-        for line in bf:
-            if 'Timestep' in line:
-                step = int(line.strip().split()[-1])
-            
-            if step==timestep:
-                splitted = line.strip().split()
-                if splitted[0].isnumeric():
-                    parent  = int(splitted[0])
-                    typ     = int(splitted[1]) # atom type
-                    atypes[parent]=typ  
+    for splitted in get_frame_rows(bondfilepath, timestep):
+        parent  = int(splitted[0])
+        typ     = int(splitted[1]) # atom type
+        atypes[parent]=typ  
     return atypes
 #%% get_moleculeID
 def get_moleculeID(bondfilepath,timestep,**kwargs):
     molids = {}
-    with open(bondfilepath) as bf:
-        for line in bf:
-            if 'Timestep' in line:
-                step = int(line.strip().split()[-1])
-            
-            if step==timestep:
-                splitted = line.strip().split()
-                if splitted[0].isnumeric():
-                    parent  = int(splitted[0])
-                    nb      = int(splitted[2]) # number of bonds
-                    molid   = int(splitted[nb+3]) # molecule id
-                    molids[parent]=molid
+    for splitted in get_frame_rows(bondfilepath, timestep):
+        parent  = int(splitted[0])
+        nb      = int(splitted[2]) # number of bonds
+        molid   = int(splitted[nb+3]) # molecule id
+        molids[parent]=molid
     return molids
 #%% get_atomCharge
 def get_atomCharge(bondfilepath,timestep,**kwargs):
     charges = {}
-    with open(bondfilepath) as bf:
-        for line in bf:
-            if 'Timestep' in line:
-                step = int(line.strip().split()[-1])
-            
-            if step==timestep:
-                splitted = line.strip().split()
-                if splitted[0].isnumeric():
-                    parent  = int(splitted[0])
-                    charge  = float(splitted[-1])
-                    charges[parent]=charge 
+    for splitted in get_frame_rows(bondfilepath, timestep):
+        parent  = int(splitted[0])
+        charge  = float(splitted[-1])
+        charges[parent]=charge 
     return charges
 #%% get_molecules
 def get_molecules(atomConnectivity):
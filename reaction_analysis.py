@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Molecule identity and reactions along a trajectory.
+
+Molecules of consecutive frames are matched by the atoms they share.
+Both classes work on one frame at a time (BondFrame or neighbours dict),
+so they can follow trajectories that do not fit in memory:
+
+    lineage = MoleculeLineage(atomsymbols)
+    for frame in iter_bondfile_frames(bondfilepath):
+        lineage.update(frame)
+    lineage.lifetimes(), lineage.events()
+"""
+
+import numpy as np
+from collections import namedtuple, Counter, deque
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from magnolia.bondframe import BondFrame
+from magnolia.species_analysis import molecule_labels, molecular_formulas, molecule_signatures
+
+## List of classes/functions ##
+# 1. frame_molecules
+# 2. MoleculeLineage
+# 3. ReactionExtractor
+
+#%%
+def frame_molecules(neigh, atomsymbols=None, atomtypes=None, cutoff=None):
+    '''
+    Atom ids, molecule labels and formulas of one frame.
+
+    Parameters
+    ----------
+    neigh : BondFrame or dict
+        A frame, or the neighbours of a single timestep.
+    atomsymbols : list of str, optional
+        Atom symbols in the order of the atom types. Without it no
+        formulas are computed.
+    atomtypes : dict, optional
+        {atom: type}, needed for formulas of a neighbours dict.
+    cutoff : float, optional
+        Bond order cutoff, for a BondFrame only.
+
+    Returns
+    -------
+    ids : np.ndarray
+        Sorted atom ids.
+    labels : np.ndarray
+        Molecule label (0..n-1) of every atom.
+    formulas : list of str or None
+        Formula of every molecule.
+    '''
+    ids, labels = molecule_labels(neigh, cutoff, extra=False)
+    if isinstance(neigh, BondFrame):
+        types = neigh.types
+    elif atomsymbols is not None:
+        types = np.fromiter((atomtypes[a] for a in ids.tolist()),
+                            dtype=np.int64, count=len(ids))
+    order = np.argsort(ids, kind='stable')
+    if np.any(order != np.arange(len(ids))):
+        ids, labels = ids[order], labels[order]
+        if atomsymbols is not None:
+            types = np.asarray(types)[order]
+    formulas = None
+    if atomsymbols is not None:
+        distinct, inverse = molecular_formulas(types, labels, atomsymbols)
+        formulas = [distinct[i] for i in inverse.tolist()]
+    return ids, labels, formulas
+
+def _best_match(a, b, weight):
+    # for every distinct a: the b with the largest weight (ties: smallest b)
+    order = np.lexsort((b, -weight, a))
+    first = np.append(True, a[order][1:] != a[order][:-1])
+    return a[order][first], b[order][first]
+
+#%%
+class MoleculeLineage:
+    '''
+    Stable molecule IDs along a trajectory, by atom-overlap matching.
+
+    A molecule of the new frame keeps the ID of a molecule of the previous
+    frame when each is the other's largest overlap (most shared atoms);
+    it keeps its ID even if it gained or lost some atoms. Otherwise it is
+    a new molecule. Every frame adds events:
+
+    - 'formation'     : new ID, with the IDs of the molecules its atoms
+                        came from (none for the first frame)
+    - 'death'         : ID that did not survive
+    - 'fragmentation' : a molecule whose atoms went to several molecules
+    - 'merge'         : a molecule made of atoms of several molecules
+
+    Parameters
+    ----------
+    atomsymbols : list of str, optional
+        Atom symbols; with it the formula of every ID is recorded.
+    atomtypes : dict, optional
+        {atom: type}, for neighbours dicts.
+    cutoff : float, optional
+        Bond order cutoff, for BondFrames.
+    '''
+    def __init__(self, atomsymbols=None, atomtypes=None, cutoff=None):
+        self.atomsymbols = atomsymbols
+        self.atomtypes   = atomtypes
+        self.cutoff      = cutoff
+        self.nframes     = 0
+        # per ID (index = ID)
+        self.birth   = [] # frame number of birth
+        self.death   = [] # last frame seen (-1 while alive)
+        self.formula = [] # formula at birth
+        self.last_formula = []
+        self._events = [] # (frame, step, event, ids, related ids)
+        self._steps  = []
+        self._ids    = None # atom ids of the previous frame
+        self._labels = None # molecule labels of the previous frame
+        self._mol_id = None # molecule label -> ID of the previous frame
+
+    def _new_ids(self, n, frame, formulas):
+        start = len(self.birth)
+        self.birth.extend([frame]*n)
+        self.death.extend([-1]*n)
+        if formulas is None:
+            formulas = [None]*n
+        self.formula.extend(formulas)
+        self.last_formula.extend(formulas)
+        return np.arange(start, start+n)
+
+    def update(self, neigh, step=None):
+        '''
+        Add the next frame.
+
+        Parameters
+        ----------
+        neigh : BondFrame or dict
+            The frame (or neighbours of one timestep).
+        step : int, optional
+            Timestep, if ``neigh`` is a dict. Default is the frame count.
+
+        Returns
+        -------
+        np.ndarray
+            ID of every molecule of the frame (index = molecule label).
+        '''
+        if isinstance(neigh, BondFrame):
+            step = neigh.step
+        elif step is None:
+            step = self.nframes
+        frame = self.nframes
+        ids, labels, formulas = frame_molecules(neigh, self.atomsymbols,
+                                                self.atomtypes, self.cutoff)
+        nmol = int(labels.max())+1 if len(labels) else 0
+
+        if self._ids is None:
+            mol_id = self._new_ids(nmol, frame, formulas)
+            for i in mol_id.tolist():
+                self._events.append((frame, step, 'formation', i, ()))
+        else:
+            mol_id = self._match(ids, labels, nmol, frame, step, formulas)
+
+        if formulas is not None:
+            for i, f in zip(mol_id.tolist(), formulas):
+                self.last_formula[i] = f
+        self._steps.append(step)
+        self._ids, self._labels, self._mol_id = ids, labels, mol_id
+        self.nframes += 1
+        return mol_id
+
+    def _match(self, ids, labels, nmol, frame, step, formulas):
+        # overlap (shared atoms) of every (old molecule, new molecule) pair
+        common, ia, ib = np.intersect1d(self._ids, ids, assume_unique=True,
+                                        return_indices=True)
+        nold = len(self._mol_id)
+        keys = self._labels[ia].astype(np.int64)*max(nmol, 1) + labels[ib]
+        keys, overlap = np.unique(keys, return_counts=True)
+        old, new = keys // max(nmol, 1), keys % max(nmol, 1)
+
+        # mutual largest overlap keeps the ID
+        best_old_new = np.full(nold, -1)
+        a, b = _best_match(old, new, overlap)
+        best_old_new[a] = b
+        best_new_old = np.full(nmol, -1)
+        a, b = _best_match(new, old, overlap)
+        best_new_old[a] = b
+        kept = np.flatnonzero((best_new_old >= 0) &
+                              (best_old_new[np.maximum(best_new_old, 0)] == np.arange(nmol)))
+
+        mol_id = np.full(nmol, -1)
+        mol_id[kept] = self._mol_id[best_new_old[kept]]
+        born = np.flatnonzero(mol_id < 0)
+        mol_id[born] = self._new_ids(len(born), frame,
+                                     None if formulas is None else
+                                     [formulas[i] for i in born.tolist()])
+
+        # events; only molecules that took part in a reaction are visited
+        pairs_old = self._mol_id[old]
+        pairs_new = mol_id[new]
+        nparts_new = np.bincount(new, minlength=nmol)
+        nparts_old = np.bincount(old, minlength=nold)
+        sources = {}
+        for o, n in zip(pairs_old[nparts_new[new] > 1].tolist(),
+                        pairs_new[nparts_new[new] > 1].tolist()):
+            sources.setdefault(n, []).append(o)
+        targets = {}
+        for o, n in zip(pairs_old[nparts_old[old] > 1].tolist(),
+                        pairs_new[nparts_old[old] > 1].tolist()):
+            targets.setdefault(o, []).append(n)
+
+        dead = np.setdiff1d(self._mol_id, mol_id[kept])
+        origin = {}
+        mask = np.isin(pairs_new, mol_id[born])
+        for o, n in zip(pairs_old[mask].tolist(), pairs_new[mask].tolist()):
+            origin.setdefault(n, []).append(o)
+        fate = {}
+        mask = np.isin(pairs_old, dead)
+        for o, n in zip(pairs_old[mask].tolist(), pairs_new[mask].tolist()):
+            fate.setdefault(o, []).append(n)
+
+        for i in mol_id[born].tolist():
+            self._events.append((frame, step, 'formation', i, tuple(origin.get(i, ()))))
+        for o, ns in targets.items():
+            self._events.append((frame, step, 'fragmentation', o, tuple(ns)))
+        for n, os_ in sources.items():
+            self._events.append((frame, step, 'merge', n, tuple(os_)))
+        for i in dead.tolist():
+            self.death[i] = frame-1
+            self._events.append((frame, step, 'death', i, tuple(fate.get(i, ()))))
+        return mol_id
+
+    #---------------------------------------------------------------------
+    def lifetimes(self):
+        '''
+        DataFrame with one row per ID: birth and death frame and step,
+        number of frames lived, formula at birth and last formula. IDs
+        alive in the last frame have ``alive=True``.
+        '''
+        import pandas as pd
+        birth = np.array(self.birth, dtype=np.int64)
+        death = np.array(self.death, dtype=np.int64)
+        alive = death < 0
+        death[alive] = self.nframes-1
+        steps = np.array(self._steps)
+        df = pd.DataFrame({'birth_frame': birth, 'death_frame': death,
+                           'birth_step': steps[birth] if len(steps) else birth,
+                           'death_step': steps[death] if len(steps) else death,
+                           'lifetime': death-birth+1, 'alive': alive,
+                           'formula': self.formula,
+                           'last_formula': self.last_formula})
+        df.index.name = 'ID'
+        return df
+
+    def events(self):
+        '''DataFrame of the events: frame, step, event, ID, related IDs.'''
+        import pandas as pd
+        return pd.DataFrame(self._events,
+                            columns=['frame', 'step', 'event', 'ID', 'related'])
+
+    def __repr__(self):
+        return 'MoleculeLineage(nframes={}, nids={}, nevents={})'.format(
+            self.nframes, len(self.birth), len(self._events))
+
+#%%
+Reaction = namedtuple('Reaction', ['frame', 'step', 'reactants', 'products', 'atoms'])
+
+class ReactionExtractor:
+    '''
+    Reactions between consecutive frames and the reaction network.
+
+    Molecules whose atom set changed between two frames are grouped into
+    reactions: the old and new molecules connected by shared atoms form
+    one reaction (reactant formulas -> product formulas, with the atom
+    ids involved). Molecule atom sets are compared through 64-bit
+    signatures, so unchanged molecules cost one hashed lookup.
+
+    A reaction that is undone (products -> reactants, same atom sets)
+    within ``persistence`` frames is a bond flicker: both are dropped.
+
+    Parameters
+    ----------
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    atomtypes : dict, optional
+        {atom: type}, for neighbours dicts.
+    cutoff : float, optional
+        Bond order cutoff, for BondFrames.
+    persistence : int, optional
+        Number of frames a reaction must survive. 0 keeps every reaction.
+        Default is 1 (an A -> B -> A flicker of one frame is dropped).
+    keep_atoms : bool, optional
+        Keep the atom ids of every reaction. Default is True.
+    '''
+    def __init__(self, atomsymbols, atomtypes=None, cutoff=None,
+                 persistence=1, keep_atoms=True):
+        self.atomsymbols = atomsymbols
+        self.atomtypes   = atomtypes
+        self.cutoff      = cutoff
+        self.persistence = persistence
+        self.keep_atoms  = keep_atoms
+        self.reactions   = []        # confirmed Reaction records
+        self.counts      = Counter() # (reactants, products) -> count
+        self.nflickers   = 0
+        self.nframes     = 0
+        self._steps      = []
+        self._prev       = None      # ids, labels, signatures, formulas
+        self._pending    = deque()   # [frame, key, Reaction, alive]
+        self._open       = {}        # key -> pending entries
+
+    def update(self, neigh, step=None):
+        '''
+        Add the next frame; returns the raw reactions found against the
+        previous frame (before flicker filtering).
+        '''
+        if isinstance(neigh, BondFrame):
+            step = neigh.step
+        elif step is None:
+            step = self.nframes
+        ids, labels, formulas = frame_molecules(neigh, self.atomsymbols,
+                                                self.atomtypes, self.cutoff)
+        signatures = molecule_signatures(ids, labels)
+        found = []
+        if self._prev is not None:
+            found = self._diff(self._prev, (ids, labels, signatures, formulas),
+                               step)
+        self._prev = (ids, labels, signatures, formulas)
+        self._steps.append(step)
+        for key, reaction in found:
+            self._push(key, reaction)
+        self.nframes += 1
+        self._flush(self.nframes-1-self.persistence)
+        return [reaction for _, reaction in found]
+
+    def _diff(self, old, new, step):
+        ids0, labels0, sig0, formulas0 = old
+        ids1, labels1, sig1, formulas1 = new
+        common, i0, i1 = np.intersect1d(ids0, ids1, assume_unique=True,
+                                        return_indices=True)
+        changed = sig0[labels0[i0]] != sig1[labels1[i1]]
+        if not changed.any():
+            return []
+        atoms = common[changed]
+        m0, m1 = labels0[i0][changed], labels1[i1][changed]
+
+        # bipartite graph old molecule <-> new molecule through the atoms
+        u0, g0 = np.unique(m0, return_inverse=True)
+        u1, g1 = np.unique(m1, return_inverse=True)
+        n = len(u0) + len(u1)
+        graph = csr_matrix((np.ones(len(atoms), dtype=np.int8),
+                            (g0, len(u0)+g1)), shape=(n, n))
+        ngroups, group = connected_components(graph, directed=False)
+        atom_group = group[g0]
+
+        found  = []
+        order  = np.argsort(atom_group, kind='stable')
+        bounds = np.searchsorted(atom_group[order], np.arange(ngroups+1))
+        old_of = [[] for _ in range(ngroups)]
+        new_of = [[] for _ in range(ngroups)]
+        for k, g in enumerate(group[:len(u0)].tolist()):
+            old_of[g].append(int(u0[k]))
+        for k, g in enumerate(group[len(u0):].tolist()):
+            new_of[g].append(int(u1[k]))
+        for g in range(ngroups):
+            key = (tuple(sorted(sig0[old_of[g]].tolist())),
+                   tuple(sorted(sig1[new_of[g]].tolist())))
+            reaction = Reaction(self.nframes, step,
+                                tuple(sorted(formulas0[m] for m in old_of[g])),
+                                tuple(sorted(formulas1[m] for m in new_of[g])),
+                                atoms[order[bounds[g]:bounds[g+1]]]
+                                if self.keep_atoms else None)
+            found.append((key, reaction))
+        return found
+
+    def _push(self, key, reaction):
+        # a pending reverse reaction (same atom sets) means a flicker
+        if self.persistence > 0:
+            reverse = self._open.get((key[1], key[0]))
+            while reverse:
+                entry = reverse.pop()
+                if entry[3]:
+                    entry[3] = False
+                    self.nflickers += 1
+                    return
+        entry = [self.nframes, key, reaction, True]
+        self._pending.append(entry)
+        self._open.setdefault(key, []).append(entry)
+
+    def _flush(self, frame):
+        # confirm the pending reactions found at or before ``frame``
+        while self._pending and self._pending[0][0] <= frame:
+            entry = self._pending.popleft()
+            entries = [e for e in self._open.get(entry[1], ()) if e is not entry]
+            if entries:
+                self._open[entry[1]] = entries
+            else:
+                self._open.pop(entry[1], None)
+            if entry[3]:
+                reaction = entry[2]
+                self.reactions.append(reaction)
+                self.counts[(reaction.reactants, reaction.products)] += 1
+
+    def close(self):
+        '''Confirm the reactions still pending at the end of the trajectory.'''
+        self._flush(np.inf)
+        return self
+
+    #---------------------------------------------------------------------
+    def table(self):
+        '''DataFrame of the confirmed reactions, one row each.'''
+        import pandas as pd
+        return pd.DataFrame({'frame': [r.frame for r in self.reactions],
+                             'step': [r.step for r in self.reactions],
+                             'reactants': [' + '.join(r.reactants) for r in self.reactions],
+                             'products': [' + '.join(r.products) for r in self.reactions],
+                             'natoms': [0 if r.atoms is None else len(r.atoms)
+                                        for r in self.reactions]})
+
+    def network(self, timestep=None):
+        '''
+        Weighted reaction network.
+
+        Parameters
+        ----------
+        timestep : float, optional
+            MD timestep (fs). With it the rates are per ps, otherwise per
+            frame.
+
+        Returns
+        -------
+        nx.DiGraph
+            Species nodes; an edge reactant -> product for every reaction,
+            with ``weight`` (number of reactions), ``rate`` and
+            ``reactions`` ({'A + B -> C': count}).
+        '''
+        import networkx as nx
+        if timestep is not None and len(self._steps) > 1:
+            duration = (self._steps[-1]-self._steps[0])*timestep/1000
+        else:
+            duration = max(len(self._steps)-1, 1)
+        graph = nx.DiGraph()
+        for (reactants, products), count in self.counts.items():
+            name = '{} -> {}'.format(' + '.join(reactants), ' + '.join(products))
+            for r in set(reactants):
+                for p in set(products):
+                    if graph.has_edge(r, p):
+                        data = graph[r][p]
+                        data['weight'] += count
+                    else:
+                        graph.add_edge(r, p, weight=count, reactions={})
+                        data = graph[r][p]
+                    data['reactions'][name] = data['reactions'].get(name, 0) + count
+        for r, p, data in graph.edges(data=True):
+            data['rate'] = data['weight']/duration
+        return graph
+
+    def __repr__(self):
+        return 'ReactionExtractor(nframes={}, nreactions={}, nflickers={})'.format(
+            self.nframes, len(self.reactions), self.nflickers)
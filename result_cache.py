@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Content-addressed cache of function results.
+
+The cache key is a hash of the function's module and name, its arguments,
+and the fingerprint (size, modification time, optionally a hash of the
+first and last MiB) of every argument that is an existing file path. A
+changed bond file, cutoff or atomsymbols list therefore gives a new key
+instead of a stale result. Arguments are pickled straight into the hash;
+parsed bond data is hashed through the buffers of its frame arrays.
+
+Results are written atomically (temporary file + rename) as pickle or
+JSON. The cache directory can be bounded in size; the least recently
+used entries are evicted first.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+import numpy as np
+from types import SimpleNamespace
+from functools import wraps
+from collections.abc import Mapping
+from magnolia.bondframe import BondData, StepView
+from magnolia.frame_cache import file_fingerprint
+
+## List of classes/functions ##
+# 1. cache_key
+# 2. ResultCache
+# 3. cached
+
+DEFAULT_CACHEDIR = os.environ.get('MAGNOLIA_CACHE',
+                                  os.path.join(os.path.expanduser('~'),
+                                               '.cache', 'magnolia'))
+BACKENDS = {'pickle': '.pkl', 'json': '.json'}
+# raised by ResultCache.load for a missing, truncated or corrupt entry
+LOAD_ERRORS = (OSError, EOFError, pickle.UnpicklingError, json.JSONDecodeError,
+               ValueError)
+
+#%%
+class _KeyPickler(pickle.Pickler):
+    # pickles an argument straight into the hash (no pickled copy of a
+    # large dict, e.g. neighbours), at the speed of the C pickler
+    def __init__(self, h, partial_hash):
+        super().__init__(SimpleNamespace(write=h.update), protocol=4)
+        self.partial_hash = partial_hash
+
+    def reducer_override(self, value):
+        if isinstance(value, (set, frozenset)):
+            # iteration order of a set of strings changes between sessions
+            # (hash randomization): sort it so that keys persist
+            return type(value), (sorted(value, key=repr),)
+        if isinstance(value, (BondData, StepView)):
+            h = hashlib.blake2b(digest_size=20)
+            _feed(h, value, self.partial_hash, {})
+            return str, (type(value).__name__ + h.hexdigest(),)
+        return NotImplemented
+
+def _feed(h, value, partial_hash, seen):
+    # add one argument to the hash
+    if isinstance(value, str) and os.path.isfile(value):
+        h.update(b'file')
+        h.update(repr(sorted(file_fingerprint(value, partial_hash).items())).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, BondData):
+        h.update(b'frames')
+        _feed(h, list(value), partial_hash, seen)
+        for frame in value.frames:
+            h.update(repr(frame.step).encode())
+            for name in type(frame).__slots__[1:]:
+                array = getattr(frame, name)
+                if isinstance(array, np.ndarray) and id(array) in seen:
+                    h.update(repr(seen[id(array)]).encode())
+                elif isinstance(array, np.ndarray):
+                    seen[id(array)] = len(seen)
+                    _feed(h, array, partial_hash, seen)
+                else:
+                    h.update(repr(array).encode())
+    elif isinstance(value, StepView):
+        h.update(b'stepview')
+        h.update(getattr(value._getter, '__qualname__', '').encode())
+        _feed(h, value._bonddata, partial_hash, seen)
+    else:
+        try:
+            _KeyPickler(h, partial_hash).dump(value)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # what was pickled before the failure stays in the hash; it
+            # is the same for the same argument
+            _feed_items(h, value, partial_hash, seen)
+
+def _feed_items(h, value, partial_hash, seen):
+    # unpicklable argument: containers item by item, else its repr
+    if isinstance(value, Mapping):
+        h.update(b'mapping')
+        for k, v in value.items():
+            _feed(h, k, partial_hash, seen)
+            _feed(h, v, partial_hash, seen)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        h.update(type(value).__name__.encode())
+        if isinstance(value, (set, frozenset)):
+            value = sorted(value, key=repr)
+        for v in value:
+            _feed(h, v, partial_hash, seen)
+    else:
+        h.update(repr(value).encode())
+
+def cache_key(function, args=(), kwargs=None, partial_hash=False):
+    '''
+    Hex key of a call: function module and name, arguments, and the
+    fingerprints of arguments that are existing file paths.
+    '''
+    h = hashlib.blake2b(digest_size=20)
+    h.update('{}.{}'.format(function.__module__,
+                            function.__qualname__).encode())
+    seen = {}
+    for value in args:
+        _feed(h, value, partial_hash, seen)
+    for name in sorted(kwargs or {}):
+        h.update(name.encode())
+        _feed(h, kwargs[name], partial_hash, seen)
+    return h.hexdigest()
+
+#%%
+class ResultCache:
+    '''
+    Directory of cached results, one file per key.
+
+    Parameters
+    ----------
+    cachedir : str, optional
+        Directory of the cache. Default is $MAGNOLIA_CACHE or
+        ~/.cache/magnolia.
+    backend : str, optional
+        'pickle' (any object) or 'json' (json-serializable results).
+    maxsize : int, optional
+        Size limit of the directory in bytes; least recently used entries
+        are removed when it is exceeded. Default is no limit.
+    '''
+    def __init__(self, cachedir=None, backend='pickle', maxsize=None):
+        if backend not in BACKENDS:
+            raise ValueError("backend must be one of {}".format(list(BACKENDS)))
+        self.cachedir = cachedir or DEFAULT_CACHEDIR
+        self.backend  = backend
+        self.maxsize  = maxsize
+
+    def path(self, key, name=''):
+        prefix = name+'-' if name else ''
+        return os.path.join(self.cachedir, prefix+key+BACKENDS[self.backend])
+
+    def load(self, path):
+        '''Cached result at ``path``. Raises one of LOAD_ERRORS if unusable.'''
+        if self.backend == 'json':
+            with open(path, 'r') as f:
+                data = json.load(f)
+        else:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        os.utime(path) # mark as recently used
+        return data
+
+    def dump(self, data, path):
+        '''Write atomically; the old file (if any) is replaced in one step.'''
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            if self.backend == 'json':
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f)
+            else:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        '''Remove least recently used entries until under ``maxsize``.'''
+        if self.maxsize is None or not os.path.isdir(self.cachedir):
+            return
+        entries = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith(tuple(BACKENDS.values())):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cachedir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.maxsize:
+                break
+            try:
+                os.remove(os.path.join(self.cachedir, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.cachedir):
+            if name.endswith(tuple(BACKENDS.values())):
+                os.remove(os.path.join(self.cachedir, name))
+
+def cached(cachedir=None, backend='pickle', maxsize=None, partial_hash=False):
+    '''
+    Decorator: reuse the result of a call with the same key.
+
+    Usage::
+
+        @cached(cachedir='cache', maxsize=2**30)
+        def get_species_count(bondfilepath, atomsymbols, cutoff=0.3): ...
+
+    The wrapped function gets a ``cache`` attribute (the ResultCache) and
+    a ``key(*args, **kwargs)`` helper.
+    '''
+    store = ResultCache(cachedir, backend, maxsize)
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            path = store.path(cache_key(function, args, kwargs, partial_hash),
+                              function.__name__)
+            if os.path.exists(path):
+                try:
+                    return store.load(path)
+                except LOAD_ERRORS:
+                    pass # corrupt or unreadable entry: recompute
+            data = function(*args, **kwargs)
+            store.dump(data, path)
+            return data
+        wrapper.cache = store
+        wrapper.key   = lambda *args, **kwargs: cache_key(function, args,
+                                                          kwargs, partial_hash)
+        return wrapper
+    return decorator
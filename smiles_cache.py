@@ -0,0 +1,593 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Memoized SMILES of molecule graphs.
+
+Building an RDKit molecule and calling ``MolToSmiles`` costs far more
+than recognising a molecule that was already converted, and the same few
+hundred species recur in every frame of a trajectory. Every molecule is
+therefore keyed by a Weisfeiler-Lehman (WL) hash of its graph (atom
+types as node labels, bond classes as edge labels) and its SMILES is
+looked up in a bounded LRU cache that can be saved to disk.
+
+The WL hashes of all molecules of a frame are computed together on the
+CSR arrays of the frame: every refinement step is a handful of array
+operations over all atoms. A molecule is refined until its number of
+distinct atom colours stops growing (its stable colouring), so its hash
+depends on the molecule only, not on the frame it is found in.
+
+WL refinement does not separate every pair of non-isomorphic graphs; it
+does not see ring sizes, for instance, so decalin and bicyclopentyl
+(both C10H18) get the same hash. The cache key therefore also holds the
+formula, the degree sequence and the number of closed walks of length 3
+to 6 of the molecule (molecule_invariants), which tell such rings apart.
+Collisions are still possible for larger, more regular graphs: two
+molecules with the same key share the SMILES of the first one seen.
+"""
+
+import os
+import json
+import numpy as np
+import scipy.sparse as sp
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from rdkit import Chem
+from magnolia.species_analysis import molecule_labels, _atom_hash, _SpeciesCountsBuilder
+from magnolia.result_cache import ResultCache
+
+## List of classes/functions ##
+# 1. wl_hashes
+# 2. frame_graph_hashes
+# 3. molecule_invariants
+# 4. molecule_keys
+# 5. graph_hash
+# 6. graph_key
+# 7. molecule_smiles
+# 8. SmilesCache
+# 9. frame_smiles
+# 10. smiles_species_counts
+
+BOND_SALT = np.uint64(0x2545F4914F6CDD1D)
+TYPE_SALT = np.uint64(0x6A09E667F3BCC909)
+WALK_LENGTHS = (3, 4, 5, 6) # closed walks counted by molecule_invariants
+
+#%%
+def _per_molecule_distinct(labels, colours, nmolecules):
+    # number of distinct colours in every molecule
+    order = np.lexsort((colours, labels))
+    l, c  = labels[order], colours[order]
+    new   = np.ones(len(l), dtype=bool)
+    new[1:] = (l[1:] != l[:-1]) | (c[1:] != c[:-1])
+    return np.bincount(l[new], minlength=nmolecules)
+
+def _per_molecule_sum(labels, values, nmolecules):
+    # wrapping uint64 sum of values per molecule
+    order  = np.argsort(labels, kind='stable')
+    sums   = np.zeros(nmolecules, dtype=np.uint64)
+    if len(labels):
+        start = np.searchsorted(labels[order], np.arange(nmolecules))
+        present = np.bincount(labels, minlength=nmolecules) > 0
+        sums[present] = np.add.reduceat(values[order], start[present])
+    return sums
+
+def wl_hashes(types, offsets, rows, labels, bond_classes=None):
+    '''
+    WL hash of every molecule of a graph given as CSR arrays.
+
+    Parameters
+    ----------
+    types : np.ndarray
+        Atom type of every node.
+    offsets, rows : np.ndarray
+        Neighbours of node ``i`` are the nodes ``rows[offsets[i]:offsets[i+1]]``.
+    labels : np.ndarray
+        Molecule label (0..nmolecules-1) of every node.
+    bond_classes : np.ndarray, optional
+        Bond class of every entry of ``rows`` (e.g. single/double/triple).
+        Default is one class for all bonds.
+
+    Returns
+    -------
+    np.ndarray of uint64
+        Hash of every molecule, in label order.
+    '''
+    labels     = np.asarray(labels, dtype=np.int64)
+    nmolecules = int(labels.max())+1 if len(labels) else 0
+    rows       = np.asarray(rows, dtype=np.int64)
+    if bond_classes is None:
+        bond_classes = np.zeros(len(rows), dtype=np.int64)
+    with np.errstate(over='ignore'):
+        bond_salt = _atom_hash(np.asarray(bond_classes).astype(np.uint64) ^ BOND_SALT)
+        colours   = _atom_hash(np.asarray(types).astype(np.uint64) ^ TYPE_SALT)
+
+    hashes = np.zeros(nmolecules, dtype=np.uint64)
+    done   = np.zeros(nmolecules, dtype=bool)
+    count  = _per_molecule_distinct(labels, colours, nmolecules)
+    # a molecule of n atoms is stable after at most n refinements
+    for _ in range(len(types)+1):
+        with np.errstate(over='ignore'):
+            # sum over the bonds of every atom with one wrapping cumsum
+            message = _atom_hash(colours[rows] + bond_salt)
+            csum    = np.concatenate(([np.uint64(0)], np.cumsum(message, dtype=np.uint64)))
+            incoming = csum[offsets[1:]] - csum[offsets[:-1]]
+            refined = _atom_hash(colours*np.uint64(31) + incoming)
+        new_count = _per_molecule_distinct(labels, refined, nmolecules)
+        stable = ~done & (new_count == count)
+        if np.any(stable):
+            with np.errstate(over='ignore'):
+                sums = _per_molecule_sum(labels, _atom_hash(colours), nmolecules)
+            hashes[stable] = sums[stable]
+            done |= stable
+        if done.all():
+            break
+        colours, count = refined, new_count
+    return hashes
+
+def frame_graph_hashes(frame, cutoff=None, thresholds=None):
+    '''
+    Molecules of a BondFrame and their WL hashes.
+
+    Bonds to atoms missing from the frame (lost atoms) are ignored.
+
+    Parameters
+    ----------
+    frame : BondFrame
+    cutoff : float, optional
+        Bond order cutoff. Default is the frame's.
+    thresholds : BondThresholds, optional
+        Bond typing; bonds are then labelled by bond type. Default is
+        one class for all bonds.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Molecule label of every atom (row) of the frame.
+    hashes : np.ndarray of uint64
+        WL hash of every molecule.
+    rows, offsets, classes : np.ndarray
+        Bonded neighbour rows (CSR) and their bond classes.
+    '''
+    mask = frame.bond_mask(cutoff)
+    rows = frame.rows(frame.neighbours[mask])
+    classes = np.zeros(len(rows), dtype=np.int64) if thresholds is None else \
+              thresholds.bond_types(frame.bondorders[mask])
+    keep    = rows >= 0
+    kept    = np.zeros(len(mask)+1, dtype=np.int64)
+    np.cumsum(mask, out=kept[1:])
+    offsets = kept[frame.offsets]
+    if not keep.all():
+        kept = np.zeros(len(rows)+1, dtype=np.int64)
+        np.cumsum(keep, out=kept[1:])
+        offsets, rows, classes = kept[offsets], rows[keep], classes[keep]
+    _, labels = molecule_labels(frame, cutoff, extra=False)
+    hashes = wl_hashes(frame.types, offsets, rows, labels, classes)
+    return labels, hashes, rows, offsets, classes
+
+def _per_molecule_counts(labels, values, nmolecules):
+    # (nmolecules x max(values)+1) number of atoms with every value
+    values = np.asarray(values, dtype=np.int64)
+    width  = int(values.max())+1 if len(values) else 1
+    counts = np.bincount(labels*width + values, minlength=nmolecules*width)
+    return counts.reshape(nmolecules, width)
+
+def molecule_invariants(types, offsets, rows, labels):
+    '''
+    Invariants of every molecule that are added to its WL hash in the
+    SMILES cache key.
+
+    Parameters
+    ----------
+    types, offsets, rows, labels :
+        See wl_hashes.
+
+    Returns
+    -------
+    formula : np.ndarray
+        (nmolecules x max type+1) number of atoms of every type.
+    degrees : np.ndarray
+        (nmolecules x max degree+1) number of atoms of every degree (the
+        sorted degree sequence).
+    walks : np.ndarray
+        (nmolecules x 4) number of closed walks of length 3, 4, 5 and 6,
+        i.e. the traces of the powers of the adjacency matrix. They depend
+        on the rings of 3 to 6 atoms, which WL refinement does not see.
+    '''
+    labels     = np.asarray(labels, dtype=np.int64)
+    nmolecules = int(labels.max())+1 if len(labels) else 0
+    n          = len(labels)
+    offsets    = np.asarray(offsets, dtype=np.int64)
+    formula    = _per_molecule_counts(labels, types, nmolecules)
+    degrees    = _per_molecule_counts(labels, np.diff(offsets), nmolecules)
+
+    A = sp.csr_matrix((np.ones(len(rows), dtype=np.int64),
+                       np.asarray(rows, dtype=np.int64), offsets), shape=(n, n))
+    powers = {1: A}
+    powers[2] = A @ A
+    powers[3] = powers[2] @ A
+    walks = np.zeros((nmolecules, len(WALK_LENGTHS)), dtype=np.int64)
+    for c, length in enumerate(WALK_LENGTHS):
+        # diag(A^length) = row sums of A^a * (A^b).T, a+b = length
+        a, b = (length+1)//2, length//2
+        closed = np.asarray(powers[a].multiply(powers[b].T).sum(axis=1)).ravel()
+        walks[:, c] = np.bincount(labels, weights=closed,
+                                  minlength=nmolecules).round().astype(np.int64)
+    return formula, degrees, walks
+
+def molecule_keys(hashes, invariants, context=''):
+    '''
+    SmilesCache keys of molecules from their WL hashes and invariants
+    (molecule_invariants), computed once per distinct molecule.
+
+    Returns
+    -------
+    keys : list of str
+        Distinct keys.
+    first : np.ndarray
+        First molecule with every key.
+    inverse : np.ndarray
+        Key (position in ``keys``) of every molecule.
+    counts : np.ndarray
+        Number of molecules with every key.
+    '''
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    table  = np.column_stack([hashes.view(np.int64)] + list(invariants))
+    _, first, inverse, counts = np.unique(
+        table, axis=0, return_index=True, return_inverse=True, return_counts=True)
+    keys = [SmilesCache.key(hashes[m], context,
+                            tuple(block[m] for block in invariants))
+            for m in first.tolist()]
+    return keys, first, inverse.ravel(), counts
+
+def _graph_arrays(graph, atom_types, bond_classes=None):
+    # (types, offsets, rows, labels, bond classes) of one nx molecule graph
+    nodes = list(graph.nodes)
+    row   = {node: i for i, node in enumerate(nodes)}
+    if isinstance(atom_types, str):
+        atom_types = dict(graph.nodes(data=atom_types))
+    types   = np.array([atom_types[node] for node in nodes], dtype=np.int64)
+    offsets = np.zeros(len(nodes)+1, dtype=np.int64)
+    rows, classes = [], []
+    for i, node in enumerate(nodes):
+        for child, data in graph.adj[node].items():
+            rows.append(row[child])
+            if bond_classes is None:
+                classes.append(0)
+            elif isinstance(bond_classes, str):
+                classes.append(data[bond_classes])
+            else:
+                classes.append(bond_classes.get((node, child),
+                                                bond_classes.get((child, node), 0)))
+        offsets[i+1] = len(rows)
+    return (types, offsets, np.array(rows, dtype=np.int64),
+            np.zeros(len(nodes), dtype=np.int64), np.array(classes, dtype=np.int64))
+
+def graph_hash(graph, atom_types, bond_classes=None):
+    '''
+    WL hash of a single molecule given as an nx.Graph.
+
+    Parameters
+    ----------
+    graph : nx.Graph
+        Molecule graph.
+    atom_types : dict or str
+        {node: atom type}, or the name of the node attribute holding it.
+    bond_classes : dict or str, optional
+        {(u, v): bond class}, or the name of the edge attribute holding
+        it. Default is one class for all bonds.
+
+    Returns
+    -------
+    int
+    '''
+    hashes = wl_hashes(*_graph_arrays(graph, atom_types, bond_classes))
+    return int(hashes[0]) if len(hashes) else 0
+
+def graph_key(graph, atom_types, bond_classes=None, context=''):
+    '''
+    SmilesCache key of a single molecule given as an nx.Graph: WL hash
+    plus molecule_invariants. Arguments as graph_hash; ``context`` is
+    appended (conversion settings).
+    '''
+    types, offsets, rows, labels, classes = _graph_arrays(graph, atom_types,
+                                                          bond_classes)
+    if len(types) == 0:
+        return SmilesCache.key(0, context)
+    hashes = wl_hashes(types, offsets, rows, labels, classes)
+    return molecule_keys(hashes, molecule_invariants(types, offsets, rows, labels),
+                         context)[0][0]
+
+#%%
+RDKIT_BONDS = {1: Chem.BondType.SINGLE, 2: Chem.BondType.DOUBLE,
+               3: Chem.BondType.TRIPLE}
+
+def molecule_smiles(symbols, bonds, bond_types=None, hydrogens=True):
+    '''
+    Canonical SMILES of one molecule.
+
+    Atoms get no implicit hydrogens, so radicals and the unusual valences
+    of reactive fragments are written as they are (e.g. ``[CH3]``).
+
+    Parameters
+    ----------
+    symbols : list of str
+        Element of every atom.
+    bonds : iterable of (int, int)
+        Bonds as pairs of positions in ``symbols``, each bond once.
+    bond_types : iterable of int, optional
+        1, 2 or 3 per bond. Default is single bonds.
+    hydrogens : bool, optional
+        If False, hydrogen atoms are left out (heavy-atom skeleton, as
+        in moleculeGraph2smiles). Default is True.
+
+    Returns
+    -------
+    str
+    '''
+    mol   = Chem.RWMol()
+    index = {}
+    for i, symbol in enumerate(symbols):
+        if not hydrogens and symbol == 'H':
+            continue
+        atom = Chem.Atom(symbol)
+        atom.SetNoImplicit(True)
+        index[i] = mol.AddAtom(atom)
+    if bond_types is None:
+        bond_types = [1]*len(bonds)
+    for (u, v), bond_type in zip(bonds, bond_types):
+        if u in index and v in index:
+            mol.AddBond(index[u], index[v],
+                        RDKIT_BONDS.get(int(bond_type), Chem.BondType.SINGLE))
+    mol = mol.GetMol()
+    mol.UpdatePropertyCache(strict=False)
+    if any(atom.GetAtomicNum() != 1 for atom in mol.GetAtoms()):
+        # explicit H atoms -> H counts of their heavy atom
+        mol = Chem.RemoveHs(mol, sanitize=False)
+    return Chem.MolToSmiles(mol)
+
+#%%
+class SmilesCache:
+    '''
+    Bounded LRU cache {graph key: SMILES}.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Number of entries kept; the least recently used are dropped
+        first. Default is 100000.
+    path : str, optional
+        JSON file the cache is loaded from (if it exists) and saved to.
+    '''
+    def __init__(self, maxsize=100000, path=None):
+        self.maxsize = maxsize
+        self.path    = path
+        self.hits    = 0
+        self.misses  = 0
+        self._data   = OrderedDict()
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._data.update(json.load(f))
+            except (OSError, ValueError):
+                pass # unreadable cache file: start empty
+            self._trim()
+
+    @staticmethod
+    def key(hash_value, context='', invariants=()):
+        '''
+        String key of a graph hash, its invariants (count vectors, see
+        molecule_invariants; trailing zeros are dropped) and the
+        conversion settings.
+        '''
+        parts = []
+        for counts in invariants:
+            counts = np.trim_zeros(np.asarray(counts), 'b')
+            parts.append('.'.join(map(str, counts.tolist())))
+        return '{:016x}{}{}'.format(int(hash_value),
+                                    ''.join('/'+part for part in parts), context)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, smiles):
+        self._data[key] = smiles
+        self._data.move_to_end(key)
+        self._trim()
+
+    def lookup(self, key, compute):
+        '''SMILES of ``key``; ``compute()`` is called on a miss only.'''
+        smiles = self.get(key)
+        if smiles is None:
+            smiles = compute()
+            self.put(key, smiles)
+        return smiles
+
+    def _trim(self):
+        while self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def save(self, path=None):
+        '''Write the cache as JSON (atomically).'''
+        path = path or self.path
+        if path is None:
+            raise ValueError('no path given for the SMILES cache')
+        ResultCache(os.path.dirname(os.path.abspath(path)), 'json').dump(
+            dict(self._data), path)
+
+    def __repr__(self):
+        return 'SmilesCache(size={}, hits={}, misses={})'.format(
+            len(self._data), self.hits, self.misses)
+
+# shared by moleculeGraph2smiles, graph_to_smiles and frame_smiles
+SMILES_CACHE = SmilesCache()
+
+#%%
+def frame_smiles(frame, atomsymbols, cutoff=None, thresholds=None,
+                 cache=SMILES_CACHE):
+    '''
+    SMILES of every molecule of a BondFrame.
+
+    Molecules are hashed together (frame_graph_hashes, molecule_keys);
+    only molecules whose key is not in ``cache`` are converted with RDKit.
+
+    Parameters
+    ----------
+    frame : BondFrame
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    cutoff : float, optional
+        Bond order cutoff. Default is the frame's.
+    thresholds : BondThresholds, optional
+        Bond typing for multiple bonds. Default is single bonds only.
+    cache : SmilesCache, optional
+        Default is the module cache SMILES_CACHE.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Molecule label of every atom (row) of the frame.
+    smiles : list of str
+        SMILES of every molecule.
+    '''
+    labels, hashes, rows, offsets, classes = frame_graph_hashes(frame, cutoff,
+                                                                thresholds)
+    context = '|' + ' '.join(atomsymbols) + ('|typed' if thresholds is not None else '')
+    keys, first, inverse, _ = molecule_keys(
+        hashes, molecule_invariants(frame.types, offsets, rows, labels), context)
+    unique  = [cache.get(key) for key in keys]
+    # convert one instance of every uncached molecule
+    missing = [k for k, s in enumerate(unique) if s is None]
+    if missing:
+        graphs = _molecule_graphs(frame.types, labels, rows, offsets, classes,
+                                  first[missing].tolist())
+        for k, (types, bonds, bond_types) in zip(missing, graphs):
+            unique[k] = molecule_smiles([atomsymbols[t-1] for t in types], bonds,
+                                        bond_types if thresholds is not None else None)
+            cache.put(keys[k], unique[k])
+    return labels, [unique[k] for k in inverse.tolist()]
+
+def _molecule_graphs(types, labels, rows, offsets, classes, molecules):
+    # (atom types, bonds, bond classes) of the given molecules, atoms
+    # numbered from 0 within each molecule, every bond once
+    n       = len(labels)
+    parents = np.repeat(np.arange(n), np.diff(offsets))
+    low, high = np.minimum(parents, rows), np.maximum(parents, rows)
+    _, once = np.unique(low*n + high, return_index=True)
+    low, high, classes = low[once], high[once], classes[once]
+
+    order = np.argsort(labels, kind='stable')
+    start = np.searchsorted(labels[order], np.arange(int(labels.max())+2))
+    local = np.empty(n, dtype=np.int64)
+    local[order] = np.arange(n) - np.repeat(start[:-1], np.diff(start))
+    bond_order = np.argsort(labels[low], kind='stable')
+    bond_start = np.searchsorted(labels[low][bond_order], np.arange(len(start)))
+    graphs = []
+    for m in molecules:
+        atoms = order[start[m]:start[m+1]]
+        bonds = bond_order[bond_start[m]:bond_start[m+1]]
+        graphs.append((types[atoms].tolist(),
+                       list(zip(local[low[bonds]].tolist(),
+                                local[high[bonds]].tolist())),
+                       classes[bonds].tolist()))
+    return graphs
+
+#%%
+def _smiles_batch(graphs, atomsymbols, typed):
+    # worker of smiles_species_counts (module level, so it pickles)
+    return [molecule_smiles([atomsymbols[t-1] for t in types], bonds,
+                            bond_types if typed else None)
+            for types, bonds, bond_types in graphs]
+
+def smiles_species_counts(frames, atomsymbols, thresholds=None, workers=None,
+                          cache=SMILES_CACHE):
+    '''
+    Species count time series with species told apart by SMILES (isomers
+    are separate species), e.g. ethanol CCO and dimethyl ether COC.
+
+    Molecules are counted per cache key (WL hash and invariants, see
+    molecule_keys) while the frames are read. The first instance of every
+    key that is not in ``cache`` is sent, in one
+    batch per frame, to a process pool for the RDKit conversion, which
+    runs while the following frames are hashed.
+
+    Parameters
+    ----------
+    frames : iterable of BondFrame
+        e.g. iter_bondfile_frames(...).
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    thresholds : BondThresholds, optional
+        Bond typing for multiple bonds. Default is single bonds only.
+    workers : int, optional
+        Number of processes. Default is os.cpu_count(); 1 converts in
+        this process.
+    cache : SmilesCache, optional
+        Default is the module cache SMILES_CACHE. New SMILES are added.
+
+    Returns
+    -------
+    SpeciesCounts
+        Same layout as SpeciesCounts.from_frames, SMILES as species.
+    '''
+    context = '|' + ' '.join(atomsymbols) + ('|typed' if thresholds is not None else '')
+    typed   = thresholds is not None
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    pool    = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    steps, frame_counts = [], []
+    smiles_of = {} # key -> SMILES
+    pending   = {} # key -> (future or SMILES list, position)
+    try:
+        for frame in frames:
+            labels, hashes, rows, offsets, classes = frame_graph_hashes(
+                frame, thresholds=thresholds)
+            keys, first, _, count = molecule_keys(
+                hashes, molecule_invariants(frame.types, offsets, rows, labels),
+                context)
+            new  = []
+            for i, key in enumerate(keys):
+                if key in smiles_of or key in pending:
+                    continue
+                smiles = cache.get(key)
+                if smiles is None:
+                    new.append(i)
+                else:
+                    smiles_of[key] = smiles
+            if new:
+                graphs = _molecule_graphs(frame.types, labels, rows, offsets,
+                                          classes, first[new].tolist())
+                if pool is None:
+                    job = _smiles_batch(graphs, atomsymbols, typed)
+                else:
+                    job = pool.submit(_smiles_batch, graphs, atomsymbols, typed)
+                for position, i in enumerate(new):
+                    pending[keys[i]] = (job, position)
+            steps.append(frame.step)
+            frame_counts.append(dict(zip(keys, count.tolist())))
+
+        for key, (job, position) in pending.items():
+            smiles = job[position] if isinstance(job, list) else job.result()[position]
+            smiles_of[key] = smiles
+            cache.put(key, smiles)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    builder = _SpeciesCountsBuilder()
+    for step, counts in zip(steps, frame_counts):
+        species = Counter()
+        for key, n in counts.items():
+            species[smiles_of[key]] += n
+        builder.add(step, species)
+    return builder.build()
@@ -0,0 +1,785 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Array-based molecule and species analysis of bond-file frames.
+
+Molecules are the connected components of the bond graph of a frame.
+They are found on the CSR arrays of a BondFrame (or on a neighbours
+dict) with scipy.sparse.csgraph, which gives one molecule label per
+atom, instead of building an ``nx.Graph`` for every frame.
+
+Molecular formulas are computed for all molecules of a frame at once:
+the atom types and molecule labels give an (n_molecules x n_types)
+composition matrix, and the formula string is built once per distinct
+composition (and cached across frames), not once per molecule.
+"""
+
+import os
+import numpy as np
+from collections import Counter
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from magnolia.bondframe import BondFrame
+
+## List of classes/functions ##
+# 1. molecule_labels
+# 2. molecules_from_labels
+# 3. molecule_signatures
+# 4. formula_from_counts
+# 5. composition_matrix
+# 6. molecular_formulas
+# 7. count_species
+# 8. IncrementalSpeciesTracker
+# 9. SpeciesCounts
+# 10. SpeciesEnsemble
+# 11. SpeciesIndex
+
+# (atomsymbols, merge, composition) -> formula, shared by all frames
+_formulas = {}
+
+#%%
+def _dict_to_csr(neigh):
+    # {atom: [neighbours]} -> node ids in first-seen order, CSR arrays
+    ids     = list(neigh)
+    known   = set(ids)
+    counts  = np.fromiter((len(v) for v in neigh.values()), dtype=np.int64,
+                          count=len(ids))
+    offsets = np.zeros(len(ids)+1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    children = [child for v in neigh.values() for child in v]
+    # atoms that only appear as neighbours are nodes too (as in nx.Graph)
+    for child in children:
+        if child not in known:
+            known.add(child)
+            ids.append(child)
+    return np.array(ids, dtype=np.int64), offsets, np.array(children, dtype=np.int64)
+
+def molecule_labels(neigh, cutoff=None, extra=True):
+    '''
+    Molecule label of every atom of a frame.
+
+    Parameters
+    ----------
+    neigh : BondFrame or dict
+        A frame, or the neighbours of a single timestep ({atom: [atoms]}).
+    cutoff : float, optional
+        Bond order cutoff, for a BondFrame only. Default is the frame's.
+    extra : bool, optional
+        For a BondFrame: atoms that only appear as neighbours (e.g. lost
+        atoms) are extra nodes, as in nx.Graph. If False, bonds to them
+        are ignored. Default is True.
+
+    Returns
+    -------
+    ids : np.ndarray
+        Atom ids.
+    labels : np.ndarray of int
+        Molecule number of every atom of ``ids``, 0..nmolecules-1, in the
+        order the molecules are first met in the file (in ``ids`` for a
+        dict).
+    '''
+    if isinstance(neigh, BondFrame):
+        offsets, children = neigh.bonded(cutoff)
+        ids = neigh.ids
+        # neighbours missing from the rows are extra nodes
+        rows  = neigh.rows(children)
+        if not extra and np.any(rows < 0):
+            kept = np.zeros(len(rows)+1, dtype=offsets.dtype)
+            np.cumsum(rows >= 0, out=kept[1:])
+            offsets, rows = kept[offsets], rows[rows >= 0]
+        missing = np.unique(children[rows < 0]) if extra else children[:0]
+        if len(missing):
+            ids = np.concatenate([ids, missing.astype(ids.dtype)])
+            rows[rows < 0] = neigh.natoms + np.searchsorted(missing, children[rows < 0])
+            offsets = np.append(offsets, np.full(len(missing), offsets[-1]))
+    else:
+        ids, offsets, children = _dict_to_csr(neigh)
+        order = np.argsort(ids, kind='stable')
+        rows  = order[np.searchsorted(ids, children, sorter=order)]
+        offsets = np.append(offsets, np.full(len(ids)+1-len(offsets), offsets[-1]))
+
+    n = len(ids)
+    graph = csr_matrix((np.ones(len(rows), dtype=np.int8), rows, offsets),
+                       shape=(n, n))
+    nmolecules, labels = connected_components(graph, directed=True,
+                                              connection='weak')
+    # number the molecules by their first atom; a frame of an unsorted
+    # file is visited in the file's order, as the dicts of the old parser
+    visit = labels
+    if isinstance(neigh, BondFrame) and neigh.order is not None:
+        visit = labels[np.concatenate([neigh.order,
+                                       np.arange(neigh.natoms, n)])]
+    first  = np.unique(visit, return_index=True)[1]
+    rank   = np.empty(nmolecules, dtype=labels.dtype)
+    rank[np.argsort(first)] = np.arange(nmolecules, dtype=labels.dtype)
+    return ids, rank[labels]
+
+def molecules_from_labels(ids, labels):
+    '''
+    Split atom ids by molecule label.
+
+    Returns
+    -------
+    list of set
+        One set of atom ids per molecule, in label order.
+    '''
+    if len(ids) == 0:
+        return []
+    order  = np.argsort(labels, kind='stable')
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    return [set(group.tolist()) for group in
+            np.split(np.asarray(ids)[order], bounds)]
+
+def _atom_hash(ids):
+    # splitmix64 of the atom ids: a well-mixed 64-bit value per atom
+    with np.errstate(over='ignore'):
+        z = ids.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+def molecule_signatures(ids, labels):
+    '''
+    64-bit signature of the atom set of every molecule (sum of atom
+    hashes, wrapping), so that molecules can be compared between frames
+    with hashed lookups instead of set comparisons.
+    '''
+    if len(labels) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    order = np.argsort(labels, kind='stable')
+    start = np.searchsorted(labels[order], np.arange(int(labels.max())+1))
+    return np.add.reduceat(_atom_hash(ids)[order], start)
+
+#%%
+def formula_from_counts(counts, atomsymbols, merge=False):
+    '''
+    Formula string of one composition.
+
+    Parameters
+    ----------
+    counts : sequence of int
+        Number of atoms of every atom type (type 1 first).
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    merge : bool, optional
+        If True, merge atom types of the same element into one count and
+        write the elements in Hill order (C, H, then alphabetical).
+
+    Returns
+    -------
+    str
+    '''
+    key = (tuple(atomsymbols), merge, tuple(counts))
+    formula = _formulas.get(key)
+    if formula is not None:
+        return formula
+
+    if merge:
+        merged_counts = {}
+        for sym, n in zip(atomsymbols, counts):
+            if n != 0:
+                merged_counts[sym] = merged_counts.get(sym, 0) + n
+        order = ["C", "H"]
+        items = [(elem, merged_counts[elem]) for elem in
+                 order + sorted(set(merged_counts) - set(order))
+                 if elem in merged_counts]
+    else:
+        items = [(sym, n) for sym, n in zip(atomsymbols, counts) if n != 0]
+    formula = ''.join(sym if n == 1 else '{}{}'.format(sym, n)
+                      for sym, n in items)
+    _formulas[key] = formula
+    return formula
+
+def composition_matrix(types, labels, ntypes):
+    '''
+    Atom-type counts of every molecule.
+
+    Parameters
+    ----------
+    types : np.ndarray of int
+        Atom type (1-based) of every atom.
+    labels : np.ndarray of int
+        Molecule label (0..n_molecules-1) of every atom.
+    ntypes : int
+        Number of atom types.
+
+    Returns
+    -------
+    np.ndarray of shape (n_molecules, ntypes)
+    '''
+    types  = np.asarray(types, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64)
+    if len(types) and (types.min() < 1 or types.max() > ntypes):
+        raise IndexError('atom type out of range of atomsymbols')
+    nmolecules = int(labels.max())+1 if len(labels) else 0
+    counts = np.bincount(labels*ntypes + types-1, minlength=nmolecules*ntypes)
+    return counts.reshape(nmolecules, ntypes)
+
+def molecular_formulas(types, labels, atomsymbols, merge=False):
+    '''
+    Formulas of all molecules of a frame.
+
+    Returns
+    -------
+    formulas : list of str
+        Distinct formulas, in the order their first molecule appears.
+        With ``merge`` two entries can be equal (different atom types of
+        the same element).
+    inverse : np.ndarray of int
+        Position in ``formulas`` of every molecule.
+    '''
+    comp = composition_matrix(types, labels, len(atomsymbols))
+    if len(comp) == 0:
+        return [], np.zeros(0, dtype=np.int64)
+    rows, first, inverse = np.unique(comp, axis=0, return_index=True,
+                                     return_inverse=True)
+    order = np.argsort(first)
+    rank  = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    formulas = [formula_from_counts(row, atomsymbols, merge)
+                for row in rows[order].tolist()]
+    return formulas, rank[inverse.ravel()]
+
+def count_species(neigh, atomsymbols, atomtypes=None, merge=False, cutoff=None):
+    '''
+    Species count of one frame.
+
+    Parameters
+    ----------
+    neigh : BondFrame or dict
+        A frame, or the neighbours of a single timestep.
+    atomsymbols : list of str
+        Atom symbols in the order of the atom types.
+    atomtypes : dict, optional
+        {atom: type}. Required for a neighbours dict; for a BondFrame the
+        frame's types are used, and bonds to atoms missing from the frame
+        are ignored unless their types are given here.
+    merge : bool, optional
+        See ``formula_from_counts``.
+    cutoff : float, optional
+        Bond order cutoff, for a BondFrame only.
+
+    Returns
+    -------
+    Counter
+        {formula: number of molecules}, in order of first appearance.
+    '''
+    ids, labels = molecule_labels(neigh, cutoff, extra=atomtypes is not None)
+    if isinstance(neigh, BondFrame):
+        types = neigh.types
+        if len(ids) > neigh.natoms: # atoms found as neighbours only
+            types = np.append(types, [atomtypes[a] for a in
+                                      ids[neigh.natoms:].tolist()])
+    else:
+        types = np.fromiter((atomtypes[a] for a in ids.tolist()),
+                            dtype=np.int64, count=len(ids))
+
+    formulas, inverse = molecular_formulas(types, labels, atomsymbols, merge)
+    species = Counter()
+    for formula, n in zip(formulas, np.bincount(inverse).tolist()):
+        species[formula] += n
+    return species
+
+#%%
+class IncrementalSpeciesTracker:
+    '''
+    Species count of consecutive frames, updated from the bonds that
+    changed since the previous frame.
+
+    The edge set of every frame is compared with the previous one; only
+    the molecules that lost or gained a bond are split into components
+    again and get new formulas. Molecules untouched by a reaction keep
+    their label and formula. A frame with a different set of atoms (or
+    atom types) is counted from scratch. Bonds to atoms missing from the
+    frame are ignored, as in ``count_species`` without ``atomtypes``.
+
+    Usage::
+
+        tracker = IncrementalSpeciesTracker(atomsymbols)
+        for frame in iter_bondfile_frames(bondfilepath, cutoff):
+            species = tracker.update(frame)
+
+    Attributes
+    ----------
+    species : Counter
+        {formula: number of molecules} of the last frame. The counts are
+        those of ``count_species``; the order of the keys can differ.
+    labels : np.ndarray
+        Molecule label of every atom of the last frame (not contiguous).
+    nchanged : int
+        Number of bonds formed or broken at the last update.
+    '''
+    def __init__(self, atomsymbols, merge=False, cutoff=None):
+        self.atomsymbols = list(atomsymbols)
+        self.merge       = merge
+        self.cutoff      = cutoff
+        self.species     = Counter()
+        self.labels      = None
+        self.nchanged    = 0
+        self._ids        = None
+        self._types      = None
+        self._keys       = None # sorted edge keys of the last frame
+        self._formula    = {}   # label -> formula
+        self._next       = 0    # next free label
+
+    def _edge_keys(self, frame):
+        # undirected bonds as sorted unique int64 keys lo<<32 | hi (rows)
+        offsets, children = frame.bonded(self.cutoff)
+        rows_p = np.repeat(np.arange(frame.natoms, dtype=np.int64), np.diff(offsets))
+        if frame.natoms and frame.ids[-1]-frame.ids[0] == frame.natoms-1:
+            rows_c = children.astype(np.int64) - frame.ids[0] # contiguous ids
+            ok     = (rows_c >= 0) & (rows_c < frame.natoms)
+        else:
+            rows_c = frame.rows(children).astype(np.int64)
+            ok     = rows_c >= 0
+        ok    &= rows_p != rows_c # no self bonds
+        lo     = np.minimum(rows_p[ok], rows_c[ok])
+        hi     = np.maximum(rows_p[ok], rows_c[ok])
+        keys   = np.sort((lo << 32) | hi)
+        if len(keys) < 2:
+            return keys
+        # every bond is written by both atoms; keep one copy
+        return keys[np.append(True, keys[1:] != keys[:-1])]
+
+    def _count(self, atoms, labels, ids, types):
+        # formulas of the molecules made of ``atoms`` (rows), with
+        # component labels ``labels`` (0..n-1); returns their new labels
+        uniq, local = np.unique(labels, return_inverse=True)
+        formulas, inverse = molecular_formulas(types[atoms], local,
+                                               self.atomsymbols, self.merge)
+        new_labels = np.arange(self._next, self._next+len(uniq))
+        self._next += len(uniq)
+        for label, f in zip(new_labels.tolist(), inverse.tolist()):
+            self._formula[label] = formulas[f]
+            self.species[formulas[f]] += 1
+        return new_labels[local]
+
+    def _components(self, atoms, keys):
+        # component labels of the subgraph of ``atoms`` (sorted rows)
+        lo  = np.searchsorted(atoms, keys >> 32)
+        hi  = np.searchsorted(atoms, keys & 0xffffffff)
+        n   = len(atoms)
+        graph = csr_matrix((np.ones(len(keys), dtype=np.int8), (lo, hi)),
+                           shape=(n, n))
+        return connected_components(graph, directed=False)[1]
+
+    def reset(self, frame):
+        '''Count ``frame`` from scratch.'''
+        self.species  = Counter()
+        self._formula = {}
+        self._next    = 0
+        self._ids     = frame.ids
+        self._types   = frame.types
+        self._keys    = self._edge_keys(frame)
+        atoms         = np.arange(frame.natoms)
+        self.labels   = self._count(atoms, self._components(atoms, self._keys),
+                                    frame.ids, frame.types)
+        self.nchanged = len(self._keys)
+        return self.species
+
+    def update(self, frame):
+        '''
+        Species count of ``frame``, the frame following the previous one.
+
+        Returns
+        -------
+        Counter
+            The tracker's ``species`` (updated in place).
+        '''
+        same_atoms = self._ids is not None and (
+            self._ids is frame.ids or np.array_equal(self._ids, frame.ids)) \
+            and (self._types is frame.types or np.array_equal(self._types, frame.types))
+        if not same_atoms:
+            return self.reset(frame)
+
+        keys    = self._edge_keys(frame)
+        changed = np.setxor1d(self._keys, keys, assume_unique=True)
+        self._keys    = keys
+        self.nchanged = len(changed)
+        if len(changed) == 0:
+            return self.species
+
+        # every atom of a molecule that lost or gained a bond
+        ends     = np.unique(np.concatenate([changed >> 32, changed & 0xffffffff]))
+        old      = np.unique(self.labels[ends])
+        affected = np.flatnonzero(np.isin(self.labels, old))
+        for label in old.tolist():
+            formula = self._formula.pop(label)
+            self.species[formula] -= 1
+            if self.species[formula] == 0:
+                del self.species[formula]
+
+        # bonds inside the affected atoms (a molecule is closed under bonds)
+        inside = np.isin(keys >> 32, affected)
+        local  = self._components(affected, keys[inside])
+        self.labels[affected] = self._count(affected, local, frame.ids, frame.types)
+        return self.species
+
+#%%
+class SpeciesCounts:
+    '''
+    Species count time series as a sparse (frames x species) matrix.
+
+    Most species exist in a few frames only, so the counts are kept in a
+    ``scipy.sparse.csr_matrix`` with a timestep index and a species index
+    instead of a dense table full of zeros.
+
+    Attributes
+    ----------
+    matrix : scipy.sparse.csr_matrix of int
+        ``matrix[i, j]`` is the number of molecules of ``species[j]`` at
+        ``steps[i]``.
+    steps : np.ndarray
+        Timestep (or time) of every row.
+    species : list of str
+        Formula of every column, in order of first appearance.
+    '''
+    def __init__(self, matrix, steps, species):
+        self.matrix  = csr_matrix(matrix)
+        self.steps   = np.asarray(steps)
+        self.species = list(species)
+        self._column = {s: j for j, s in enumerate(self.species)}
+
+    @classmethod
+    def from_dict(cls, count):
+        '''From {step: {species: count}} (the output of the stepwise counters).'''
+        builder = _SpeciesCountsBuilder()
+        for step, species_count in count.items():
+            builder.add(step, species_count)
+        return builder.build()
+
+    @classmethod
+    def from_frames(cls, frames, atomsymbols, incremental=False):
+        '''Count the species of BondFrames, e.g. iter_bondfile_frames(...).'''
+        builder = _SpeciesCountsBuilder()
+        tracker = IncrementalSpeciesTracker(atomsymbols) if incremental else None
+        for frame in frames:
+            if incremental:
+                builder.add(frame.step, tracker.update(frame))
+            else:
+                builder.add(frame.step, count_species(frame, atomsymbols))
+        return builder.build()
+
+    @property
+    def shape(self):
+        return self.matrix.shape
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __contains__(self, species):
+        return species in self._column
+
+    def __getitem__(self, species):
+        '''Count of ``species`` in every frame (dense 1-D array).'''
+        j = self._column[species]
+        return self.matrix[:, j].toarray().ravel()
+
+    def window(self, start=None, stop=None):
+        '''Frames with start <= step <= stop (either bound may be None).'''
+        keep = np.ones(len(self.steps), dtype=bool)
+        if start is not None:
+            keep &= self.steps >= start
+        if stop is not None:
+            keep &= self.steps <= stop
+        rows = np.flatnonzero(keep)
+        return SpeciesCounts(self.matrix[rows], self.steps[rows], self.species)
+
+    def select(self, species):
+        '''Only the given species, in the given order.'''
+        species = list(species)
+        cols = [self._column[s] for s in species]
+        return SpeciesCounts(self.matrix[:, cols], self.steps, species)
+
+    def exclude(self, species):
+        '''All species except the given ones.'''
+        drop = set(species)
+        return self.select([s for s in self.species if s not in drop])
+
+    def total(self):
+        '''{species: count summed over frames}.'''
+        return dict(zip(self.species, self.matrix.sum(axis=0).A1.tolist()))
+
+    def to_dataframe(self, sparse=False):
+        '''
+        Frames x species DataFrame, index named 'Timestep'. Dense (float,
+        as ``pd.DataFrame(count).fillna(0).T``) or pandas sparse columns.
+        '''
+        import pandas as pd
+        if sparse:
+            # every column Sparse[float64, 0.0]: from_spmatrix alone gives
+            # NaN as the implicit value on newer pandas
+            dtype  = pd.SparseDtype(np.float64, 0.0)
+            matrix = self.matrix.astype(np.float64).tocsc()
+            df = pd.DataFrame({j: pd.arrays.SparseArray.from_spmatrix(
+                                   matrix[:, j]).astype(dtype)
+                               for j in range(len(self.species))},
+                              index=self.steps)
+            df.columns = list(self.species)
+        else:
+            df = pd.DataFrame(self.matrix.toarray().astype(float),
+                              index=self.steps, columns=self.species)
+        df.index.name = 'Timestep'
+        return df
+
+    def to_dict(self):
+        '''{step: {species: count}} without the zero entries.'''
+        out = {}
+        indptr, indices, data = (self.matrix.indptr, self.matrix.indices,
+                                 self.matrix.data)
+        for i, step in enumerate(self.steps.tolist()):
+            out[step] = {self.species[j]: n for j, n in
+                         zip(indices[indptr[i]:indptr[i+1]].tolist(),
+                             data[indptr[i]:indptr[i+1]].tolist())}
+        return out
+
+    def __repr__(self):
+        return 'SpeciesCounts(nframes={}, nspecies={}, nnz={})'.format(
+            len(self.steps), len(self.species), self.matrix.nnz)
+
+class _SpeciesCountsBuilder:
+    # collects one {species: count} per frame as CSR rows
+    def __init__(self):
+        self.steps   = []
+        self.species = {}
+        self.indptr  = [0]
+        self.indices = []
+        self.data    = []
+
+    def add(self, step, species_count):
+        for species, n in species_count.items():
+            if n == 0:
+                continue
+            j = self.species.get(species)
+            if j is None:
+                j = self.species[species] = len(self.species)
+            self.indices.append(j)
+            self.data.append(n)
+        self.steps.append(step)
+        self.indptr.append(len(self.indices))
+
+    def build(self):
+        matrix = csr_matrix((np.array(self.data, dtype=np.int32),
+                             np.array(self.indices, dtype=np.int64),
+                             np.array(self.indptr, dtype=np.int64)),
+                            shape=(len(self.steps), len(self.species)))
+        return SpeciesCounts(matrix, self.steps, self.species)
+
+#%%
+class SpeciesEnsemble:
+    '''
+    Species counts of several replicas of a simulation, aligned by step.
+
+    Only the steps present in every replica are kept. The statistics are
+    dense (steps x species) arrays; pass ``species`` to keep the arrays
+    small when only a few species are of interest.
+
+    Attributes
+    ----------
+    steps : np.ndarray
+        Common steps.
+    species : list of str
+        Species of the columns.
+    counts : np.ndarray of shape (nreplicas, nsteps, nspecies)
+        Count of every replica.
+    sum, mean, std, min, max : np.ndarray of shape (nsteps, nspecies)
+        Statistics over the replicas.
+    '''
+    def __init__(self, replicas, species=None):
+        steps = replicas[0].steps
+        for counts in replicas[1:]:
+            steps = np.intersect1d(steps, counts.steps)
+        if species is None:
+            species = {}
+            for counts in replicas:
+                species.update(dict.fromkeys(counts.species))
+        self.steps   = np.asarray(steps)
+        self.species = list(species)
+
+        self.counts = np.zeros((len(replicas), len(self.steps), len(self.species)))
+        for r, counts in enumerate(replicas):
+            order = np.argsort(counts.steps, kind='stable')
+            rows  = order[np.searchsorted(counts.steps, self.steps, sorter=order)]
+            cols = [j for j, s in enumerate(self.species) if s in counts]
+            if cols:
+                part = counts.select([self.species[j] for j in cols])
+                self.counts[r][:, cols] = part.matrix[rows].toarray()
+        self.sum  = self.counts.sum(axis=0)
+        self.mean = self.counts.mean(axis=0)
+        self.std  = self.counts.std(axis=0)
+        self.min  = self.counts.min(axis=0)
+        self.max  = self.counts.max(axis=0)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def to_dataframe(self, stat='mean'):
+        '''Steps x species DataFrame of one statistic ('sum', 'mean', ...).'''
+        import pandas as pd
+        df = pd.DataFrame(getattr(self, stat), index=self.steps,
+                          columns=self.species)
+        df.index.name = 'Timestep'
+        return df
+
+    def __repr__(self):
+        return 'SpeciesEnsemble(nreplicas={}, nsteps={}, nspecies={})'.format(
+            len(self.counts), len(self.steps), len(self.species))
+
+#%%
+class SpeciesIndex:
+    '''
+    Inverted index formula -> molecules (atom ids) over a trajectory.
+
+    A molecule (an atom set) usually survives many frames, so it is kept
+    once per run of consecutive frames it exists in: first and last
+    frame, formula, atom ids. The index is built in one species pass and
+    can be saved next to the bond file.
+
+    Attributes
+    ----------
+    steps : np.ndarray
+        Timestep of every frame.
+    species : list of str
+        Every formula seen.
+    start, end : np.ndarray
+        First and last frame of every run.
+    code : np.ndarray
+        Position in ``species`` of the formula of every run.
+    ptr, atoms : np.ndarray
+        Atom ids of run ``i``: ``atoms[ptr[i]:ptr[i+1]]``.
+    '''
+    def __init__(self, steps, species, start, end, code, ptr, atoms):
+        self.steps   = np.asarray(steps, dtype=np.int64)
+        self.species = list(species)
+        self.start   = np.asarray(start, dtype=np.int64)
+        self.end     = np.asarray(end, dtype=np.int64)
+        self.code    = np.asarray(code, dtype=np.int64)
+        self.ptr     = np.asarray(ptr, dtype=np.int64)
+        self.atoms   = np.asarray(atoms)
+        self._column = {s: j for j, s in enumerate(self.species)}
+        # runs grouped by formula
+        self._order  = np.argsort(self.code, kind='stable')
+        self._bounds = np.searchsorted(self.code[self._order],
+                                       np.arange(len(self.species)+1))
+
+    @classmethod
+    def from_frames(cls, frames, atomsymbols, cutoff=None):
+        '''Build the index in one pass over BondFrames.'''
+        steps, species, code_of = [], [], {}
+        start, end, code, atoms = [], [], [], []
+        prev_sigs = np.zeros(0, dtype=np.uint64) # molecules of the previous frame
+        prev_runs = np.zeros(0, dtype=np.int64)  # and their run numbers
+        for f, frame in enumerate(frames):
+            ids, labels = molecule_labels(frame, cutoff, extra=False)
+            formulas, inverse = molecular_formulas(frame.types, labels, atomsymbols)
+            signatures = molecule_signatures(ids, labels)
+            steps.append(frame.step)
+
+            # molecules still present continue their run
+            order = np.argsort(prev_sigs)
+            pos   = np.minimum(np.searchsorted(prev_sigs[order], signatures),
+                               max(len(prev_sigs)-1, 0))
+            found = prev_sigs[order][pos] == signatures if len(prev_sigs) else \
+                np.zeros(len(signatures), dtype=bool)
+            runs  = np.full(len(signatures), -1, dtype=np.int64)
+            runs[found] = prev_runs[order][pos[found]]
+            for r in np.setdiff1d(prev_runs, runs[found]).tolist():
+                end[r] = f-1
+
+            new = np.flatnonzero(~found)
+            if len(new):
+                order  = np.argsort(labels, kind='stable')
+                bounds = np.searchsorted(labels[order], np.arange(len(signatures)+1))
+                for m in new.tolist():
+                    formula = formulas[inverse[m]]
+                    if formula not in code_of:
+                        code_of[formula] = len(species)
+                        species.append(formula)
+                    runs[m] = len(start)
+                    start.append(f)
+                    end.append(-1)
+                    code.append(code_of[formula])
+                    atoms.append(ids[order[bounds[m]:bounds[m+1]]])
+            prev_sigs, prev_runs = signatures, runs
+        nframes = len(steps)
+        end = [nframes-1 if e < 0 else e for e in end]
+        ptr = np.zeros(len(atoms)+1, dtype=np.int64)
+        np.cumsum([len(a) for a in atoms], out=ptr[1:])
+        atoms = np.concatenate(atoms) if atoms else np.zeros(0, dtype=np.int32)
+        return cls(steps, species, start, end, code, ptr, atoms)
+
+    #-------queries-------------------------------------------------------
+    def __contains__(self, formula):
+        return formula in self._column
+
+    def runs(self, formula):
+        '''Run numbers of ``formula`` (empty if never seen).'''
+        j = self._column.get(formula)
+        if j is None:
+            return np.zeros(0, dtype=np.int64)
+        return self._order[self._bounds[j]:self._bounds[j+1]]
+
+    def molecules(self, formula):
+        '''[(first step, last step, atom ids)] of every run of ``formula``.'''
+        return [(int(self.steps[self.start[i]]), int(self.steps[self.end[i]]),
+                 self.atoms[self.ptr[i]:self.ptr[i+1]])
+                for i in self.runs(formula).tolist()]
+
+    def occurrences(self, formula):
+        '''Yield (step, atom ids) for every frame and molecule of ``formula``.'''
+        for i in self.runs(formula).tolist():
+            atoms = self.atoms[self.ptr[i]:self.ptr[i+1]]
+            for f in range(self.start[i], self.end[i]+1):
+                yield int(self.steps[f]), atoms
+
+    def first_appearance(self, formula):
+        '''Step of the first frame with ``formula`` (None if never seen).'''
+        runs = self.runs(formula)
+        if len(runs) == 0:
+            return None
+        return int(self.steps[self.start[runs].min()])
+
+    def atoms_ever(self, formula):
+        '''Sorted ids of every atom that was ever part of ``formula``.'''
+        runs = self.runs(formula)
+        if len(runs) == 0:
+            return np.zeros(0, dtype=self.atoms.dtype)
+        return np.unique(np.concatenate([self.atoms[self.ptr[i]:self.ptr[i+1]]
+                                         for i in runs.tolist()]))
+
+    def count(self, formula):
+        '''Number of molecules of ``formula`` in every frame.'''
+        counts = np.zeros(len(self.steps)+1, dtype=np.int64)
+        runs = self.runs(formula)
+        np.add.at(counts, self.start[runs], 1)
+        np.add.at(counts, self.end[runs]+1, -1)
+        return np.cumsum(counts[:-1])
+
+    #-------persistence---------------------------------------------------
+    def save(self, path, meta=()):
+        '''Write the index as .npz (atomically); ``meta`` is stored as is.'''
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, steps=self.steps, species=np.array(self.species, dtype=str),
+                     start=self.start, end=self.end, code=self.code,
+                     ptr=self.ptr, atoms=self.atoms,
+                     meta=np.array(list(meta), dtype=str))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path, meta=None):
+        '''Read an index; None if missing, unreadable or ``meta`` differs.'''
+        try:
+            with np.load(path) as data:
+                if meta is not None and data['meta'].tolist() != [str(m) for m in meta]:
+                    return None
+                return cls(data['steps'], data['species'].tolist(), data['start'],
+                           data['end'], data['code'], data['ptr'], data['atoms'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __repr__(self):
+        return 'SpeciesIndex(nframes={}, nspecies={}, nruns={})'.format(
+            len(self.steps), len(self.species), len(self.start))
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Make the repository importable as ``magnolia`` when the tests are run
+from a checkout (``python -m pytest tests``) instead of an install.
+"""
+
+import os
+import sys
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if 'magnolia' not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        'magnolia', os.path.join(ROOT, '__init__.py'),
+        submodule_search_locations=[ROOT])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['magnolia'] = module
+    spec.loader.exec_module(module)
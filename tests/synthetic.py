@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Small synthetic LAMMPS bond and dump files for the tests.
+
+The files exercise what real multi-process runs produce and what the
+columnar parsers must not get wrong: atom lines in shuffled order,
+atoms appearing and disappearing between frames, and bond orders that
+sit exactly on a cutoff or tolerance edge (files are written with three
+decimals).
+"""
+
+import random
+
+# atom types: 1 C, 2 H, 3 O
+ATOMSYMBOLS = ['C', 'H', 'O']
+
+def write_bondfile(path, frames, seed=None):
+    '''
+    Write a ReaxFF bond file (fix reaxff/bonds layout).
+
+    frames : list of (step, atoms, bonds)
+        atoms : list of (id, type, molid), written in this order unless
+        ``seed`` is given (then shuffled); bonds : {(a, b): bond order}.
+    '''
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for step, atoms, bonds in frames:
+            atoms = list(atoms)
+            if seed is not None:
+                rng.shuffle(atoms)
+            f.write('# Timestep {}\n#\n# Number of particles {}\n#\n'.format(
+                step, len(atoms)))
+            f.write('# Max number of bonds per atom 4 with coarse bond order cutoff 0.300\n')
+            f.write('# Particle connection table and bond orders\n')
+            f.write('# id type nb id_1...id_nb mol bo_1...bo_nb abo nlp q\n')
+            for atom, atype, mol in atoms:
+                nbrs = [(b if a == atom else a, bo) for (a, b), bo in bonds.items()
+                        if atom in (a, b)]
+                f.write(' {} {} {}{} {}{} {:.3f} {:.3f} {:.3f}\n'.format(
+                    atom, atype, len(nbrs),
+                    ''.join(' {}'.format(n) for n, _ in nbrs), mol,
+                    ''.join(' {:.3f}'.format(bo) for _, bo in nbrs),
+                    sum(bo for _, bo in nbrs), 0.1*(atom % 3), 0.011*atom - 0.1))
+            f.write('# \n')
+
+def read_bondfile(path, cutoff=0.3):
+    '''
+    Reference parse with the semantics of the original line-by-line
+    parser: per step {atom: [children with bo >= cutoff]}, {atom: {child:
+    bo}} and {atom: (type, mol, abo, nlp, q)}, atoms in file order.
+    '''
+    neighbours, bondorders, atoms = {}, {}, {}
+    with open(path) as f:
+        for line in f:
+            splitted = line.split()
+            if line.startswith('# Timestep'):
+                step = int(splitted[-1])
+                neighbours[step], bondorders[step], atoms[step] = {}, {}, {}
+            elif splitted and splitted[0].isnumeric():
+                atom, nb = int(splitted[0]), int(splitted[2])
+                children = [int(c) for c in splitted[3:3+nb]]
+                bos      = [float(b) for b in splitted[4+nb:4+2*nb]]
+                neighbours[step][atom] = [c for c, b in zip(children, bos)
+                                          if b >= cutoff]
+                bondorders[step][atom] = dict(zip(children, bos))
+                atoms[step][atom] = (int(splitted[1]), int(splitted[3+nb]),
+                                     float(splitted[-3]), float(splitted[-2]),
+                                     float(splitted[-1]))
+    return neighbours, bondorders, atoms
+
+def methane_frames():
+    '''
+    Four frames of a CH4 + H2O + H2 system, in which:
+    - step 10: one C-H bond is at 0.300 (the default cutoff) and one
+      O-H at 0.299;
+    - step 20: methane loses an H (CH3 + H), and H2 (atoms 9, 10) is
+      missing from the file (lost atoms);
+    - step 30: all atoms are back, methane is restored and H2 binds to O
+      through a 1.200 bond.
+    '''
+    methane = {(1, 2): 0.950, (1, 3): 0.950, (1, 4): 0.950, (1, 5): 0.921}
+    water   = {(6, 7): 0.880, (6, 8): 0.880}
+    h2      = {(9, 10): 0.980}
+    atoms   = [(1, 1, 1), (2, 2, 1), (3, 2, 1), (4, 2, 1), (5, 2, 1),
+               (6, 3, 2), (7, 2, 2), (8, 2, 2), (9, 2, 3), (10, 2, 3)]
+    frames  = [(0, atoms, methane | water | h2)]
+    frames.append((10, atoms, methane | {(1, 5): 0.300} | water
+                   | {(6, 8): 0.299} | h2))
+    broken = {k: v for k, v in methane.items() if k != (1, 5)}
+    frames.append((20, atoms[:8], broken | water))
+    frames.append((30, atoms, methane | water | h2 | {(6, 9): 1.200}))
+    return frames
+
+def tolerance_frames():
+    '''Bond 1-2 with orders 1.200, 0.800, 1.100, 1.201 (cutoff 1, tol 0.2).'''
+    atoms = [(1, 1, 1), (2, 1, 1)]
+    return [(step, atoms, {(1, 2): bo}) for step, bo in
+            zip((0, 10, 20, 30), (1.200, 0.800, 1.100, 1.201))]
+
+def write_dumpfile(path, frames, columns=('id', 'type', 'x', 'y', 'z'),
+                   box=((0.0, 10.0),)*3, boundary=('pp', 'pp', 'pp'), seed=None):
+    '''
+    Write a LAMMPS dump file.
+
+    frames : list of (step, rows), rows a list of value tuples in the
+    order of ``columns`` (shuffled if ``seed`` is given).
+    '''
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for step, rows in frames:
+            rows = list(rows)
+            if seed is not None:
+                rng.shuffle(rows)
+            f.write('ITEM: TIMESTEP\n{}\nITEM: NUMBER OF ATOMS\n{}\n'.format(
+                step, len(rows)))
+            f.write('ITEM: BOX BOUNDS {}\n'.format(' '.join(boundary)))
+            for bounds in box:
+                f.write(' '.join(str(v) for v in bounds) + '\n')
+            f.write('ITEM: ATOMS {}\n'.format(' '.join(columns)))
+            for row in rows:
+                f.write(' '.join(str(v) for v in row) + '\n')
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+The CSR frame layer (BondFrame, BondData) against the nested dicts of the
+old line-by-line parser, rebuilt here from the frames that were written.
+"""
+
+import pickle
+import numpy as np
+import pytest
+from magnolia import bondfile_parser as bfp
+from magnolia.bondframe import BondFrame, BondData
+from synthetic import (write_bondfile, read_bondfile, methane_frames,
+                       tolerance_frames)
+
+@pytest.fixture(params=[None, 1], ids=['sorted', 'shuffled'])
+def methane_file(tmp_path, request):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=request.param)
+    return path
+
+def assert_same_dicts(got, expected):
+    # same content and the same order of steps and atoms
+    assert list(got) == list(expected)
+    for step in expected:
+        assert list(got[step].items()) == list(expected[step].items())
+
+@pytest.mark.parametrize('cutoff', [0.3, 0.299, 0.35])
+def test_parsebondfile_matches_line_parser(methane_file, cutoff):
+    neighbours, bondorders, atoms = read_bondfile(methane_file, cutoff)
+    bonddata = bfp.parsebondfile(methane_file, cutoff=cutoff, ALL=True)
+    assert_same_dicts(bonddata['neighbours'], neighbours)
+    assert_same_dicts(bonddata['bondorders'], bondorders)
+    for key, column in (('abo', 2), ('nlp', 3), ('charge', 4)):
+        assert_same_dicts(bonddata[key], {step: {a: v[column] for a, v in frame.items()}
+                                          for step, frame in atoms.items()})
+    last = list(atoms.values())[-1]
+    assert bonddata['atypes'] == {a: v[0] for a, v in last.items()}
+    assert bonddata['mtypes'] == {a: v[1] for frame in atoms.values()
+                                  for a, v in frame.items()}
+
+    # the same frames from the chunked parser
+    parallel = bfp.parsebondfile(methane_file, cutoff=cutoff, workers=2)
+    assert_same_dicts(parallel['neighbours'], neighbours)
+
+@pytest.mark.parametrize('cutoff', [1.1, 1.2, 1.201])
+def test_cutoff_on_written_values(tmp_path, cutoff):
+    path = str(tmp_path / 'tolerance.reaxc')
+    write_bondfile(path, tolerance_frames())
+    neighbours, _, _ = read_bondfile(path, cutoff)
+    assert_same_dicts(bfp.parsebondfile(path, cutoff=cutoff)['neighbours'], neighbours)
+
+def test_atypes_of_the_last_frame(tmp_path):
+    path = str(tmp_path / 'lost.reaxc')
+    write_bondfile(path, methane_frames()[:3], seed=1)
+    bonddata = bfp.parsebondfile(path, mtypes=True)
+    # atoms 9 and 10 are missing from the last frame
+    assert bonddata['atypes'] == {1: 1, 2: 2, 3: 2, 4: 2, 5: 2, 6: 3, 7: 2, 8: 2}
+    assert sorted(bonddata['mtypes']) == list(range(1, 11))
+    assert BondData()['atypes'] == {}
+
+def test_block_parsers_agree(methane_file):
+    columns = ('molid', 'abo', 'nlp', 'charge')
+    with open(methane_file) as f:
+        text = f.read()
+    for frame in bfp.iter_bondfile_frames(methane_file, fields=columns):
+        start = text.index('# Timestep {}\n'.format(frame.step))
+        block = text[start:text.index('# \n', start)+3]
+        rows  = [line.split() for line in block.splitlines()
+                 if line.split() and line.split()[0].isnumeric()]
+        lines = ''.join(line+'\n' for line in block.splitlines()
+                        if not line.startswith('#')).encode()
+        for other in (BondFrame.from_block(block, columns=columns),
+                      BondFrame.from_rows(frame.step, rows, columns=columns),
+                      BondFrame.from_bytes(frame.step, lines, columns=columns)):
+            assert other.step == frame.step
+            for name in BondFrame.__slots__[1:]:
+                a, b = getattr(frame, name), getattr(other, name)
+                if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+                    assert a.dtype == b.dtype and np.array_equal(a, b), name
+        assert np.all(np.diff(frame.ids) > 0)
+    # not a bond table: no frame from the one-shot parser
+    assert BondFrame.from_bytes(0, b' 1 1 1 2 1 x 0.9 0.0 0.0\n') is None
+
+def test_frame_queries(tmp_path):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=2)
+    frame = bfp.read_bondfile_frame(path, 10)
+    assert frame.rows([1, 10, 11]).tolist() == [0, 9, -1]
+    bos = frame.pair_bondorders([1, 6, 6, 11, 9], [5, 8, 9, 1, 10])
+    assert bos.dtype == np.float32
+    assert np.round(bos.astype(np.float64), 3).tolist() == [0.3, 0.299, 0, 0, 0.98]
+    parents, children = frame.edges()
+    edges = set(zip(parents.tolist(), children.tolist()))
+    assert (1, 5) in edges and (6, 8) not in edges
+    assert (6, 8) in set(zip(*[a.tolist() for a in frame.edges(cutoff=0.299)]))
+    assert frame.nbonds == 2*7 and frame.natoms == 10
+
+def test_bonddata_layout(methane_file):
+    frames = list(bfp.iter_bondfile_frames(methane_file, fields=['molid']))
+    bonddata = BondData(frames, keys=['neighbours', 'mtypes'])
+    # equal atom columns are stored once
+    assert bonddata.frames[0].ids is bonddata.frames[1].ids
+    assert bonddata.frames[0].molid is bonddata.frames[1].molid
+    assert bonddata.nbytes < sum(frame.nbytes for frame in frames)
+    # a repeated step replaces the earlier frame
+    bonddata.append(bfp.read_bondfile_frame(methane_file, 10))
+    assert bonddata.steps == [0, 10, 20, 30]
+    assert list(bonddata) == ['neighbours', 'mtypes']
+    with pytest.raises(KeyError):
+        bonddata['bondorders']
+
+    view = bonddata['neighbours']
+    assert view is bonddata['neighbours']
+    assert view[10] is view[10] # one frame's dict is built once
+    copy = pickle.loads(pickle.dumps(bonddata))
+    assert copy._views == {}
+    assert dict(copy['neighbours'][20]) == dict(view[20])
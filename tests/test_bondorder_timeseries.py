@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Bond-order time series (get_bondorder_timeseries, bondorder_evolution,
+get_nbondsVStime) against the results of the nested-dict parser.
+"""
+
+import numpy as np
+import pytest
+from magnolia import bondfile_parser as bfp
+from synthetic import write_bondfile, tolerance_frames, methane_frames
+
+@pytest.fixture
+def tolerance_file(tmp_path):
+    path = str(tmp_path / 'tolerance.reaxc')
+    write_bondfile(path, tolerance_frames())
+    return path
+
+@pytest.fixture
+def bondorders(tolerance_file):
+    return bfp.parsebondfile(tolerance_file, bo=True)['bondorders']
+
+def test_nbonds_counts_bond_orders_on_the_tolerance_edge(tolerance_file, bondorders):
+    # 1.200 is within cutoff=1 +- tol=0.2 as written in the file
+    for source in (tolerance_file, bondorders, dict(bondorders.items())):
+        _, nbonds = bfp.get_nbondsVStime(source, None, [(1, 2)])
+        assert nbonds == [1, 1, 1, 0]
+
+def test_bondorder_evolution_gives_written_values(bondorders):
+    df = bfp.bondorder_evolution(bondorders, [(1, 2), (2, 1), (1, 3)],
+                                 ts=0.25, plot='no')
+    assert df.values.dtype == np.float64
+    assert df.values.tolist() == [[1.2, 0.8, 1.1, 1.201],
+                                  [1.2, 0.8, 1.1, 1.201],
+                                  [0.0, 0.0, 0.0, 0.0]]
+
+def test_timeseries_of_lost_and_shuffled_atoms(tmp_path):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=1)
+    steps, matrix = bfp.get_bondorder_timeseries(path, [(1, 5), (9, 10), (6, 9)])
+    assert steps.tolist() == [0, 10, 20, 30]
+    assert matrix.dtype == np.float32
+    assert np.round(matrix.astype(np.float64), 3).tolist() == [
+        [0.921, 0.3, 0.0, 0.921],
+        [0.98, 0.98, 0.0, 0.98],
+        [0.0, 0.0, 0.0, 1.2]]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Frame access without reparsing: memory-mapped blocks (frame_reader), the
+byte-offset index (frame_index) and the binary cache (frame_cache).
+"""
+
+import os
+import numpy as np
+import pytest
+from magnolia import bondfile_parser as bfp
+from magnolia.frame_reader import (iter_blocks, read_step, parse_numbers,
+                                   DUMP_MARKER)
+from magnolia.frame_index import get_frame_index, INDEX_SUFFIX
+from magnolia.frame_cache import save_bonddata, load_bonddata
+from synthetic import write_bondfile, read_bondfile, methane_frames, write_dumpfile
+
+@pytest.fixture
+def methane_file(tmp_path):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=3)
+    return path
+
+def test_blocks_and_numbers(methane_file, tmp_path):
+    blocks = [bytes(block) for block in iter_blocks(methane_file)]
+    assert [read_step(block) for block in blocks] == [0, 10, 20, 30]
+    with open(methane_file, 'rb') as f:
+        assert b''.join(blocks) == f.read()
+
+    dumpfile = str(tmp_path / 'atoms.dump')
+    write_dumpfile(dumpfile, [(5, [(1, 1, 0.0, 0.0, 0.0)]),
+                              (15, [(1, 1, 0.5, 0.0, 0.0)])])
+    assert [read_step(block, DUMP_MARKER)
+            for block in iter_blocks(dumpfile, DUMP_MARKER)] == [5, 15]
+
+    assert parse_numbers(b' 1 2.5\n-3e-1 0.300\n').tolist() == [1, 2.5, -0.3, 0.3]
+    assert parse_numbers(b'1 x 3') is None
+
+def test_frame_index(methane_file):
+    index = get_frame_index(methane_file)
+    assert index.steps.tolist() == [0, 10, 20, 30]
+    assert os.path.exists(methane_file + INDEX_SUFFIX)
+    assert index.select([30, 10]).tolist() == [3, 1]
+    assert index.select(Nevery=2).tolist() == [0, 2]
+    assert index.read(20).startswith(b'# Timestep 20\n')
+    with pytest.raises(KeyError):
+        index.position(25)
+
+    # frames read through the index are the frames of a full pass
+    neighbours, _, _ = read_bondfile(methane_file)
+    for frame in bfp.iter_bondfile_frames(methane_file, steps=[30, 0]):
+        assert frame.neighbours_dict() == neighbours[frame.step]
+    assert [frame.step for frame in
+            bfp.iter_bondfile_frames(methane_file, Nevery=3)] == [0, 30]
+    assert bfp.read_bondfile_frame(methane_file, 20).natoms == 8
+
+def test_frame_index_follows_the_file(methane_file):
+    get_frame_index(methane_file)
+    write_bondfile(methane_file, methane_frames()[1:3])
+    index = get_frame_index(methane_file)
+    assert index.steps.tolist() == [10, 20]
+    assert index.is_valid()
+
+def test_binary_cache(methane_file, tmp_path):
+    cachedir = str(tmp_path / 'methane.bondcache')
+    bonddata = bfp.parsebondfile(methane_file, mtypes=True)
+    save_bonddata(bonddata, cachedir, methane_file, 0.3, ['molid'])
+
+    cached = load_bonddata(cachedir, methane_file, fields=['molid'])
+    assert cached.steps == bonddata.steps
+    for a, b in zip(cached.frames, bonddata.frames):
+        for name in ('ids', 'types', 'offsets', 'neighbours', 'bondorders',
+                     'molid', 'order'):
+            assert np.array_equal(getattr(a, name), getattr(b, name)), name
+    assert list(cached['neighbours'][10].items()) == \
+           list(bonddata['neighbours'][10].items())
+    # shared arrays stay shared
+    assert cached.frames[0].ids is cached.frames[1].ids
+
+    # every written bond is stored: another cutoff is served from the cache
+    neighbours, _, _ = read_bondfile(methane_file, 0.299)
+    assert dict(load_bonddata(cachedir, cutoff=0.299)['neighbours'][10]) == neighbours[10]
+
+    assert load_bonddata(cachedir, methane_file, fields=['charge']) is None
+    write_bondfile(methane_file, methane_frames()[:2])
+    assert load_bonddata(cachedir, methane_file) is None
+    assert load_bonddata(str(tmp_path / 'missing')) is None
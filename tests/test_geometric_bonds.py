@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Distance-based bonds across the periodic boundaries of a triclinic box.
+
+Two C atoms sit 0.4 A apart through the x boundary of a box with tilt
+xy = 2: fractional x 0.02 and 0.98, i.e. cartesian x 1.2 and 10.8.
+"""
+
+import numpy as np
+import pytest
+from magnolia.dumpframe import DumpFrame
+from magnolia.geometric_bonds import find_bonds, covalent_radii
+from magnolia.dumpfile_parser import (parsedumpfile, creat_graph_network,
+                                      frame_bonds, map_dumpfile)
+
+TRICLINIC = """ITEM: TIMESTEP
+0
+ITEM: NUMBER OF ATOMS
+2
+ITEM: BOX BOUNDS xy xz yz {} {} {}
+0.0 12.0 2.0
+0.0 10.0 0.0
+0.0 10.0 0.0
+ITEM: ATOMS id type x y z
+1 1 1.2 5.0 5.0
+2 1 10.8 5.0 5.0
+"""
+
+def dump_text(boundary=('pp', 'pp', 'pp')):
+    return TRICLINIC.format(*boundary)
+
+def test_boundary_flags_exclude_tilt_words():
+    frame = DumpFrame.from_block(dump_text(('pp', 'pp', 'ff')))
+    assert frame.boundary == ('pp', 'pp', 'ff')
+    assert frame.triclinic
+
+def test_scaled_positions_use_lattice_vectors():
+    text  = dump_text().replace('id type x y z', 'id type xs ys zs') \
+                       .replace('1 1 1.2 5.0 5.0', '1 1 0.1 0.9 0.5')
+    frame = DumpFrame.from_block(text)
+    assert frame.positions()[0] == pytest.approx([2.8, 9.0, 5.0])
+
+def test_find_bonds_through_triclinic_boundary():
+    frame = DumpFrame.from_block(dump_text())
+    i, j, distance = find_bonds(frame.positions(), covalent_radii(['C', 'C']),
+                                frame.box, frame.boundary)
+    assert (i.tolist(), j.tolist()) == ([0], [1])
+    assert distance[0] == pytest.approx(0.4)
+
+def test_no_bond_through_open_boundary():
+    frame = DumpFrame.from_block(dump_text(('ff', 'pp', 'pp')))
+    ids1, ids2 = frame_bonds(frame, atomsymbols=['C'])
+    assert len(ids1) == 0
+
+def test_bond_through_boundary_in_every_pipeline(tmp_path):
+    path = tmp_path / 'triclinic.dump'
+    path.write_text(dump_text())
+
+    frame = DumpFrame.from_block(dump_text())
+    ids1, ids2 = frame_bonds(frame, atomsymbols=['C'])
+    assert (ids1.tolist(), ids2.tolist()) == ([1], [2])
+
+    bonds = map_dumpfile(str(path), 'bonds', workers=1, atomsymbols=['C'])
+    assert [b.tolist() for b in bonds[0]] == [[1], [2]]
+
+    network = creat_graph_network(str(path), atomsymbols=['C'])
+    assert network[0].has_edge(1, 2)
+
+    # DataFrames keep the box of the frame in attrs
+    dumpdata = {step: snapshot.assign(symbol='C')
+                for step, snapshot in parsedumpfile(str(path)).items()}
+    assert np.array_equal(dumpdata[0].attrs['box'], frame.box)
+    network = creat_graph_network(dumpdata)
+    assert network[0].has_edge(1, 2)
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+The ``pkl`` cache of parsebondfile: binary cache directories and the
+pickle files written by older versions.
+"""
+
+import os
+import pickle
+import pytest
+from magnolia import bondfile_parser as bfp
+from synthetic import write_bondfile, methane_frames
+
+@pytest.fixture
+def methane_file(tmp_path):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=1)
+    return path
+
+def neighbours(bonddata):
+    return {step: dict(neigh) for step, neigh in bonddata['neighbours'].items()}
+
+def test_binary_cache_is_reused(methane_file):
+    parsed = bfp.parsebondfile(methane_file, pkl='yes')
+    cache  = methane_file[:methane_file.rfind('.')] + '.bondcache'
+    assert os.path.isdir(cache)
+    cached = bfp.parsebondfile(methane_file, pkl='yes')
+    assert neighbours(cached) == neighbours(parsed)
+    assert list(cached['neighbours'][10]) == list(parsed['neighbours'][10])
+
+def test_fresh_pickle_is_loaded(methane_file, tmp_path):
+    path = str(tmp_path / 'old.pickle')
+    with open(path, 'wb') as f:
+        pickle.dump({'neighbours': 'from the pickle'}, f)
+    assert bfp.parsebondfile(methane_file, pkl=path) == {'neighbours': 'from the pickle'}
+
+def test_stale_pickle_is_kept(methane_file, tmp_path):
+    path = str(tmp_path / 'old.pickle')
+    with open(path, 'wb') as f:
+        pickle.dump({'neighbours': 'from the pickle'}, f)
+    mtime = os.path.getmtime(methane_file) - 10
+    os.utime(path, (mtime, mtime))
+
+    with pytest.warns(UserWarning, match='older than the bond file'):
+        result = bfp.parsebondfile(methane_file, pkl=path)
+    assert neighbours(result) == neighbours(bfp.parsebondfile(methane_file))
+    assert os.path.isdir(path)
+    with open(path + '.stale', 'rb') as f:
+        assert pickle.load(f) == {'neighbours': 'from the pickle'}
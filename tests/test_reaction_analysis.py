@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Molecule lineage and reactions over methane_frames():
+
+    step 10: H2O -> H + HO    (O-H at 0.299, below the cutoff)
+    step 20: CH4 -> CH3 + H   (C-H removed), H + HO -> H2O (restored);
+             H2 is missing from the file
+    step 30: CH3 + H -> CH4, and H2 is back, bound to the water (H4O)
+"""
+
+import pytest
+from magnolia import bondfile_parser as bfp
+from magnolia.reaction_analysis import (frame_molecules, MoleculeLineage,
+                                        ReactionExtractor)
+from synthetic import ATOMSYMBOLS, write_bondfile, read_bondfile, methane_frames
+
+REACTIONS = [(1, 10, ('H2O',), ('H', 'HO'), [6, 7, 8]),
+             (2, 20, ('CH4',), ('CH3', 'H'), [1, 2, 3, 4, 5]),
+             (2, 20, ('H', 'HO'), ('H2O',), [6, 7, 8]),
+             (3, 30, ('CH3', 'H'), ('CH4',), [1, 2, 3, 4, 5]),
+             (3, 30, ('H2O',), ('H4O',), [6, 7, 8])]
+
+@pytest.fixture(params=[None, 1], ids=['sorted', 'shuffled'])
+def methane_file(tmp_path, request):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=request.param)
+    return path
+
+def as_tuples(reactions):
+    return [(r.frame, r.step, r.reactants, r.products, sorted(r.atoms.tolist()))
+            for r in reactions]
+
+def test_frame_molecules(methane_file):
+    frame = bfp.read_bondfile_frame(methane_file, 10)
+    ids, labels, formulas = frame_molecules(frame, ATOMSYMBOLS)
+    assert ids.tolist() == list(range(1, 11))
+    molecules = {}
+    for atom, label in zip(ids.tolist(), labels.tolist()):
+        molecules.setdefault(label, []).append(atom)
+    assert sorted((atoms, formulas[label]) for label, atoms in molecules.items()) == [
+        ([1, 2, 3, 4, 5], 'CH4'), ([6, 7], 'HO'), ([8], 'H'), ([9, 10], 'H2')]
+
+def test_reactions(methane_file):
+    extractor = bfp.extract_reactions(methane_file, ATOMSYMBOLS, persistence=0)
+    assert as_tuples(extractor.reactions) == REACTIONS
+    assert extractor.nflickers == 0
+    table = extractor.table()
+    assert table['reactants'].tolist()[2] == 'H + HO'
+    assert table['natoms'].tolist() == [3, 5, 3, 5, 3]
+    network = extractor.network()
+    assert network['H2O']['HO']['weight'] == 1
+    assert network['CH3']['CH4']['reactions'] == {'CH3 + H -> CH4': 1}
+
+def test_flickers_are_dropped(methane_file):
+    # both reactions of step 10 and 20 are undone one frame later
+    extractor = bfp.extract_reactions(methane_file, ATOMSYMBOLS)
+    assert as_tuples(extractor.reactions) == [REACTIONS[-1]]
+    assert extractor.nflickers == 2
+
+def test_neighbours_dicts_give_the_same_reactions(methane_file):
+    neighbours, _, atoms = read_bondfile(methane_file)
+    atomtypes = {a: v[0] for frame in atoms.values() for a, v in frame.items()}
+    extractor = ReactionExtractor(ATOMSYMBOLS, atomtypes=atomtypes, persistence=0)
+    for step, neigh in neighbours.items():
+        extractor.update(neigh, step)
+    assert as_tuples(extractor.close().reactions) == REACTIONS
+
+def test_lineage(methane_file):
+    lineage = bfp.track_molecule_lineage(methane_file, ATOMSYMBOLS)
+    table = lineage.lifetimes()
+    rows = {(row.formula, row.birth_step): (row.death_step, row.alive, row.last_formula)
+            for row in table.itertuples()}
+    assert rows == {('H2O', 0): (30, True, 'H4O'),
+                    ('CH4', 0): (30, True, 'CH4'),
+                    ('H2', 0): (10, False, 'H2'),
+                    ('H', 10): (10, False, 'H'),
+                    ('H', 20): (20, False, 'H')}
+    water = table.index[table['formula'] == 'H2O'][0]
+    events = lineage.events()
+    assert events[events['ID'] == water]['event'].tolist() == [
+        'formation', 'fragmentation', 'merge']
+
+    # same IDs from the dicts of the old layout
+    neighbours, _, atoms = read_bondfile(methane_file)
+    atomtypes = {a: v[0] for frame in atoms.values() for a, v in frame.items()}
+    other = MoleculeLineage(ATOMSYMBOLS, atomtypes=atomtypes)
+    for step, neigh in neighbours.items():
+        other.update(neigh, step)
+    assert other.lifetimes().equals(table)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Cache keys and cache files of result_cache and the *_or_execute helpers.
+"""
+
+import os
+import numpy as np
+import pytest
+from magnolia import bondfile_parser as bfp
+from magnolia.result_cache import cache_key, cached, ResultCache
+from synthetic import write_bondfile, methane_frames
+
+def count_atoms(bonddata, cutoff=0.3):
+    return {step: len(neigh) for step, neigh in bonddata['neighbours'].items()}
+
+@pytest.fixture
+def methane_file(tmp_path):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames())
+    return path
+
+def test_keys_follow_the_arguments(methane_file):
+    key = cache_key(count_atoms, (methane_file,), {'cutoff': 0.3})
+    assert key == cache_key(count_atoms, (methane_file,), {'cutoff': 0.3})
+    assert key != cache_key(count_atoms, (methane_file,), {'cutoff': 0.35})
+    # sets hash the same whatever their iteration order
+    assert cache_key(len, ({'a': {'CH4', 'H2O', 'H2'}},)) == \
+           cache_key(len, ({'a': {'H2', 'H2O', 'CH4'}},))
+    assert cache_key(len, (np.arange(3),)) != cache_key(len, (np.arange(3.0),))
+
+    # a rewritten file is a new input
+    write_bondfile(methane_file, methane_frames()[:2])
+    assert key != cache_key(count_atoms, (methane_file,), {'cutoff': 0.3})
+
+def test_bond_data_keys(methane_file):
+    first, second = (bfp.parsebondfile(methane_file) for _ in range(2))
+    assert cache_key(count_atoms, (first,)) == cache_key(count_atoms, (second,))
+    assert cache_key(count_atoms, (first['neighbours'],)) == \
+           cache_key(count_atoms, (second['neighbours'],))
+    other = bfp.parsebondfile(methane_file, cutoff=0.35)
+    assert cache_key(count_atoms, (first,)) != cache_key(count_atoms, (other,))
+    # unpicklable values are hashed item by item
+    assert cache_key(len, ({'f': count_atoms},)) != cache_key(len, ({'f': len},))
+
+@pytest.mark.parametrize('backend', ['pickle', 'json'])
+def test_cached_recomputes_corrupt_entries(tmp_path, backend):
+    calls = []
+    @cached(cachedir=str(tmp_path / 'cache'), backend=backend)
+    def square(x):
+        calls.append(x)
+        return {'square': x*x}
+
+    assert square(3) == square(3) == {'square': 9}
+    assert calls == [3]
+    path = square.cache.path(square.key(3), 'square')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert square(3) == {'square': 9}
+    assert calls == [3, 3]
+
+@pytest.mark.parametrize('helper, ext', [(bfp.loadpickle_or_execute, '.pickle'),
+                                         (bfp.loadjson_or_execute, '.json')])
+def test_load_or_execute(methane_file, tmp_path, helper, ext):
+    path = str(tmp_path / ('atoms' + ext))
+    expected = {'0': 10, '10': 10, '20': 8, '30': 10}
+    def atoms(bondfilepath):
+        return {str(k): v for k, v in
+                count_atoms(bfp.parsebondfile(bondfilepath)).items()}
+
+    assert helper(path, atoms, methane_file) == expected
+    assert os.path.exists(path + '.key')
+    # truncated file
+    with open(path, 'r+b') as f:
+        f.truncate(3)
+    assert helper(path, atoms, methane_file) == expected
+    # written by an older version: no key file
+    os.remove(path + '.key')
+    assert helper(path, atoms, methane_file) == expected
+    assert ResultCache(str(tmp_path), 'json' if ext == '.json' else 'pickle') \
+        .load(path) == expected
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+SMILES species (smiles_cache): isomers told apart, graph keys, the LRU
+cache and its file.
+"""
+
+import json
+import networkx as nx
+import pytest
+from magnolia import bondfile_parser as bfp
+from magnolia.smiles_cache import (SmilesCache, frame_smiles, graph_hash,
+                                   graph_key, smiles_species_counts)
+from synthetic import ATOMSYMBOLS, write_bondfile, methane_frames
+
+def isomer_frames():
+    '''Ethanol (atoms 1-9) and dimethyl ether (atoms 10-18), two frames.'''
+    ethanol = {(1, 2): 0.95, (2, 3): 0.95, (1, 4): 0.95, (1, 5): 0.95,
+               (1, 6): 0.95, (2, 7): 0.95, (2, 8): 0.95, (3, 9): 0.95}
+    ether   = {(10, 11): 0.95, (11, 12): 0.95, (10, 13): 0.95, (10, 14): 0.95,
+               (10, 15): 0.95, (12, 16): 0.95, (12, 17): 0.95, (12, 18): 0.95}
+    types = {1: 1, 2: 1, 3: 3, 10: 1, 11: 3, 12: 1}
+    atoms = [(a, types.get(a, 2), 1 if a < 10 else 2) for a in range(1, 19)]
+    return [(0, atoms, ethanol | ether), (10, atoms, ethanol | ether)]
+
+@pytest.fixture
+def isomer_file(tmp_path):
+    path = str(tmp_path / 'isomers.reaxc')
+    write_bondfile(path, isomer_frames(), seed=4)
+    return path
+
+def test_isomers_are_separate_species(isomer_file):
+    formulas = bfp.get_species_count(isomer_file, ATOMSYMBOLS)
+    assert formulas.to_dict('list') == {'C2H6O': [2.0, 2.0]}
+    smiles = bfp.get_species_count(isomer_file, ATOMSYMBOLS, identify='smiles',
+                                   workers=1)
+    assert smiles.to_dict('list') == {'CCO': [1.0, 1.0], 'COC': [1.0, 1.0]}
+
+def test_frame_smiles_uses_the_cache(isomer_file):
+    cache = SmilesCache()
+    frame = bfp.read_bondfile_frame(isomer_file, 0)
+    labels, smiles = frame_smiles(frame, ATOMSYMBOLS, cache=cache)
+    assert smiles[labels[0]] == 'CCO' and smiles[labels[9]] == 'COC'
+    assert (cache.hits, cache.misses, len(cache)) == (0, 2, 2)
+    assert frame_smiles(frame, ATOMSYMBOLS, cache=cache)[1] == smiles
+    assert cache.hits == 2
+
+def test_species_counts_match_formula_counts(tmp_path):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=1)
+    counts = smiles_species_counts(bfp.iter_bondfile_frames(path), ATOMSYMBOLS,
+                                   workers=1, cache=SmilesCache())
+    assert counts.to_dict() == {
+        0:  {'O': 1, 'C': 1, '[H][H]': 1},
+        10: {'[OH]': 1, 'C': 1, '[H][H]': 1, '[H]': 1},
+        20: {'O': 1, '[CH3]': 1, '[H]': 1},
+        30: {'C': 1, '[H][H][OH2]': 1}}
+
+def test_graph_keys_separate_wl_collisions():
+    # decalin and bicyclopentyl carbon skeletons: same WL hash (1-WL cannot
+    # tell them apart), different rings, so different keys
+    decalin = nx.cycle_graph(6)
+    nx.add_cycle(decalin, [0, 6, 7, 8, 9, 1])
+    bicyclopentyl = nx.cycle_graph(5)
+    nx.add_cycle(bicyclopentyl, [5, 6, 7, 8, 9])
+    bicyclopentyl.add_edge(0, 5)
+    carbons = {node: 1 for node in range(10)}
+    assert graph_hash(decalin, carbons) == graph_hash(bicyclopentyl, carbons)
+    assert graph_key(decalin, carbons) != graph_key(bicyclopentyl, carbons)
+
+    # relabelled atoms give the same key
+    relabelled = nx.relabel_nodes(decalin, {n: 100-n for n in decalin})
+    assert graph_key(relabelled, {100-n: 1 for n in range(10)}) == \
+           graph_key(decalin, carbons)
+    assert graph_key(decalin, carbons, context='|C') != graph_key(decalin, carbons)
+
+def test_cache_file_and_size(tmp_path):
+    path = str(tmp_path / 'smiles.json')
+    cache = SmilesCache(maxsize=2, path=path)
+    for key, smiles in (('a', 'C'), ('b', 'O'), ('c', 'CCO')):
+        cache.put(key, smiles)
+    assert 'a' not in cache and len(cache) == 2
+    assert cache.lookup('b', lambda: 'never called') == 'O'
+    cache.save()
+    with open(path) as f:
+        assert json.load(f) == {'c': 'CCO', 'b': 'O'}
+    assert SmilesCache(path=path).get('c') == 'CCO'
+
+    with open(path, 'w') as f:
+        f.write('{"c": "CC')
+    assert len(SmilesCache(path=path)) == 0
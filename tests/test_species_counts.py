@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Species counts (count_species, IncrementalSpeciesTracker, SpeciesCounts,
+get_species_count) against the counts of the networkx-based counter.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from magnolia import bondfile_parser as bfp
+from magnolia.species_analysis import SpeciesCounts, count_species
+from synthetic import ATOMSYMBOLS, write_bondfile, methane_frames
+
+# species of methane_frames() by step (cutoff 0.3)
+EXPECTED = {0:  {'CH4': 1, 'H2O': 1, 'H2': 1},
+            10: {'CH4': 1, 'H2': 1, 'HO': 1, 'H': 1},
+            20: {'H2O': 1, 'CH3': 1, 'H': 1},
+            30: {'CH4': 1, 'H4O': 1}}
+
+# columns of the networkx-based get_species_count: species in the order
+# they are first met, walking the molecules in the order of the file
+COLUMNS = {None: ['CH4', 'H2O', 'H2', 'HO', 'H', 'CH3', 'H4O'],
+           1:    ['H2O', 'H2', 'CH4', 'HO', 'H', 'CH3', 'H4O'],
+           2:    ['H2O', 'H2', 'CH4', 'H', 'HO', 'CH3', 'H4O']}
+
+@pytest.fixture
+def methane_file(tmp_path):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames())
+    return path
+
+def test_sparse_dataframe_has_one_dtype(methane_file):
+    counts = SpeciesCounts.from_frames(bfp.iter_bondfile_frames(methane_file),
+                                       ATOMSYMBOLS)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        df = counts.to_dataframe(sparse=True)
+    assert set(df.dtypes) == {pd.SparseDtype(np.float64, 0.0)}
+    assert df.sparse.to_dense().equals(counts.to_dataframe())
+
+@pytest.mark.parametrize('seed', list(COLUMNS))
+def test_species_count_keeps_first_seen_order(tmp_path, seed):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=seed)
+    for sparse in (False, True):
+        df = bfp.get_species_count(path, ATOMSYMBOLS, sparse=sparse)
+        assert list(df.columns) == COLUMNS[seed]
+        assert df.index.tolist() == [0, 10, 20, 30]
+        for step, species in EXPECTED.items():
+            row = df.loc[step]
+            assert {k: v for k, v in row.items() if v} == species
+
+@pytest.mark.parametrize('seed', [None, 1])
+def test_counters_agree(tmp_path, seed):
+    path = str(tmp_path / 'methane.reaxc')
+    write_bondfile(path, methane_frames(), seed=seed)
+    counts = SpeciesCounts.from_frames(bfp.iter_bondfile_frames(path), ATOMSYMBOLS)
+    assert counts.to_dict() == EXPECTED
+    assert counts.species == COLUMNS[seed]
+    incremental = SpeciesCounts.from_frames(bfp.iter_bondfile_frames(path),
+                                            ATOMSYMBOLS, incremental=True)
+    assert incremental.to_dict() == EXPECTED
+
+    # the nested-dict layout walks the atoms in the order of the file too
+    bonddata = bfp.parsebondfile(path)
+    count = {step: count_species(neigh, ATOMSYMBOLS, bonddata['atypes'])
+             for step, neigh in bonddata['neighbours'].items()}
+    assert SpeciesCounts.from_dict(count).to_dict() == EXPECTED
+    assert SpeciesCounts.from_dict(count).species == COLUMNS[seed]
+
+def test_window_select_and_total(methane_file):
+    counts = SpeciesCounts.from_frames(bfp.iter_bondfile_frames(methane_file),
+                                       ATOMSYMBOLS)
+    assert counts['CH4'].tolist() == [1, 1, 0, 1]
+    assert 'H4O' in counts and 'C2H6' not in counts
+    assert counts.window(10, 20).to_dict() == {10: EXPECTED[10], 20: EXPECTED[20]}
+    assert counts.select(['H', 'CH3']).to_dict() == {
+        0: {}, 10: {'H': 1}, 20: {'H': 1, 'CH3': 1}, 30: {}}
+    assert counts.total() == {'CH4': 3, 'H2O': 2, 'H2': 2, 'HO': 1, 'H': 2,
+                              'CH3': 1, 'H4O': 1}
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Dense trajectories (trajectory.Trajectory) and the FFT mean-squared
+displacement against the per-step DataFrames of parsedumpfile and the
+direct O(N^2) sum over time origins.
+"""
+
+import math
+import numpy as np
+import pytest
+from magnolia.trajectory import Trajectory, msd_fft, unwrap
+from magnolia.dumpfile_parser import parsedumpfile, compute_msd, distance_tracker
+from synthetic import write_dumpfile
+
+NFRAMES = 6
+
+def true_positions():
+    # (frames x atoms x 3); atom 2 drifts through the x boundary at 10
+    t = np.arange(NFRAMES, dtype=np.float64)[:, None]
+    one   = np.hstack([0.1*t, 0*t, 9.9 + 0*t])
+    two   = np.hstack([9.5 + 0.2*t, 5 + 0.05*t**2, 5 + 0*t])
+    three = np.hstack([5 + 0*t, 5 - 0.3*t, 1 + 0.1*t])
+    return np.stack([one, two, three], axis=1)
+
+def write(path, columns, positions, seed=5):
+    frames = []
+    for i, frame in enumerate(positions):
+        rows = [(atom, 1 + atom % 2) + tuple(np.round(xyz, 6).tolist())
+                for atom, xyz in zip((1, 2, 3), frame)]
+        frames.append((100*i, rows))
+    write_dumpfile(path, frames, columns=('id', 'type') + columns, seed=seed)
+    return path
+
+@pytest.fixture
+def unwrapped_file(tmp_path):
+    return write(str(tmp_path / 'unwrapped.dump'), ('xu', 'yu', 'zu'),
+                 true_positions())
+
+@pytest.fixture
+def wrapped_file(tmp_path):
+    return write(str(tmp_path / 'wrapped.dump'), ('x', 'y', 'z'),
+                 true_positions() % 10.0)
+
+def direct_msd(positions):
+    # every frame as time origin, averaged over atoms
+    nframes = len(positions)
+    msd = np.zeros(nframes)
+    for lag in range(1, nframes):
+        diff = positions[lag:] - positions[:-lag]
+        msd[lag] = np.mean(np.sum(diff**2, axis=-1))
+    return msd
+
+def test_positions_match_parsedumpfile(wrapped_file):
+    trajectory = Trajectory.from_dumpfile(wrapped_file)
+    dumpdata = parsedumpfile(wrapped_file)
+    assert trajectory.steps.tolist() == list(dumpdata)
+    assert trajectory.ids.tolist() == [1, 2, 3]
+    assert trajectory.types.tolist() == [2, 1, 2]
+    assert trajectory.wrapped
+    for i, snapshot in enumerate(dumpdata.values()):
+        expected = snapshot.sort_values('id')[['x', 'y', 'z']].values
+        assert np.allclose(trajectory.positions[i], expected, atol=1e-6)
+    assert trajectory.box.shape == (NFRAMES, 3, 2)
+
+    distances = distance_tracker(trajectory, 1, 3)
+    for step, snapshot in dumpdata.items():
+        xyz = snapshot.set_index('id').loc[[1, 3], ['x', 'y', 'z']].values
+        assert distances[step] == pytest.approx(math.dist(*xyz), abs=1e-5)
+
+def test_msd_of_unwrapped_and_wrapped_positions(unwrapped_file, wrapped_file):
+    expected = direct_msd(true_positions())
+    for path in (unwrapped_file, wrapped_file):
+        lags, msd = Trajectory.from_dumpfile(path).msd()
+        assert lags.tolist() == [100*i for i in range(NFRAMES)]
+        assert msd == pytest.approx(expected, abs=1e-4)
+
+    # wrapped arrays with their box, and one atom as (N, 3)
+    box = np.tile([[0.0, 10.0]]*3, (NFRAMES, 1, 1))
+    assert np.allclose(unwrap(true_positions() % 10.0, box), true_positions())
+    assert compute_msd(true_positions() % 10.0, box=box) == pytest.approx(expected)
+    one = true_positions()[:, 2]
+    assert compute_msd(one) == pytest.approx(direct_msd(one[:, None]))
+
+def test_msd_groups_and_blocks(unwrapped_file):
+    trajectory = Trajectory.from_dumpfile(unwrapped_file)
+    _, by_type = trajectory.msd(by_type=True, max_lag=3)
+    positions = true_positions()
+    assert by_type[2] == pytest.approx(direct_msd(positions[:, [0, 2]])[:4], abs=1e-4)
+    assert by_type[1] == pytest.approx(direct_msd(positions[:, [1]])[:4], abs=1e-4)
+    assert msd_fft(positions, block=1) == pytest.approx(direct_msd(positions))
+
+def test_save_load_and_memmap(unwrapped_file, tmp_path):
+    trajectory = Trajectory.from_dumpfile(unwrapped_file)
+    mapped = Trajectory.from_dumpfile(unwrapped_file, memmap=str(tmp_path / 'traj'))
+    assert isinstance(mapped.positions, np.memmap)
+    assert np.array_equal(mapped.positions, trajectory.positions)
+    loaded = Trajectory.load(trajectory.save(str(tmp_path / 'saved')), mmap=False)
+    assert np.array_equal(loaded.positions, trajectory.positions)
+    assert loaded.steps.tolist() == trajectory.steps.tolist()
+
+    every = Trajectory.from_dumpfile(unwrapped_file, Nfreq=2)
+    assert every.steps.tolist() == [0, 200, 400]
+    assert np.array_equal(every.positions, trajectory.stride(step=2).positions)
+    assert trajectory.select(types=[1]).ids.tolist() == [2]
+    assert trajectory.timeseries(3)[:, 1] == pytest.approx(true_positions()[:, 2, 1])
+    with pytest.raises(KeyError):
+        trajectory.columns([4])
+
+def test_frames_must_hold_the_same_atoms(tmp_path):
+    path = str(tmp_path / 'lost.dump')
+    write_dumpfile(path, [(0, [(1, 1, 0.0, 0.0, 0.0), (2, 1, 1.0, 0.0, 0.0)]),
+                          (1, [(1, 1, 0.0, 0.0, 0.0)])])
+    with pytest.raises(ValueError):
+        Trajectory.from_dumpfile(path)
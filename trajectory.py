@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Dense atom trajectories from LAMMPS dump files.
+
+Positions are stored as one contiguous float32 array of shape
+(n_frames x n_atoms x 3) with the atoms sorted by id, so the position
+time series of an atom is ``positions[:, i]`` and analyses over atoms or
+frames are array slices instead of loops over per-step tables. A
+trajectory can be written to a directory of ``.npy`` files and opened
+memory-mapped, so files larger than memory can be analysed::
+
+    <dir>/positions.npy   float32 (n_frames x n_atoms x 3)
+    <dir>/steps.npy       timestep of every frame
+    <dir>/ids.npy         atom ids (sorted)
+    <dir>/types.npy       atom types
+    <dir>/box.npy         box bounds of every frame
+    <dir>/wrapped.npy     True if the positions are wrapped into the box
+
+Mean-squared displacements are computed with the FFT algorithm
+(autocorrelation of the positions), O(N log N) in the number of frames
+instead of O(N^2), for blocks of atoms at once.
+"""
+
+import os
+import shutil
+import numpy as np
+from scipy import fft
+from magnolia.frame_reader import MappedFile, DUMP_MARKER
+from magnolia.dumpframe import DumpFrame
+
+## List of classes/functions ##
+# 1. Trajectory
+# 2. unwrap
+# 3. msd_fft
+
+POSITION_DTYPE = np.float32
+ARRAYS = ('positions', 'steps', 'ids', 'types', 'box', 'wrapped')
+MSD_BLOCK_BYTES = 1 << 27 # working memory of one block of atoms in msd_fft
+
+#%%
+class Trajectory:
+    '''
+    Positions of a fixed set of atoms over a sequence of frames.
+
+    Attributes
+    ----------
+    positions : np.ndarray or np.memmap
+        float32 (n_frames x n_atoms x 3).
+    steps : np.ndarray
+        Timestep of every frame.
+    ids : np.ndarray
+        Atom id of every column, ascending.
+    types : np.ndarray
+        Atom type of every column.
+    box : np.ndarray
+        Box bounds of every frame (n_frames x 3 x 2, or x 3 if triclinic).
+    wrapped : bool
+        True if the positions are wrapped into the periodic box (dumped
+        as x y z without image flags); ``msd`` then unwraps them.
+    '''
+    def __init__(self, positions, steps, ids, types, box, wrapped=False):
+        self.positions = positions
+        self.steps     = np.asarray(steps, dtype=np.int64)
+        self.ids       = np.asarray(ids, dtype=np.int64)
+        self.types     = np.asarray(types)
+        self.box       = np.asarray(box, dtype=np.float64)
+        self.wrapped   = bool(wrapped)
+
+    @classmethod
+    def from_frames(cls, frames, out=None):
+        '''
+        Stack DumpFrames (e.g. dumpframe.iter_dump_frames(...)).
+
+        Every frame must hold the same atoms. ``out`` is an array of
+        shape (nframes x natoms x 3) to fill (e.g. a memmap); by default
+        the frames are collected in memory.
+        '''
+        steps, boxes, blocks = [], [], []
+        ids = types = None
+        wrapped = False
+        for i, frame in enumerate(frames):
+            order = np.argsort(frame['id'], kind='stable')
+            if ids is None:
+                ids   = frame['id'][order]
+                types = frame['type'][order] if 'type' in frame.columns else \
+                        np.zeros(len(ids), dtype=np.int64)
+            elif len(order) != len(ids) or not np.array_equal(frame['id'][order], ids):
+                raise ValueError('frame at step {} does not have the atoms of '
+                                 'the first frame'.format(frame.step))
+            positions = frame.positions(POSITION_DTYPE)[order]
+            wrapped   = wrapped or not frame.unwrapped
+            if out is not None:
+                out[i] = positions
+            else:
+                blocks.append(positions)
+            steps.append(frame.step)
+            boxes.append(frame.box)
+        if ids is None:
+            ids, types = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if out is not None:
+            positions = out[:len(steps)]
+        elif blocks:
+            positions = np.stack(blocks)
+        else:
+            positions = np.zeros((0, len(ids), 3), dtype=POSITION_DTYPE)
+        box = np.array(boxes) if boxes else np.zeros((0, 3, 2))
+        return cls(positions, steps, ids, types, box, wrapped)
+
+    @classmethod
+    def from_dumpfile(cls, dumpfile, Nfreq=1, memmap=None):
+        '''
+        Read every Nfreq-th frame of a dump file.
+
+        Parameters
+        ----------
+        dumpfile : str
+            Path to the LAMMPS dump file.
+        Nfreq : int, optional
+            Only every Nfreq-th frame, starting with the first. Default is 1.
+        memmap : str, optional
+            Directory to write the trajectory to while reading (see
+            ``save``); positions are then never all in memory and the
+            returned trajectory is memory-mapped. Default is None.
+
+        Returns
+        -------
+        Trajectory
+        '''
+        with MappedFile(dumpfile) as mf:
+            offsets, lengths = mf.frame_ranges(DUMP_MARKER)
+            offsets, lengths = offsets[::Nfreq].tolist(), lengths[::Nfreq].tolist()
+
+            def frames():
+                dtype = None
+                for offset, length in zip(offsets, lengths):
+                    block = mf.block(offset, length)
+                    frame = DumpFrame.from_block(block, dtype)
+                    block.release()
+                    dtype = frame.atoms.dtype
+                    yield frame
+
+            if memmap is None or not offsets:
+                return cls.from_frames(frames())
+
+            frames = frames()
+            first  = next(frames)
+            tmpdir = _make_tmpdir(memmap)
+            out    = np.lib.format.open_memmap(
+                os.path.join(tmpdir, 'positions.npy'), mode='w+',
+                dtype=POSITION_DTYPE, shape=(len(offsets), first.natoms, 3))
+            trajectory = cls.from_frames(_chain(first, frames), out=out)
+            out.flush()
+            del out
+        trajectory._write_meta(tmpdir)
+        trajectory.positions = None
+        _replace_dir(tmpdir, memmap)
+        return cls.load(memmap)
+
+    def save(self, directory):
+        '''Write the trajectory to ``directory`` (replaced atomically).'''
+        tmpdir = _make_tmpdir(directory)
+        np.save(os.path.join(tmpdir, 'positions.npy'),
+                np.asarray(self.positions, dtype=POSITION_DTYPE))
+        self._write_meta(tmpdir)
+        _replace_dir(tmpdir, directory)
+        return directory
+
+    def _write_meta(self, directory):
+        for name in ARRAYS[1:]:
+            np.save(os.path.join(directory, name+'.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        '''Open a saved trajectory; positions are memory-mapped by default.'''
+        def load(name, mode=None):
+            return np.load(os.path.join(directory, name+'.npy'), mmap_mode=mode)
+        wrapped = os.path.exists(os.path.join(directory, 'wrapped.npy')) \
+                  and bool(load('wrapped'))
+        return cls(load('positions', 'r' if mmap else None), load('steps'),
+                   load('ids'), load('types'), load('box'), wrapped)
+
+    #---------------------------------------------------------------------
+    @property
+    def nframes(self):
+        return len(self.steps)
+
+    @property
+    def natoms(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return self.nframes
+
+    def columns(self, atoms):
+        '''Column (position in ``ids``) of every atom id; KeyError if missing.'''
+        atoms = np.asarray(atoms, dtype=np.int64)
+        pos   = np.minimum(np.searchsorted(self.ids, atoms), max(self.natoms-1, 0))
+        if self.natoms == 0 or np.any(self.ids[pos] != atoms):
+            missing = np.setdiff1d(atoms, self.ids)
+            raise KeyError('atoms not in the trajectory: {}'.format(missing.tolist()))
+        return pos
+
+    def select(self, atoms=None, types=None):
+        '''Trajectory of the given atom ids and/or atom types only.'''
+        keep = np.ones(self.natoms, dtype=bool)
+        if atoms is not None:
+            keep[:] = False
+            keep[self.columns(atoms)] = True
+        if types is not None:
+            keep &= np.isin(self.types, types)
+        cols = np.flatnonzero(keep)
+        return Trajectory(self.positions[:, cols], self.steps, self.ids[cols],
+                          self.types[cols], self.box, self.wrapped)
+
+    def stride(self, start=None, stop=None, step=None):
+        '''Every ``step``-th frame between ``start`` and ``stop`` (a view).'''
+        frames = slice(start, stop, step)
+        return Trajectory(self.positions[frames], self.steps[frames], self.ids,
+                          self.types, self.box[frames], self.wrapped)
+
+    def timeseries(self, atom):
+        '''(n_frames x 3) positions of one atom id.'''
+        return np.asarray(self.positions[:, self.columns([atom])[0]])
+
+    def distance(self, atom1, atom2):
+        '''Distance between two atoms in every frame.'''
+        cols = self.columns([atom1, atom2])
+        diff = np.asarray(self.positions[:, cols[0]], dtype=np.float64) - \
+               self.positions[:, cols[1]]
+        return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+    def msd(self, by_type=False, groups=None, max_lag=None):
+        '''
+        Mean-squared displacement averaged over atoms and over every
+        frame as time origin (msd_fft). Wrapped positions are unwrapped
+        with the box first.
+
+        Parameters
+        ----------
+        by_type : bool, optional
+            One curve per atom type. Default is False (all atoms).
+        groups : array_like, optional
+            Group label of every atom (column); one curve per group.
+        max_lag : int, optional
+            Largest lag in frames. Default is n_frames-1.
+
+        Returns
+        -------
+        lags : np.ndarray
+            Lag of every point in timesteps (frames assumed equally spaced).
+        msd : np.ndarray or dict
+            MSD per lag, or {group: MSD per lag}.
+        '''
+        if by_type:
+            groups = self.types
+        box = self.box if self.wrapped else None
+        msd = msd_fft(self.positions, box=box, groups=groups, max_lag=max_lag)
+        nlags = len(next(iter(msd.values()))) if isinstance(msd, dict) else len(msd)
+        lags  = self.steps[:nlags] - self.steps[0] if len(self.steps) else self.steps
+        return lags, msd
+
+    def __repr__(self):
+        return 'Trajectory(nframes={}, natoms={})'.format(self.nframes, self.natoms)
+
+#%%
+def unwrap(positions, box):
+    '''
+    Undo periodic wrapping: every frame-to-frame displacement longer than
+    half the box is taken through the boundary (minimum image).
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        (n_frames x n_atoms x 3) wrapped positions.
+    box : np.ndarray
+        Box bounds of every frame (n_frames x 3 x 2); orthogonal boxes only.
+
+    Returns
+    -------
+    np.ndarray of float64
+        Unwrapped positions, continuous from the first frame.
+    '''
+    positions = np.asarray(positions, dtype=np.float64)
+    box = np.asarray(box, dtype=np.float64)
+    if box.ndim != 3 or box.shape[-1] != 2:
+        raise ValueError('unwrapping needs orthogonal box bounds; dump xu yu zu '
+                         'or the image flags ix iy iz for triclinic boxes')
+    lengths = (box[:, :, 1] - box[:, :, 0])[1:, None, :]
+    jumps   = np.diff(positions, axis=0)
+    jumps  -= lengths*np.round(jumps/lengths)
+    unwrapped = np.empty_like(positions)
+    unwrapped[:1] = positions[:1]
+    np.cumsum(jumps, axis=0, out=unwrapped[1:])
+    unwrapped[1:] += positions[:1]
+    return unwrapped
+
+def msd_fft(positions, box=None, groups=None, max_lag=None, block=None):
+    '''
+    Mean-squared displacement of many atoms by the FFT algorithm.
+
+    For every atom, with every frame as time origin,
+    ``MSD(m) = S1(m) - 2*S2(m)``, where S2 is the position
+    autocorrelation (one FFT per coordinate) and S1 comes from running
+    sums of the squared positions. Atoms are processed in blocks of
+    ``block`` columns, so memory does not grow with the number of atoms.
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        (n_frames x n_atoms x 3), or (n_frames x 3) for a single atom.
+        May be a memmap.
+    box : np.ndarray, optional
+        Box bounds of every frame; if given the positions are unwrapped
+        first (see unwrap).
+    groups : array_like, optional
+        Group label of every atom; one MSD curve per group is returned.
+    max_lag : int, optional
+        Largest lag in frames. Default is n_frames-1.
+    block : int, optional
+        Atoms per block. Default keeps a block within MSD_BLOCK_BYTES.
+
+    Returns
+    -------
+    np.ndarray or dict
+        MSD per lag (0..max_lag), averaged over atoms, or
+        {group: MSD per lag} if ``groups`` is given.
+    '''
+    if np.ndim(positions) == 2:
+        positions = np.asarray(positions)[:, None, :]
+    nframes, natoms = positions.shape[:2]
+    nlags = nframes if max_lag is None else min(max_lag+1, nframes)
+    if groups is None:
+        labels, group_of = np.zeros(natoms, dtype=np.int64), None
+    else:
+        group_of, labels = np.unique(np.asarray(groups), return_inverse=True)
+        labels = labels.ravel()
+    ngroups = int(labels.max())+1 if natoms else 0
+    if block is None:
+        # float64 + complex128 FFT arrays of 2*nframes per coordinate
+        block = max(1, MSD_BLOCK_BYTES // (nframes*3*8*6 + 1))
+
+    sums   = np.zeros((nlags, ngroups))
+    counts = np.bincount(labels, minlength=ngroups)
+    remaining = (nframes - np.arange(nlags))[:, None]
+    nfft   = fft.next_fast_len(2*nframes, real=True)
+    for start in range(0, natoms, block):
+        x = np.asarray(positions[:, start:start+block], dtype=np.float64)
+        if box is not None:
+            x = unwrap(x, box)
+        # S1(m) = sum_{k=0}^{N-m-1} (r(k+m)^2 + r(k)^2) / (N-m)
+        d  = np.einsum('fad,fad->fa', x, x)
+        d  = np.vstack([d, np.zeros((1, d.shape[1]))])
+        q  = 2*d.sum(axis=0) - np.cumsum(d[np.arange(-1, nframes-1)]
+                                         + d[nframes - np.arange(nframes)], axis=0)
+        s1 = q[:nlags] / remaining
+        # S2(m) = sum_{k=0}^{N-m-1} r(k).r(k+m) / (N-m)
+        f  = fft.rfft(x, n=nfft, axis=0, workers=-1)
+        s2 = fft.irfft(f.real**2 + f.imag**2, n=nfft, axis=0,
+                       workers=-1)[:nlags].sum(axis=-1)
+        s2 /= remaining
+        msd = s1 - 2*s2
+        block_labels = labels[start:start+block]
+        for g in np.unique(block_labels).tolist():
+            sums[:, g] += msd[:, block_labels == g].sum(axis=1)
+
+    means = sums / np.maximum(counts, 1)
+    if group_of is None:
+        return means[:, 0] if ngroups else np.zeros(nlags)
+    return {group: means[:, g] for g, group in enumerate(group_of.tolist())}
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+def _make_tmpdir(directory):
+    tmpdir = directory.rstrip(os.sep) + '.tmp'
+    if os.path.exists(tmpdir):
+        shutil.rmtree(tmpdir)
+    os.makedirs(tmpdir)
+    return tmpdir
+
+def _replace_dir(tmpdir, directory):
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmpdir, directory)